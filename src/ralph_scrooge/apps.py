@@ -6,3 +6,7 @@ from django.utils.translation import ugettext_lazy as _
 class ScroogeAppConfig(AppConfig):
     name = 'ralph_scrooge'
     verbose_name = _('Scrooge')
+
+    def ready(self):
+        # register handlers of dimensions changes
+        from ralph_scrooge.utils import dimensions  # noqa
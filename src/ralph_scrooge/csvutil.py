@@ -15,7 +15,7 @@ import codecs
 import cStringIO
 import csv
 
-from django.http import HttpResponse
+from django.http import HttpResponse, StreamingHttpResponse
 
 
 class excel_semicolon(csv.excel):
@@ -110,6 +110,53 @@ def make_csv_response(data=[], filename='export.csv', encoding='cp1250'):
     return response
 
 
+class _PseudoBuffer(object):
+    """
+    File-like object which returns written value instead of storing it.
+    """
+    def write(self, value):
+        return value
+
+
+def iter_csv(data, encoding='cp1250', dialect=excel_semicolon, chunk_size=100):
+    """
+    Generate CSV content of data (iterable of rows) encoded in the given
+    encoding, in chunks of (at most) `chunk_size` rows.
+
+    >>> b''.join(iter_csv([['CAR', 'COLOR'], ['Ford', 1]]))
+    'CAR;COLOR\\r\\nFord;1\\r\\n'
+    """
+    writer = csv.writer(_PseudoBuffer(), dialect=dialect)
+    encoder = codecs.getincrementalencoder(encoding)()
+    chunk = []
+    for row in data:
+        line = writer.writerow([unicode(item).encode('utf-8') for item in row])
+        chunk.append(encoder.encode(line.decode('utf-8')))
+        if len(chunk) >= chunk_size:
+            yield b''.join(chunk)
+            chunk = []
+    chunk.append(encoder.encode('', final=True))
+    yield b''.join(chunk)
+
+
+def make_csv_streaming_response(
+    data, filename='export.csv', encoding='cp1250'
+):
+    """
+    Create a streaming HTTP response for downloading a CSV file with provided
+    data. Contrary to `make_csv_response`, rows are encoded one by one while
+    response is sent, so data could be any iterable (ex. generator).
+
+    Response is compressed by GZipMiddleware (if client accepts it).
+    """
+    response = StreamingHttpResponse(
+        iter_csv(data, encoding=encoding),
+        content_type='application/csv',
+    )
+    response['Content-Disposition'] = 'attachment; filename=%s' % filename
+    return response
+
+
 class scrooge_dialect(csv.excel):
 
     delimiter = str(';')
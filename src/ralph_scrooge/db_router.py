@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import caches as dj_caches
+from django.core.signals import request_finished
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.dispatch import receiver
+
+from ralph_scrooge.utils.common import get_cache_name
+
+PIN_CACHE_KEY = 'scrooge_db_pinned_user_{}'
+
+_state = threading.local()
+
+
+def get_replica_alias():
+    """
+    Return alias of database replica, or None if it's not configured.
+    """
+    alias = settings.DATABASE_REPLICA_ALIAS
+    return alias if alias in settings.DATABASES else None
+
+
+def is_using_replica():
+    return getattr(_state, 'use_replica', False)
+
+
+@contextmanager
+def use_replica(enabled=True):
+    """
+    Read from database replica (if it's configured) in current thread inside
+    this block.
+    """
+    previous = is_using_replica()
+    _state.use_replica = enabled
+    try:
+        yield
+    finally:
+        _state.use_replica = previous
+
+
+def _get_pin_cache():
+    return dj_caches[get_cache_name('scrooge_db_router')]
+
+
+def pin_to_primary(user):
+    """
+    Read from the default database (instead of replica) in requests of the
+    user for `DATABASE_REPLICA_PIN_TIMEOUT` seconds, so changes made by the
+    user are visible in these requests, even if not replicated yet.
+    """
+    _get_pin_cache().set(
+        PIN_CACHE_KEY.format(user.pk), True,
+        settings.DATABASE_REPLICA_PIN_TIMEOUT,
+    )
+
+
+def is_pinned_to_primary(user):
+    return bool(_get_pin_cache().get(PIN_CACHE_KEY.format(user.pk)))
+
+
+def start_request(request, replica):
+    """
+    Mark `request` as the one processed by current thread - if `replica` is
+    True, it's reading from replica, unless its user is pinned to primary.
+    """
+    _state.request = request
+    _state.use_replica = replica
+
+
+@receiver(request_finished)
+def finish_request(**kwargs):
+    # request is finished when response is sent (even streamed one)
+    _state.request = None
+    _state.use_replica = False
+
+
+def _is_request_pinned():
+    """
+    Check if user of the current request is pinned to primary (user could be
+    authenticated later than the request is started, ex. by REST framework).
+    """
+    request = getattr(_state, 'request', None)
+    if request is None:
+        return False
+    if not hasattr(request, '_scrooge_pinned_to_primary'):
+        # user is fetched lazily - reads made while checking it go to the
+        # default database
+        _state.checking_pin = True
+        try:
+            user = getattr(request, 'user', None)
+            if user is None or not user.is_authenticated():
+                return False
+            request._scrooge_pinned_to_primary = is_pinned_to_primary(user)
+        finally:
+            _state.checking_pin = False
+    return request._scrooge_pinned_to_primary
+
+
+class ReplicaRouter(object):
+    """
+    Route reads to database replica (`DATABASE_REPLICA_ALIAS`) inside
+    `use_replica` block and in read-only requests marked by
+    `ralph_scrooge.middleware.ReadFromReplica`. All writes, and reads inside
+    transactions, go to the default database.
+    """
+    def db_for_read(self, model, **hints):
+        replica = get_replica_alias()
+        if (
+            replica is None or
+            not is_using_replica() or
+            getattr(_state, 'checking_pin', False) or
+            connections[DEFAULT_DB_ALIAS].in_atomic_block or
+            _is_request_pinned()
+        ):
+            return None
+        return replica
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # replica contains the same data as the default database
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # replica is migrated by replication
+        return db != settings.DATABASE_REPLICA_ALIAS
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import logging
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import Min
+from django.utils.translation import ugettext_lazy as _
+
+from ralph_scrooge.management.commands.calculate_dailycosts import valid_date
+from ralph_scrooge.models import DailyPricingObject, PricingObjectServiceChange
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    """Recreate log of pricing objects services changes (used by services
+    changes report) based on daily pricing objects.
+    """
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--date-start',
+            dest='date_start',
+            type=valid_date,
+            help=_(
+                "First day of a date range to backfill. Defaults to the date "
+                "of the oldest daily pricing object."
+            )
+        )
+        parser.add_argument(
+            '--date-end',
+            dest='date_end',
+            type=valid_date,
+            default=date.today(),
+            help=_("Last day of a date range to backfill. Defaults to today.")
+        )
+        parser.add_argument(
+            '--days',
+            dest='days',
+            type=int,
+            default=31,
+            help=_("Number of days backfilled in single transaction.")
+        )
+
+    def handle(self, *args, **options):
+        date_start = options['date_start'] or (
+            DailyPricingObject.objects.aggregate(min_date=Min('date'))[
+                'min_date'
+            ]
+        )
+        date_end = options['date_end']
+        if date_start is None:
+            logger.info('No daily pricing objects. Nothing to backfill.')
+            return
+        if date_start > date_end:
+            logger.error("'--date-start' greater than '--date-end'. Aborting.")
+            return
+        while date_start <= date_end:
+            batch_end = min(
+                date_start + timedelta(days=options['days'] - 1), date_end
+            )
+            count = PricingObjectServiceChange.backfill(date_start, batch_end)
+            logger.info('{} services changes found between {} and {}'.format(
+                count, date_start, batch_end,
+            ))
+            date_start = batch_end + timedelta(days=1)
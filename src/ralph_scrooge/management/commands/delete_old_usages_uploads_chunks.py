@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import argparse
+import datetime
+import json
+import logging
+
+from django.core.management.base import BaseCommand
+from django.utils.timezone import now
+from django.utils.translation import ugettext_lazy as _
+
+from ralph_scrooge.models import (
+    UsagesUpload,
+    UsagesUploadChunk,
+    UsagesUploadStatus,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def valid_num_days(num):
+    try:
+        num_ = int(num)
+        if num_ <= 0:
+            raise Exception()
+    except Exception:
+        raise argparse.ArgumentTypeError(
+            "Invalid number of days: {}.".format(num)
+        )
+    return num_
+
+
+class Command(BaseCommand):
+    """
+    Delete chunks of usages uploads which are not going to be processed:
+    failed uploads and uploads which were not finished (ex. abandoned by
+    client, or interrupted on worker) in NUM_DAYS - such uploads are marked
+    as failed.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '-d',
+            type=valid_num_days,
+            dest='num_days',
+            default=7,
+            help=_(
+                "Uploads created before `now - NUM_DAYS` and not finished "
+                "yet will be marked as failed."
+            )
+        )
+
+    def handle(self, num_days, *args, **options):
+        min_created = now() - datetime.timedelta(days=num_days)
+        abandoned = UsagesUpload.objects.filter(
+            created__lt=min_created,
+            status__in=[
+                UsagesUploadStatus.open.id,
+                UsagesUploadStatus.queued.id,
+                UsagesUploadStatus.processing.id,
+            ],
+        )
+        abandoned_count = abandoned.update(
+            status=UsagesUploadStatus.failed.id,
+            errors=json.dumps([{'non_field_errors': [
+                'Upload was not finished in {} days.'.format(num_days)
+            ]}]),
+        )
+        logger.info(
+            'Number of unfinished usages uploads marked as failed: {}.'
+            .format(abandoned_count)
+        )
+        chunks = UsagesUploadChunk.objects.filter(
+            upload__status=UsagesUploadStatus.failed.id
+        )
+        chunks_count = chunks.count()
+        if chunks_count:
+            chunks.delete()
+        logger.info(
+            'Number of chunks of failed usages uploads deleted: {}.'
+            .format(chunks_count)
+        )
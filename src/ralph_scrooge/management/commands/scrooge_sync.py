@@ -15,6 +15,9 @@ from django.conf import settings
 
 from ralph_scrooge.models import SyncStatus
 from ralph_scrooge.plugins import plugin_runner
+from ralph_scrooge.utils.dimensions import (
+    daily_pricing_objects_changes_batch,
+)
 
 
 logger = logging.getLogger(__name__)
@@ -50,11 +53,13 @@ def _run_plugin(name, today):
     success, message = False, None
     sync_status = SyncStatus.objects.get_or_create(plugin=name, date=today)[0]
     try:
-        success, message = plugin_runner.run_plugin(
-            'scrooge',
-            name,
-            today=today,
-        )
+        # plugins are saving lots of daily pricing objects
+        with daily_pricing_objects_changes_batch():
+            success, message = plugin_runner.run_plugin(
+                'scrooge',
+                name,
+                today=today,
+            )
         if not success:
             raise PluginError(message)
     except Exception as e:
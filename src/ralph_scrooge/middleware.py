@@ -4,6 +4,8 @@ import logging
 
 from django.conf import settings
 
+from ralph_scrooge.db_router import pin_to_primary, start_request
+
 request_logger = logging.getLogger('scrooge.request_user')
 
 
@@ -50,3 +52,33 @@ class LogRequestUser(object):
                 extra=params,
             )
         return response
+
+
+class ReadFromReplica(object):
+    """
+    Read-only requests to paths starting with one of `DATABASE_REPLICA_PATHS`
+    are reading from database replica (see `ralph_scrooge.db_router`), unless
+    user has changed some data recently - then user is pinned to the default
+    database for a while.
+    """
+    safe_methods = ('GET', 'HEAD', 'OPTIONS')
+
+    def process_request(self, request):
+        start_request(
+            request,
+            request.method in self.safe_methods and request.path.startswith(
+                tuple(settings.DATABASE_REPLICA_PATHS)
+            ),
+        )
+
+    def process_response(self, request, response):
+        # user could be authenticated by view (ex. by REST framework)
+        user = getattr(request, 'user', None)
+        if (
+            request.method not in self.safe_methods and
+            response.status_code < 400 and
+            user is not None and
+            user.is_authenticated()
+        ):
+            pin_to_primary(user)
+        return response
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.2 on 2026-10-19 11:50
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ralph_scrooge', '0016_backofficeassetinfo_dailybackofficeassetinfo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyCostStaging',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('path', models.CharField(max_length=255)),
+                ('depth', models.PositiveIntegerField(default=0)),
+                ('value', models.FloatField(default=0)),
+                ('cost', models.DecimalField(decimal_places=6, default=0, max_digits=16)),
+                ('forecast', models.BooleanField(default=False)),
+                ('date', models.DateField()),
+                ('pricing_object', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='ralph_scrooge.PricingObject')),
+                ('service_environment', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='ralph_scrooge.ServiceEnvironment')),
+                ('type', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='ralph_scrooge.BaseUsage')),
+                ('warehouse', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='ralph_scrooge.Warehouse')),
+            ],
+            options={
+                'verbose_name': 'daily cost (staging)',
+                'verbose_name_plural': 'daily costs (staging)',
+            },
+        ),
+        migrations.AlterIndexTogether(
+            name='dailycoststaging',
+            index_together=set([('date', 'forecast')]),
+        ),
+    ]
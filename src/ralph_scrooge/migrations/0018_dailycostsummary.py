@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.2 on 2026-10-19 12:24
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ralph_scrooge', '0017_dailycoststaging'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyCostSummary',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value', models.FloatField(default=0)),
+                ('cost', models.DecimalField(decimal_places=6, default=0, max_digits=16)),
+                ('forecast', models.BooleanField(default=False)),
+                ('date', models.DateField()),
+                ('service_environment', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='ralph_scrooge.ServiceEnvironment')),
+                ('type', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='ralph_scrooge.BaseUsage')),
+            ],
+            options={
+                'verbose_name': 'daily cost summary',
+                'verbose_name_plural': 'daily costs summaries',
+            },
+        ),
+        migrations.AddField(
+            model_name='costdatestatus',
+            name='forecast_summarized',
+            field=models.BooleanField(default=False, editable=False, verbose_name='forecast summarized'),
+        ),
+        migrations.AddField(
+            model_name='costdatestatus',
+            name='summarized',
+            field=models.BooleanField(default=False, editable=False, verbose_name='summarized'),
+        ),
+        migrations.AlterIndexTogether(
+            name='dailycostsummary',
+            index_together=set([('date', 'forecast')]),
+        ),
+    ]
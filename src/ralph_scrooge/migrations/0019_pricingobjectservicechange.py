@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.2 on 2026-10-19 12:41
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ralph_scrooge', '0018_dailycostsummary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PricingObjectServiceChange',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(db_index=True, verbose_name='date')),
+                ('pricing_object', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='service_changes', to='ralph_scrooge.PricingObject', verbose_name='pricing object')),
+                ('service_environment_after', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='ralph_scrooge.ServiceEnvironment', verbose_name='service environment after change')),
+                ('service_environment_before', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='ralph_scrooge.ServiceEnvironment', verbose_name='service environment before change')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='pricingobjectservicechange',
+            unique_together=set([('pricing_object', 'date')]),
+        ),
+    ]
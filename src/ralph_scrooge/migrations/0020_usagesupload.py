@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.2 on 2026-10-19 13:01
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ralph_scrooge', '0019_pricingobjectservicechange'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UsagesUpload',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(default=django.utils.timezone.now, verbose_name='date created')),
+                ('modified', models.DateTimeField(default=django.utils.timezone.now, verbose_name='last modified')),
+                ('cache_version', models.PositiveIntegerField(default=0, editable=False, verbose_name='cache version')),
+                ('date', models.DateField(verbose_name='date')),
+                ('overwrite', models.CharField(default='no', max_length=30, verbose_name='overwrite')),
+                ('ignore_unknown_services', models.BooleanField(default=False, verbose_name='ignore unknown services')),
+                ('status', models.PositiveIntegerField(choices=[(1, 'open'), (2, 'queued'), (3, 'processing'), (4, 'done'), (5, 'failed')], default=1, verbose_name='status')),
+                ('errors', models.TextField(blank=True, default='', verbose_name='errors')),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='created by')),
+                ('pricing_service', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='ralph_scrooge.PricingService', verbose_name='pricing service')),
+            ],
+            options={
+                'verbose_name': 'usages upload',
+                'verbose_name_plural': 'usages uploads',
+            },
+        ),
+        migrations.CreateModel(
+            name='UsagesUploadChunk',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number', models.PositiveIntegerField(verbose_name='number')),
+                ('rows', models.TextField(verbose_name='rows')),
+                ('upload', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chunks', to='ralph_scrooge.UsagesUpload', verbose_name='upload')),
+            ],
+            options={
+                'ordering': ('upload', 'number'),
+                'verbose_name': 'usages upload chunk',
+                'verbose_name_plural': 'usages upload chunks',
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='usagesuploadchunk',
+            unique_together=set([('upload', 'number')]),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.2 on 2026-10-19 13:10
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ralph_scrooge', '0020_usagesupload'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='dailyusage',
+            index_together=set([('date', 'type', 'daily_pricing_object')]),
+        ),
+    ]
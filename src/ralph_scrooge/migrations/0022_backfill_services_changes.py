@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.core.management import call_command
+from django.db import migrations
+
+
+def backfill_services_changes(apps, schema_editor):
+    # log of services changes is filled for existing daily pricing objects
+    # (it could take a while for big database - in such case this migration
+    # could be faked and `backfill_services_changes` command run later)
+    call_command('backfill_services_changes')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ralph_scrooge', '0021_dailyusage_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            backfill_services_changes,
+            reverse_code=migrations.RunPython.noop
+        )
+    ]
@@ -1,6 +1,11 @@
 from ralph_scrooge.models.base import BaseUsage, BaseUsageType
 
-from ralph_scrooge.models.cost import CostDateStatus, DailyCost
+from ralph_scrooge.models.cost import (
+    CostDateStatus,
+    DailyCost,
+    DailyCostStaging,
+    DailyCostSummary,
+)
 
 from ralph_scrooge.models.extra_cost import (
     DynamicExtraCost,
@@ -33,6 +38,7 @@ from ralph_scrooge.models.pricing_object import (
     PRICING_OBJECT_TYPES,
     PricingObject,
     PricingObjectModel,
+    PricingObjectServiceChange,
     PricingObjectType,
     TenantInfo,
     VIPInfo,
@@ -71,6 +77,9 @@ from ralph_scrooge.models.usage import (
     UsagePrice,
     UsageType,
     UsageAnomalyAck,
+    UsagesUpload,
+    UsagesUploadChunk,
+    UsagesUploadStatus,
     UsageTypeUploadFreq,
 )
 
@@ -88,6 +97,8 @@ __all__ = [
     'DailyAssetInfo',
     'DailyBackOfficeAssetInfo',
     'DailyCost',
+    'DailyCostStaging',
+    'DailyCostSummary',
     'DailyDatabaseInfo',
     'DailyPricingObject',
     'DailyTenantInfo',
@@ -107,6 +118,7 @@ __all__ = [
     'PRICING_OBJECT_TYPES',
     'PricingObject',
     'PricingObjectModel',
+    'PricingObjectServiceChange',
     'PricingObjectType',
     'PricingService',
     'PricingServicePlugin',
@@ -128,6 +140,9 @@ __all__ = [
     'TenantInfo',
     'UsageAnomalyAck',
     'UsagePrice',
+    'UsagesUpload',
+    'UsagesUploadChunk',
+    'UsagesUploadStatus',
     'UsageType',
     'UsageTypeUploadFreq',
     'VIPInfo',
@@ -5,7 +5,8 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
-from django.db import models as db
+from django.db import models as db, transaction
+from django.db.models import Sum
 from django.utils.translation import ugettext_lazy as _
 
 from ralph_scrooge.models._tree import MultiPathNode, MultiPathNodeQuerySet
@@ -96,6 +97,153 @@ class DailyCost(MultiPathNode, db.Model):
         return True
 
 
+class DailyCostStaging(MultiPathNode, db.Model):
+    """
+    Staging area for costs calculated by single-day jobs of monthly costs
+    recalculation. Every day job writes here its own costs, which are then
+    published (moved to DailyCost) by the master job at once for the whole
+    period.
+
+    Fields have to match DailyCost fields (costs are moved between tables
+    using INSERT ... SELECT).
+    """
+    _path_field = 'type_id'
+    objects = MultiPathNodeQuerySet.as_manager()
+
+    pricing_object = db.ForeignKey(
+        'PricingObject',
+        null=True,
+        blank=True,
+        related_name='+',
+        db_constraint=False,
+    )
+    service_environment = db.ForeignKey(
+        'ServiceEnvironment',
+        null=False,
+        blank=False,
+        related_name='+',
+        db_constraint=False,
+    )
+    type = db.ForeignKey(
+        'BaseUsage',
+        null=False,
+        blank=False,
+        related_name='+',
+        db_constraint=False,
+    )
+    warehouse = db.ForeignKey(
+        'Warehouse',
+        null=True,
+        blank=True,
+        related_name='+',
+        db_constraint=False,
+    )
+    value = db.FloatField(default=0)
+    cost = db.DecimalField(
+        max_digits=PRICE_DIGITS,
+        decimal_places=PRICE_PLACES,
+        default=0,
+    )
+    forecast = db.BooleanField(default=False)
+    date = db.DateField()
+
+    class Meta:
+        verbose_name = _("daily cost (staging)")
+        verbose_name_plural = _("daily costs (staging)")
+        app_label = 'ralph_scrooge'
+        index_together = [('date', 'forecast')]
+
+
+class DailyCostSummary(db.Model):
+    """
+    Costs summed per day, service environment and type (the same way as in
+    reports). Costs are summarized only for days with accepted costs (which
+    never change), so reports could merge these (much smaller) summaries
+    instead of summing DailyCost for every day again.
+    """
+    service_environment = db.ForeignKey(
+        'ServiceEnvironment',
+        related_name='+',
+        db_constraint=False,
+    )
+    type = db.ForeignKey(
+        'BaseUsage',
+        related_name='+',
+        db_constraint=False,
+    )
+    value = db.FloatField(default=0)
+    cost = db.DecimalField(
+        max_digits=PRICE_DIGITS,
+        decimal_places=PRICE_PLACES,
+        default=0,
+    )
+    forecast = db.BooleanField(default=False)
+    date = db.DateField()
+
+    class Meta:
+        verbose_name = _("daily cost summary")
+        verbose_name_plural = _("daily costs summaries")
+        app_label = 'ralph_scrooge'
+        index_together = [('date', 'forecast')]
+
+    @classmethod
+    @transaction.atomic
+    def summarize(cls, dates, forecast):
+        """
+        (Re)create summaries of costs for dates and mark dates as summarized.
+        """
+        cls.objects.filter(date__in=dates, forecast=forecast).delete()
+        daily_costs = DailyCost.objects.filter(
+            date__in=dates,
+            forecast=forecast,
+        ).values(
+            'date',
+            'service_environment_id',
+            'type_id',
+        ).annotate(
+            total_cost=Sum('cost'),
+            total_value=Sum('value'),
+        )
+        cls.objects.bulk_create([
+            cls(
+                date=daily_cost['date'],
+                service_environment_id=daily_cost['service_environment_id'],
+                type_id=daily_cost['type_id'],
+                forecast=forecast,
+                cost=daily_cost['total_cost'],
+                value=daily_cost['total_value'],
+            ) for daily_cost in daily_costs.iterator()
+        ], batch_size=1000)
+        CostDateStatus.objects.filter(date__in=dates).update(**{
+            'forecast_summarized' if forecast else 'summarized': True
+        })
+
+    @classmethod
+    def summarize_accepted(cls, start, end, forecast):
+        """
+        Summarize accepted (but not summarized yet) costs between start and
+        end.
+        """
+        # statuses are locked, so concurrent reports don't summarize the same
+        # dates twice (reads inside transaction go to the default database)
+        with transaction.atomic():
+            return cls._summarize_accepted(start, end, forecast)
+
+    @classmethod
+    def _summarize_accepted(cls, start, end, forecast):
+        dates = list(CostDateStatus.objects.select_for_update().filter(
+            date__gte=start,
+            date__lte=end,
+            **{
+                'forecast_accepted' if forecast else 'accepted': True,
+                'forecast_summarized' if forecast else 'summarized': False,
+            }
+        ).values_list('date', flat=True))
+        if dates:
+            cls.summarize(dates, forecast)
+        return dates
+
+
 class CostDateStatus(db.Model):
     date = db.DateField(
         verbose_name=_('date'),
@@ -121,6 +269,17 @@ class CostDateStatus(db.Model):
         default=False,
         editable=False,
     )
+    # True when costs are summarized (see DailyCostSummary)
+    summarized = db.BooleanField(
+        verbose_name=_("summarized"),
+        default=False,
+        editable=False,
+    )
+    forecast_summarized = db.BooleanField(
+        verbose_name=_("forecast summarized"),
+        default=False,
+        editable=False,
+    )
 
     class Meta:
         verbose_name = _("cost date status")
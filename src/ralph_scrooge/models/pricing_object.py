@@ -6,10 +6,13 @@ from __future__ import print_function
 from __future__ import unicode_literals
 
 import ipaddress
+from datetime import timedelta
 from decimal import Decimal as D
 
 from django.core.exceptions import ValidationError
-from django.db import models as db
+from django.db import connection, models as db, transaction
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
 from django.utils.translation import ugettext_lazy as _
 from django.utils.safestring import mark_safe
 from dj.choices import Choices
@@ -19,6 +22,13 @@ from ralph_scrooge.utils.models import EditorTrackable, TimeTrackable
 PRICE_DIGITS = 16
 PRICE_PLACES = 6
 
+SQL_DAY_SUB = {
+    'sqlite': lambda col: "DATE({}, '-1 days')".format(col),
+    'mysql': lambda col: "DATE_SUB({}, INTERVAL 1 DAY)".format(col),
+    'postgresql': lambda col: "{} - INTERVAL '1 day'".format(col),
+    'oracle': lambda col: "{} - 1".format(col),
+}
+
 
 class PricingObjectType(db.Model):
     name = db.CharField(
@@ -228,6 +238,272 @@ class DailyPricingObject(db.Model):
     def __unicode__(self):
         return '{} ({})'.format(self.pricing_object, self.date)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super(DailyPricingObject, cls).from_db(
+            db, field_names, values
+        )
+        instance._saved_service_environment_id = instance.__dict__.get(
+            'service_environment_id'
+        )
+        return instance
+
+    def save(self, *args, **kwargs):
+        created = self.pk is None
+        super(DailyPricingObject, self).save(*args, **kwargs)
+        # update services changes log only when service environment was
+        # changed (or daily pricing object was created)
+        if (
+            getattr(self, '_saved_service_environment_id', None) !=
+            self.service_environment_id
+        ):
+            PricingObjectServiceChange.update_for_daily_pricing_object(
+                self, created
+            )
+            self._saved_service_environment_id = self.service_environment_id
+
+
+class PricingObjectServiceChange(db.Model):
+    """
+    Log of changes of service environment of pricing objects (between two
+    following days). It's updated every time when daily pricing object is
+    saved with different service environment (see
+    `DailyPricingObject.save`) or deleted. Use `backfill` to fill it for
+    daily pricing objects saved in different way.
+    """
+    pricing_object = db.ForeignKey(
+        PricingObject,
+        verbose_name=_("pricing object"),
+        related_name='service_changes',
+    )
+    # first day with new service environment
+    date = db.DateField(verbose_name=_("date"), db_index=True)
+    service_environment_before = db.ForeignKey(
+        'ServiceEnvironment',
+        verbose_name=_("service environment before change"),
+        related_name='+',
+    )
+    service_environment_after = db.ForeignKey(
+        'ServiceEnvironment',
+        verbose_name=_("service environment after change"),
+        related_name='+',
+    )
+
+    # max number of ids of pricing objects passed to single query by
+    # `backfill` (to not exceed limit of query params)
+    backfill_ids_batch_size = 500
+
+    class Meta:
+        app_label = 'ralph_scrooge'
+        unique_together = ('pricing_object', 'date')
+
+    def __unicode__(self):
+        return '{} ({})'.format(self.pricing_object, self.date)
+
+    @classmethod
+    def _update(cls, pricing_object_id, date, before_id, after_id, created):
+        if before_id is not None and before_id != after_id:
+            cls.objects.update_or_create(
+                pricing_object_id=pricing_object_id,
+                date=date,
+                defaults=dict(
+                    service_environment_before_id=before_id,
+                    service_environment_after_id=after_id,
+                ),
+            )
+        elif not created:
+            cls.objects.filter(
+                pricing_object_id=pricing_object_id,
+                date=date,
+            ).delete()
+
+    @classmethod
+    def update_for_daily_pricing_object(cls, daily_pricing_object, created):
+        """
+        Update change of service environment of pricing object at date of
+        daily pricing object and the day after (comparing to daily pricing
+        objects in previous and next day).
+        """
+        pricing_object_id = daily_pricing_object.pricing_object_id
+        service_environment_id = daily_pricing_object.service_environment_id
+        date = DailyPricingObject._meta.get_field('date').to_python(
+            daily_pricing_object.date
+        )
+        previous_day = date - timedelta(days=1)
+        next_day = date + timedelta(days=1)
+        neighbours = dict(DailyPricingObject.objects.filter(
+            pricing_object_id=pricing_object_id,
+            date__in=[previous_day, next_day],
+        ).values_list('date', 'service_environment_id'))
+        cls._update(
+            pricing_object_id,
+            date,
+            neighbours.get(previous_day),
+            service_environment_id,
+            created,
+        )
+        if next_day in neighbours:
+            cls._update(
+                pricing_object_id,
+                next_day,
+                service_environment_id,
+                neighbours[next_day],
+                created=False,
+            )
+
+    @classmethod
+    def delete_for_daily_pricing_object(cls, daily_pricing_object):
+        """
+        Delete changes of service environment of pricing object at date of
+        deleted daily pricing object and the day after (there is nothing to
+        compare to anymore).
+        """
+        date = DailyPricingObject._meta.get_field('date').to_python(
+            daily_pricing_object.date
+        )
+        cls.objects.filter(
+            pricing_object_id=daily_pricing_object.pricing_object_id,
+            date__in=[date, date + timedelta(days=1)],
+        ).delete()
+
+    @classmethod
+    def _supports_window_functions(cls):
+        if connection.vendor == 'postgresql':
+            return True
+        if connection.vendor == 'mysql':
+            # MariaDB supports them since 10.2
+            return connection.mysql_version >= (8, 0)
+        if connection.vendor == 'sqlite':
+            return connection.Database.sqlite_version_info >= (3, 25)
+        return False
+
+    @classmethod
+    def _get_changes(cls, start, end, pricing_object_ids=None):
+        """
+        Return list of (pricing object id, date, service environment before,
+        service environment after) of changes between start and end, based
+        on daily pricing objects (of pricing objects with passed ids only, if
+        any are passed).
+        """
+        table = DailyPricingObject._meta.db_table
+        date_field = DailyPricingObject._meta.get_field('date')
+        ids_params = []
+        if pricing_object_ids is not None:
+            ids_params = list(pricing_object_ids)
+
+        def ids_condition(column):
+            if pricing_object_ids is None:
+                return ''
+            return 'AND {} IN ({})'.format(
+                column, ', '.join(['%s'] * len(ids_params))
+            )
+        cursor = connection.cursor()
+        if cls._supports_window_functions():
+            cursor.execute("""
+                SELECT
+                    pricing_object_id,
+                    date,
+                    previous_date,
+                    previous_service_environment_id,
+                    service_environment_id
+                FROM (
+                    SELECT
+                        pricing_object_id,
+                        date,
+                        service_environment_id,
+                        LAG(date) OVER (
+                            PARTITION BY pricing_object_id ORDER BY date
+                        ) AS previous_date,
+                        LAG(service_environment_id) OVER (
+                            PARTITION BY pricing_object_id ORDER BY date
+                        ) AS previous_service_environment_id
+                    FROM {table}
+                    WHERE date >= %s AND date <= %s {ids_condition}
+                ) AS daily_pricing_objects
+                WHERE previous_service_environment_id != service_environment_id
+            """.format(
+                table=table,
+                ids_condition=ids_condition('pricing_object_id'),
+            ), [start - timedelta(days=1), end] + ids_params)
+            changes = []
+            for po_id, date, previous_date, before, after in cursor.fetchall():
+                # dates could be returned as strings (ex. by SQLite)
+                date = date_field.to_python(date)
+                previous_date = date_field.to_python(previous_date)
+                # only changes between two following days are logged
+                if date >= start and previous_date == date - timedelta(1):
+                    changes.append((po_id, date, before, after))
+            return changes
+        cursor.execute("""
+            SELECT
+                dpo1.pricing_object_id,
+                dpo1.date,
+                dpo2.service_environment_id,
+                dpo1.service_environment_id
+            FROM {table} AS dpo1
+                JOIN {table} AS dpo2
+            ON dpo1.pricing_object_id = dpo2.pricing_object_id
+                AND dpo2.date = {previous_date}
+            WHERE dpo1.date >= %s AND dpo1.date <= %s
+                AND dpo1.service_environment_id != dpo2.service_environment_id
+                {ids_condition}
+        """.format(
+            table=table,
+            previous_date=SQL_DAY_SUB[connection.vendor]('dpo1.date'),
+            ids_condition=ids_condition('dpo1.pricing_object_id'),
+        ), [start, end] + ids_params)
+        return [
+            (po_id, date_field.to_python(day), before, after)
+            for po_id, day, before, after in cursor.fetchall()
+        ]
+
+    @classmethod
+    @transaction.atomic
+    def backfill(cls, start, end, pricing_object_ids=None):
+        """
+        Recreate log of services changes between start and end (using LAG
+        window function if database supports it) - of pricing objects with
+        passed ids only, if any are passed. Return number of changes.
+        """
+        if pricing_object_ids is None:
+            ids_batches = [None]
+        else:
+            pricing_object_ids = list(pricing_object_ids)
+            ids_batches = [
+                pricing_object_ids[i:i + cls.backfill_ids_batch_size]
+                for i in range(
+                    0, len(pricing_object_ids), cls.backfill_ids_batch_size
+                )
+            ]
+        count = 0
+        for ids in ids_batches:
+            changes_to_delete = cls.objects.filter(
+                date__gte=start, date__lte=end
+            )
+            if ids is not None:
+                changes_to_delete = changes_to_delete.filter(
+                    pricing_object_id__in=ids
+                )
+            changes_to_delete.delete()
+            changes = cls._get_changes(start, end, ids)
+            cls.objects.bulk_create([
+                cls(
+                    pricing_object_id=pricing_object_id,
+                    date=date,
+                    service_environment_before_id=before,
+                    service_environment_after_id=after,
+                ) for pricing_object_id, date, before, after in changes
+            ], batch_size=1000)
+            count += len(changes)
+        return count
+
+
+# signal is sent for DailyPricingObject also when any of its subclasses is
+# deleted (and when daily pricing objects are deleted using queryset)
+@receiver(post_delete, sender=DailyPricingObject)
+def _daily_pricing_object_deleted(sender, instance, **kwargs):
+    PricingObjectServiceChange.delete_for_daily_pricing_object(instance)
+
 
 # TODO(aadamski): refactor AssetInfo -> DataCenterAssetInfo
 class AssetInfo(PricingObject):
@@ -6,7 +6,7 @@ from __future__ import print_function
 from __future__ import unicode_literals
 
 from django.core.validators import MaxValueValidator, MinValueValidator
-from django.db import models as db
+from django.db import models as db, transaction
 from django.utils.translation import ugettext_lazy as _
 from dj.choices import Choices
 
@@ -96,6 +96,22 @@ class TeamCost(db.Model):
     def __unicode__(self):
         return '{} ({} - {})'.format(self.team, self.start, self.end)
 
+    @transaction.atomic
+    def set_division(self, percents):
+        """
+        Replace division of team time in this period with `percents` (dict
+        with percent of team time for every service environment id).
+        """
+        self.percentage.all().delete()
+        TeamServiceEnvironmentPercent.objects.bulk_create([
+            TeamServiceEnvironmentPercent(
+                team_cost=self,
+                service_environment_id=service_environment_id,
+                percent=percent,
+            )
+            for service_environment_id, percent in percents.items()
+        ])
+
 
 class TeamServiceEnvironmentPercent(db.Model):
     team_cost = db.ForeignKey(
@@ -19,6 +19,7 @@ from ralph_scrooge.models.base import (
     BaseUsageManager,
     BaseUsageType,
 )
+from ralph_scrooge.utils.models import TimeTrackable
 
 PRICE_DIGITS = 16
 PRICE_PLACES = 6
@@ -287,8 +288,11 @@ class DailyUsage(db.Model):
         verbose_name = _("daily usage")
         verbose_name_plural = _("daily usages")
         app_label = 'ralph_scrooge'
-        # TODO: after migration to Django>=1.5 add index_together on
-        # type_id, date and warehouse_id (see migration 0019 for details)
+        index_together = [
+            ('date', 'type', 'daily_pricing_object'),
+            # used by keyset pagination (see `DailyUsageKeysetPagination`)
+            ('date', 'id'),
+        ]
 
     def __unicode__(self):
         return '{0}/{1} ({2}) {3}'.format(
@@ -297,3 +301,87 @@ class DailyUsage(db.Model):
             self.date,
             self.value,
         )
+
+
+class UsagesUploadStatus(Choices):
+    _ = Choices.Choice
+    open = _('open')
+    queued = _('queued')
+    processing = _('processing')
+    done = _('done')
+    failed = _('failed')
+
+
+class UsagesUpload(TimeTrackable):
+    """
+    Upload of (possibly very big number of) usages of pricing service for
+    single day. Usages are sent in chunks (see `UsagesUploadChunk`), which
+    are validated and saved on worker when the upload is committed.
+    """
+    pricing_service = db.ForeignKey(
+        'PricingService',
+        verbose_name=_("pricing service"),
+        related_name='+',
+    )
+    date = db.DateField(verbose_name=_("date"))
+    overwrite = db.CharField(
+        verbose_name=_("overwrite"),
+        max_length=30,
+        default='no',
+    )
+    ignore_unknown_services = db.BooleanField(
+        verbose_name=_("ignore unknown services"),
+        default=False,
+    )
+    status = db.PositiveIntegerField(
+        verbose_name=_("status"),
+        choices=UsagesUploadStatus(),
+        default=UsagesUploadStatus.open.id,
+    )
+    # JSON-encoded list of errors of rows (or of the whole upload)
+    errors = db.TextField(verbose_name=_("errors"), blank=True, default='')
+    created_by = db.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        verbose_name=_("created by"),
+        related_name='+',
+        null=True,
+        blank=True,
+        on_delete=db.SET_NULL,
+    )
+
+    class Meta:
+        verbose_name = _("usages upload")
+        verbose_name_plural = _("usages uploads")
+        app_label = 'ralph_scrooge'
+
+    def __unicode__(self):
+        return '{} ({}, {})'.format(
+            self.pricing_service,
+            self.date,
+            UsagesUploadStatus.from_id(self.status).name,
+        )
+
+
+class UsagesUploadChunk(db.Model):
+    """
+    Chunk of usages upload (staging area for usages until upload is
+    committed).
+    """
+    upload = db.ForeignKey(
+        UsagesUpload,
+        verbose_name=_("upload"),
+        related_name='chunks',
+    )
+    number = db.PositiveIntegerField(verbose_name=_("number"))
+    # JSON-encoded list of (flat) usages rows
+    rows = db.TextField(verbose_name=_("rows"))
+
+    class Meta:
+        verbose_name = _("usages upload chunk")
+        verbose_name_plural = _("usages upload chunks")
+        app_label = 'ralph_scrooge'
+        unique_together = ('upload', 'number')
+        ordering = ('upload', 'number')
+
+    def __unicode__(self):
+        return '{} #{}'.format(self.upload, self.number)
@@ -5,16 +5,18 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import datetime
 import logging
 from collections import defaultdict
 from dateutil import rrule
 
 from django.conf import settings
-from django.db import connection
+from django.db import connection, transaction
 
 from ralph_scrooge.models import (
     CostDateStatus,
     DailyCost,
+    DailyCostStaging,
     DynamicExtraCostType,
     ExtraCostType,
     PricingService,
@@ -29,6 +31,7 @@ from ralph_scrooge.plugins.cost.base import (
 )
 from ralph_scrooge.plugins.validations import DataForReportValidator
 from ralph_scrooge.utils.common import memoize, AttributeDict
+from ralph_scrooge.utils.dimensions import bump_costs_version
 
 logger = logging.getLogger(__name__)
 
@@ -176,6 +179,67 @@ class Collector(object):
         self._update_status_period(start, end, forecast)
         logger.info('Costs saved for dates {}-{}'.format(start, end))
 
+    @transaction.atomic
+    def save_staged_costs(self, date, forecast, costs):
+        """
+        Save costs for single date in staging area (they are not visible in
+        DailyCost until they are published using `publish_staged_costs`).
+
+        :param costs: list of DailyCost instances
+        """
+        DailyCostStaging.objects.filter(date=date, forecast=forecast).delete()
+        logger.info('Staging {} costs for {}'.format(len(costs), date))
+        DailyCostStaging.objects.bulk_create(
+            costs,
+            batch_size=settings.DAILY_COST_CREATE_BATCH_SIZE,
+        )
+
+    @transaction.atomic
+    def publish_staged_costs(self, dates, forecast):
+        """
+        Replace costs for dates by costs previously saved in staging area
+        (using `save_staged_costs`). Whole operation is done in a single
+        transaction, so dates are published at once.
+
+        :param dates: list of dates to publish
+        :type dates: list of datetime.date
+        """
+        if not dates:
+            return
+        logger.info('Publishing staged costs for {} days'.format(len(dates)))
+        columns = ', '.join(
+            connection.ops.quote_name(f.column)
+            for f in DailyCost._meta.concrete_fields if not f.primary_key
+        )
+        dates_placeholder = ', '.join(['%s'] * len(dates))
+        cursor = connection.cursor()
+        cursor.execute(
+            """
+            DELETE FROM {}
+            WHERE date IN ({}) and forecast=%s
+            """.format(DailyCost._meta.db_table, dates_placeholder),
+            list(dates) + [forecast]
+        )
+        cursor.execute(
+            """
+            INSERT INTO {0} ({2})
+            SELECT {2} FROM {1}
+            WHERE date IN ({3}) and forecast=%s
+            """.format(
+                DailyCost._meta.db_table,
+                DailyCostStaging._meta.db_table,
+                columns,
+                dates_placeholder,
+            ),
+            list(dates) + [forecast]
+        )
+        DailyCostStaging.objects.filter(
+            date__in=dates,
+            forecast=forecast,
+        ).delete()
+        for day in dates:
+            self._update_status(day, forecast)
+
     def _delete_daily_period_costs(self, start, end, forecast):
         """
         Delete previously saved costs between start and end (including forecast
@@ -242,11 +306,19 @@ class Collector(object):
         """
         # update status to created
         status, created = CostDateStatus.objects.get_or_create(date=date)
+        # summary of previous costs is not valid anymore
         if forecast:
             status.forecast_calculated = True
+            status.forecast_summarized = False
         else:
             status.calculated = True
+            status.summarized = False
         status.save()
+        if isinstance(date, datetime.datetime):
+            date = date.date()
+        # costs are bumped when they are visible for others (ex. to not cache
+        # API responses with previous costs under new version)
+        transaction.on_commit(lambda: bump_costs_version(date))
 
     def _update_status_period(self, start, end, forecast):
         """
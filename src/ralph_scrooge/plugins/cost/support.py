@@ -12,6 +12,7 @@ from ralph_scrooge.models import ExtraCostType, SupportCost
 from ralph_scrooge.plugins.base import register
 from ralph_scrooge.plugins.cost.base import BaseCostPlugin
 from ralph_scrooge.utils.common import memoize
+from ralph_scrooge.utils.dimensions import daily_pricing_objects
 
 logger = logging.getLogger(__name__)
 
@@ -36,6 +37,39 @@ class SupportPlugin(BaseCostPlugin):
     cost model.
     """
 
+    def _get_supports(self, date):
+        """
+        Return list of SupportRecords active at date.
+
+        If service environments of pricing objects are preloaded for this
+        date (on ScroogeWorker), they are taken from memory instead of
+        joining daily pricing objects.
+        """
+        supports = SupportCost.objects.filter(end__gte=date, start__lte=date)
+        fields = ['pricing_object_id', 'cost', 'forecast_cost', 'start', 'end']
+        if not daily_pricing_objects.has_date(date):
+            supports = supports.filter(
+                pricing_object__daily_pricing_objects__date=date,
+            ).values_list(
+                'pricing_object__daily_pricing_objects__'
+                'service_environment_id',
+                *fields
+            )
+            return map(SupportRecord._make, supports)
+        result = []
+        for support in supports.values_list(*fields):
+            service_environment_id = (
+                daily_pricing_objects.get_service_environment_id(
+                    date, support[0]
+                )
+            )
+            # skip supports without daily pricing object (the same as join)
+            if service_environment_id is not None:
+                result.append(
+                    SupportRecord(service_environment_id, *support)
+                )
+        return result
+
     @memoize(skip_first=True)
     def _costs(
         self,
@@ -64,19 +98,7 @@ class SupportPlugin(BaseCostPlugin):
         logger.info("Calculating supports costs")
         support_type = ExtraCostType.objects.get(pk=2)  # from fixture
         usages = defaultdict(list)
-        supports = SupportCost.objects.filter(
-            end__gte=date,
-            start__lte=date,
-            pricing_object__daily_pricing_objects__date=date,
-        ).values_list(
-            'pricing_object__daily_pricing_objects__service_environment_id',
-            'pricing_object_id',
-            'cost',
-            'forecast_cost',
-            'start',
-            'end',
-        )
-        for support in map(SupportRecord._make, list(supports)):
+        for support in self._get_supports(date):
             cost = support.forecast_cost if forecast else support.cost
             usages[support.service_environment_id].append({
                 'cost': (cost / (
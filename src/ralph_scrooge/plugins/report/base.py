@@ -11,7 +11,7 @@ from collections import OrderedDict, defaultdict
 from django.db.models import Sum
 from django.utils.translation import ugettext_lazy as _
 
-from ralph_scrooge.models import DailyCost
+from ralph_scrooge.models import CostDateStatus, DailyCost, DailyCostSummary
 from ralph_scrooge.plugins.base import BasePlugin
 
 
@@ -65,34 +65,105 @@ class BaseReportPlugin(BasePlugin):
         :returns dict: cost per service
         """
         logger.debug("Get {} usages".format(base_usage))
+        totals = self.get_costs_totals(
+            start,
+            end,
+            [base_usage],
+            service_environments=service_environments,
+            forecast=forecast,
+        )
+        return self.pivot_costs_totals(totals, base_usage)
 
-        daily_costs_query = DailyCost.objects.filter(
+    @classmethod
+    def get_costs_totals(
+        cls,
+        start,
+        end,
+        base_usages,
+        service_environments=None,
+        forecast=False,
+    ):
+        """
+        Return total cost and value of every base usage per service
+        environment in single (grouped) query. Format of returned data looks
+        like:
+
+        totals = {
+            'base_usage_id': {
+                'service_environment_id': (total_cost, total_value),
+                ...
+            },
+            ...
+        }
+        """
+        # costs of summarized days are taken from (much smaller) summaries
+        summarized_dates = list(CostDateStatus.objects.filter(
             date__gte=start,
             date__lte=end,
-            type=base_usage,
-            forecast=forecast,
-        )
-        if service_environments:
-            daily_costs_query = daily_costs_query.filter(
-                service_environment__in=service_environments,
+            **{'forecast_summarized' if forecast else 'summarized': True}
+        ).values_list('date', flat=True))
+        queries = [
+            DailyCost.objects.filter(
+                date__gte=start,
+                date__lte=end,
+            ).exclude(date__in=summarized_dates)
+        ]
+        if summarized_dates:
+            queries.append(
+                DailyCostSummary.objects.filter(date__in=summarized_dates)
+            )
+        totals = defaultdict(dict)
+        for query in queries:
+            query = query.filter(type__in=base_usages, forecast=forecast)
+            if service_environments:
+                query = query.filter(
+                    service_environment__in=service_environments,
+                )
+            daily_costs = query.values(
+                'service_environment_id',
+                'type_id',
+            ).annotate(
+                total_cost=Sum('cost'),
+                total_value=Sum('value'),
             )
-        daily_costs = daily_costs_query.values(
-            'service_environment_id'
-        ).annotate(
-            total_cost=Sum('cost'),
-            total_value=Sum('value'),
+            for daily_cost in daily_costs:
+                type_totals = totals[daily_cost['type_id']]
+                se_id = daily_cost['service_environment_id']
+                cost, value = type_totals.get(se_id, (0, 0))
+                type_totals[se_id] = (
+                    cost + daily_cost['total_cost'],
+                    value + daily_cost['total_value'],
+                )
+        return totals
+
+    @property
+    def has_default_costs(self):
+        """
+        True if plugin doesn't override `costs` method, so its costs could be
+        taken from totals fetched for many plugins at once (see
+        `get_costs_totals`).
+        """
+        return (
+            type(self).costs.__func__ is BaseReportPlugin.costs.__func__
         )
 
+    def pivot_costs_totals(self, totals, base_usage):
+        """
+        Return costs of base usage (in `costs` format) from totals returned
+        by `get_costs_totals`.
+        """
         usages = defaultdict(lambda: defaultdict(list))
-        for daily_cost in daily_costs:
+        for service_environment_id, (total_cost, total_value) in (
+            totals.get(base_usage.id, {}).iteritems()
+        ):
             if self.base_usage_cost_symbol:
-                usages[daily_cost['service_environment_id']][
+                usages[service_environment_id][
                     self.base_usage_cost_symbol.format(base_usage.id)
-                ] = daily_cost['total_cost']
+                ] = total_cost
             if self.base_usage_count_symbol:
-                usages[daily_cost['service_environment_id']][
+                usages[service_environment_id][
                     self.base_usage_count_symbol.format(base_usage.id)
-                ] = daily_cost['total_value']
+                ] = total_value
         return usages
 
     def schema(self, base_usage, *args, **kwargs):
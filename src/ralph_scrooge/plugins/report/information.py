@@ -9,7 +9,7 @@ import logging
 from collections import OrderedDict, defaultdict
 from datetime import timedelta
 
-from django.db.models import Q
+from django.db.models import Q, QuerySet
 from django.utils.translation import ugettext_lazy as _
 
 from ralph_scrooge.models import HistoricalService, ServiceEnvironment
@@ -52,41 +52,53 @@ class Information(BaseReportPlugin):
         # 4)                        |________|
         # in cases 1 and 2 start has to be between active_from and active_end
         # in cases 3 and 4 active_from has to be between start and end
+        if isinstance(service_environments, QuerySet):
+            service_environments = service_environments.select_related(
+                'service',
+                'environment',
+            )
+        service_environments = list(service_environments or [])
         if not service_environments:
-            service_environments = ServiceEnvironment.objects.all()
+            service_environments = list(
+                ServiceEnvironment.objects.select_related(
+                    'service',
+                    'environment',
+                )
+            )
         services_history = HistoricalService.objects.filter(
             (Q(active_from__lte=start) & Q(active_to__gte=start)) |  # 1-2
             (Q(active_from__gte=start) & Q(active_from__lt=day_after_end)),
-            id__in=service_environments.values_list(
-                'service',
-                flat=True
-            ).distinct(),
-        ).select_related('profit_center').order_by('history_id')
-        services = {}
+            id__in=set(se.service_id for se in service_environments),
+        ).select_related(
+            'profit_center__business_line'
+        ).order_by('history_id')
         profit_centers = defaultdict(list)
         for service_history in services_history:
-            services[service_history.id] = service_history.history_object
             profit_centers[service_history.id].append(
                 service_history.profit_center
             )
+        # profit centers and business lines are the same for every
+        # environment of the service
+        profit_centers_names = {}
+        business_lines_names = {}
+        for service_id, service_profit_centers in profit_centers.items():
+            profit_centers_names[service_id] = ' / '.join([
+                ' - '.join(
+                    (pc.name, pc.description or '')
+                ) for pc in set(service_profit_centers)
+            ])
+            business_lines_names[service_id] = ' / '.join(set([
+                pc.business_line.name for pc in service_profit_centers
+            ]))
         for service_environment in service_environments:
+            service = service_environment.service
             info[service_environment.id] = {
                 'id': service_environment.id,
-                'service': service_environment.service.name,
+                'service': service.name,
                 'environment': service_environment.environment.name,
-                'service_uid': service_environment.service.ci_uid,
-                'profit_center': ' / '.join([
-                    ' - '.join(
-                        (pc.name, pc.description or '')
-                    ) for pc in set(profit_centers[
-                        service_environment.service.id
-                    ])
-                ]),
-                'business_line': ' / '.join(set([
-                    pc.business_line.name for pc in profit_centers[
-                        service_environment.service.id
-                    ]
-                ])),
+                'service_uid': service.ci_uid,
+                'profit_center': profit_centers_names.get(service.id, ''),
+                'business_line': business_lines_names.get(service.id, ''),
             }
         return info
 
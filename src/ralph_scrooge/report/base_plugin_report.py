@@ -8,7 +8,6 @@ from __future__ import unicode_literals
 import logging
 from decimal import Decimal as D
 
-from ralph_scrooge.utils.common import memoize
 from django.utils.translation import ugettext_lazy as _
 
 from ralph_scrooge.models import (
@@ -24,6 +23,10 @@ from ralph_scrooge.plugins import report  # noqa
 from ralph_scrooge.plugins.cost.collector import Collector
 from ralph_scrooge.report.base_report import BaseReport
 from ralph_scrooge.utils.common import AttributeDict
+from ralph_scrooge.utils.dimensions import (
+    dimensions,
+    memoize_by_dimensions_version,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -235,18 +238,20 @@ class BasePluginReport(BaseReport):
         return field_content, usage_cost
 
     @classmethod
-    def _prepare_row(cls, data):
+    def _prepare_row(cls, data, report_schema):
         """
         Prepare one row for single venture. Return list of lists agreed with
         all columns.
 
         :param dict data: Dict which contains data for one row
+        :param list report_schema: schema of report (see `_get_schema`),
+        fetched once for all rows
         :returns list: List of lists with data for each column
         :rtype list:
         """
         row = []
         total_cost = D(0)
-        for schema in cls._get_schema():
+        for schema in report_schema:
             plugin_fields = []
             for field_name, field_rules in schema.iteritems():
                 field_content, usage_cost = cls._prepare_field(
@@ -260,6 +265,19 @@ class BasePluginReport(BaseReport):
         row.append('{0:.2f}'.format(total_cost))
         return row
 
+    @classmethod
+    def _prepare_partial_row(cls, data, report_schema, computed_columns):
+        """
+        Prepare one row of partial report - cells of columns which are not
+        calculated yet (see `_get_computed_columns`) and total cost (which
+        is not known until all columns are calculated) are None.
+        """
+        row = cls._prepare_row(data, report_schema)
+        return [
+            value if column in computed_columns else None
+            for column, value in enumerate(row)
+        ]
+
     @classmethod
     def _prepare_final_report(cls, intial_data, data):
         """
@@ -288,9 +306,10 @@ class BasePluginReport(BaseReport):
         """
         logger.debug("Preparing final report")
         final_data = []
+        report_schema = cls._get_schema()
         for row in data:
             final_data.append(
-                cls._prepare_row(intial_data.get(row.id, {}))
+                cls._prepare_row(intial_data.get(row.id, {}), report_schema)
             )
         return final_data
 
@@ -304,6 +323,10 @@ class BasePluginReport(BaseReport):
         :rtype list:
         """
         logger.debug("Getting services environments")
+        if dimensions.is_loaded:
+            # preloaded (ex. on worker start) service environments are
+            # already ordered by service and environment name
+            return dimensions.all(ServiceEnvironment)
         services = ServiceEnvironment.objects.select_related(
             'service',
             'environment',
@@ -315,17 +338,18 @@ class BasePluginReport(BaseReport):
         return services
 
     @classmethod
-    @memoize
-    def _get_schema(cls):
+    @memoize_by_dimensions_version
+    def _get_plugins_schemas(cls):
         """
-        Use plugins to get full schema for report
+        Use plugins to get schema of columns of every plugin
 
-        :returns dict: Complete schema for all columns in report
-        :rtype dict:
+        :returns list: pairs of index of plugin (in `get_plugins`) and its
+        schema (plugins without schema are skipped)
+        :rtype list:
         """
         logger.debug("Getting schema for report")
         header = []
-        for plugin in cls.get_plugins():
+        for plugin_index, plugin in enumerate(cls.get_plugins()):
             try:
                 plugin_headers = plugin_runner.run_plugin(
                     'scrooge_reports',
@@ -333,13 +357,38 @@ class BasePluginReport(BaseReport):
                     type=cls.schema_name,
                     **plugin.get('plugin_kwargs', {})
                 )
-                header.append(plugin_headers)
+                header.append((plugin_index, plugin_headers))
             except KeyError:
                 logger.warning(
                     "Usage '{0}' has no schema plugin".format(plugin.name)
                 )
         return header
 
+    @classmethod
+    @memoize_by_dimensions_version
+    def _get_schema(cls):
+        """
+        Use plugins to get full schema for report
+
+        :returns dict: Complete schema for all columns in report
+        :rtype dict:
+        """
+        return [schema for _, schema in cls._get_plugins_schemas()]
+
+    @classmethod
+    def _get_computed_columns(cls, computed_plugins):
+        """
+        Return indexes of columns of (partial) report calculated by plugins
+        with `computed_plugins` indexes (in `get_plugins`).
+        """
+        columns = []
+        column = 0
+        for plugin_index, schema in cls._get_plugins_schemas():
+            if plugin_index in computed_plugins:
+                columns.extend(range(column, column + len(schema)))
+            column += len(schema)
+        return columns
+
     @classmethod
     def get_header(cls, **kwargs):
         """
@@ -352,11 +401,10 @@ class BasePluginReport(BaseReport):
         header = []
         for schema in cls._get_schema():
             for key, value in schema.iteritems():
+                # schema is cached, so it can't be modified here
+                name = value['name']
                 if 'currency' in value and value['currency']:
-                    value['name'] = "{0} - {1}".format(
-                        value['name'],
-                        cls.currency,
-                    )
-                header.append(value['name'])
+                    name = "{0} - {1}".format(name, cls.currency)
+                header.append(name)
         header.append(_("Total cost"))
         return [header]
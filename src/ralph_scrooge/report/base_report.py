@@ -6,21 +6,61 @@ from __future__ import print_function
 from __future__ import unicode_literals
 
 import logging
+import types
+import urllib
+import uuid
+from collections import namedtuple
 
 from django.conf import settings
+from django.core.cache import caches as dj_caches
+from django.utils.encoding import force_bytes, force_text
 
+from ralph_scrooge.utils.chunked_cache import ChunkedRows
 from ralph_scrooge.utils.common import get_cache_name, get_queue_name
-from ralph_scrooge.utils.worker_job import WorkerJob
+from ralph_scrooge.utils.worker_job import _get_cache_key, WorkerJob
 
 logger = logging.getLogger(__name__)
 
 
+# final report stored in the cache: header is stored (as a whole) under
+# header_key, rows are stored in chunks (see ChunkedRows); computed_columns
+# are indexes of already calculated columns of partial report (None if all
+# columns are calculated)
+StoredReport = namedtuple(
+    'StoredReport', ['header_key', 'rows', 'computed_columns']
+)
+StoredReport.__new__.__defaults__ = (None,)
+# rows of partial report returned by `get_data`, with indexes of already
+# calculated columns (cells of other columns are None)
+PartialRows = namedtuple('PartialRows', ['rows', 'computed_columns'])
+# page of the report - rows are pairs of (row id, row), next is id of row
+# after which next page starts (or None if it's the last page)
+ReportPage = namedtuple('ReportPage', ['header', 'total', 'rows', 'next'])
+
+
 def currency(value):
     """Formats currency as string according to the settings."""
 
     return '{:,.2f} {}'.format(value or 0, settings.CURRENCY).replace(',', ' ')
 
 
+def _sort_key(value):
+    """
+    Return key used to sort report rows by (formatted) value of column -
+    numbers are sorted numerically and before texts, empty (not calculated
+    yet) values are sorted last.
+
+    >>> sorted(['10.00', 'b', None, '9.50', 'A', 3], key=_sort_key)
+    [3, u'9.50', u'10.00', u'A', u'b', None]
+    """
+    if value is None:
+        return (2, 0, '')
+    try:
+        return (0, float(value), '')
+    except (TypeError, ValueError):
+        return (1, 0, force_text(value).lower())
+
+
 class BaseReport(WorkerJob):
     """
     A base class for the reports. Override ``template_name``, ``Form``,
@@ -32,6 +72,12 @@ class BaseReport(WorkerJob):
     queue_name = get_queue_name('scrooge_report')
     cache_name = get_cache_name('scrooge_report')
     cache_section = 'scrooge_report'
+    max_jobs_per_user = settings.REPORTS_MAX_JOBS_PER_USER
+    read_from_replica = True
+    result_chunk_size = 1000  # number of report rows stored in single key
+    # report rows could be filtered by these columns (filter name: index of
+    # column in row) - see `get_page`
+    filter_columns = {}
 
     def _format_header(self):
         """
@@ -47,6 +93,211 @@ class BaseReport(WorkerJob):
             result.append(output_row)
         self.header = result
 
+    @classmethod
+    def _store_report(cls, cache, key, data, timeout):
+        if data is None:
+            return None
+        header, rows = data
+        computed_columns = None
+        if isinstance(rows, PartialRows):
+            computed_columns = rows.computed_columns
+            rows = rows.rows
+        # rows could be also generated lazily (ex. partial result, which is
+        # prepared only when it's stored)
+        if not isinstance(rows, (list, types.GeneratorType)):
+            # ex. report with separate rows per pricing object type
+            return data
+        header_key = '{}:header:{}'.format(key, uuid.uuid4().hex)
+        cache.set(header_key, header, timeout=timeout)
+        return StoredReport(
+            header_key=header_key,
+            rows=ChunkedRows.store(
+                cache,
+                key,
+                rows,
+                timeout=timeout,
+                chunk_size=cls.result_chunk_size,
+            ),
+            computed_columns=computed_columns,
+        )
+
+    @classmethod
+    def _store_result(cls, cache, key, data):
+        """
+        Store header and rows of the report in separate keys, so checking
+        progress of the report does not require fetching whole report.
+        """
+        return cls._store_report(
+            cache, key, data, timeout=cls.cache_final_result_timeout
+        )
+
+    @classmethod
+    def _store_partial_result(cls, cache, key, data):
+        """
+        Store partial report (ex. with some columns already calculated) in
+        the same way as final one, so its pages could be fetched while the
+        report is still generated.
+        """
+        return cls._store_report(cache, key, data, timeout=cls.cache_timeout)
+
+    @classmethod
+    def _delete_partial_result(cls, cache, stored):
+        """
+        Delete header and rows of replaced partial report, so there is only
+        one copy of the report in the cache at once.
+        """
+        if isinstance(stored, StoredReport):
+            cache.delete(stored.header_key)
+            stored.rows.delete(cache)
+
+    def _fetch_result(self, cache, stored):
+        """
+        Return header and rows (generator fetching them from the cache chunk
+        by chunk) of the report.
+        """
+        if not isinstance(stored, StoredReport):
+            return stored
+        header = cache.get(stored.header_key)
+        if header is None:
+            return None
+        return header, stored.rows.iterate(cache)
+
+    def get_stored_result(self, partial=False, **kwargs):
+        """
+        Return stored (see `_store_result`) final result of the report with
+        passed params, or None if it's not finished. If partial is True,
+        stored partial result (see `_store_partial_result`) of unfinished
+        report is returned too.
+        """
+        cache = dj_caches[self.cache_name]
+        cached = cache.get(_get_cache_key(self.cache_section, **kwargs))
+        if cached is not None and (cached[0] == 100 or partial):
+            return cached[2]
+        return None
+
+    def _get_rows_index(self, cache, stored, sort, desc, filters):
+        """
+        Return positions of report rows matching filters (dict with column
+        index and text which this column should contain), sorted by column
+        with `sort` index (or in report order).
+
+        Index is calculated once (for every combination of params) and stored
+        in the cache together with report rows.
+        """
+        key = '{}:index?{}'.format(stored.rows.prefix, urllib.urlencode(
+            sorted(
+                [(b'sort', force_bytes(sort)), (b'desc', force_bytes(desc))] +
+                [(force_bytes(k), force_bytes(v)) for k, v in filters.items()]
+            )
+        ))
+        index = cache.get(key)
+        if index is not None:
+            return index
+        filters = [
+            (column, force_text(value).lower())
+            for column, value in filters.items()
+        ]
+        entries = []
+        for position, row in enumerate(stored.rows.iterate(cache)):
+            if all(
+                row[column] is not None and
+                value in force_text(row[column]).lower()
+                for column, value in filters
+            ):
+                entries.append((
+                    _sort_key(row[sort]) if sort is not None else None,
+                    position,
+                ))
+        if sort is not None:
+            entries.sort(reverse=desc)
+        index = [position for _, position in entries]
+        cache.set(key, index, timeout=self.cache_final_result_timeout)
+        return index
+
+    def _find_in_index(self, cache, stored, index, sort, desc, position):
+        """
+        Return place of row at `position` in index (see `_get_rows_index`).
+        Index is sorted by (sort key, position), so the row is found using
+        binary search - only rows compared with it are fetched.
+
+        :raises ValueError: when row is not in the index
+        """
+        def get_entry(row_position):
+            if sort is None:
+                return row_position
+            row = stored.rows.get_rows(cache, [row_position])[0]
+            return (_sort_key(row[sort]), row_position)
+
+        if 0 <= position < len(stored.rows):
+            entry = get_entry(position)
+            low, high = 0, len(index)
+            while low < high:
+                middle = (low + high) // 2
+                middle_entry = get_entry(index[middle])
+                if (middle_entry > entry if desc else middle_entry < entry):
+                    low = middle + 1
+                else:
+                    high = middle
+            if low < len(index) and index[low] == position:
+                return low
+        raise ValueError(
+            'Row {} is not in the (filtered) report'.format(position)
+        )
+
+    def get_page(
+        self,
+        stored,
+        limit,
+        after=None,
+        offset=0,
+        sort=None,
+        desc=False,
+        filters=None,
+    ):
+        """
+        Return page (see `ReportPage`) of finished (or partial) report.
+
+        Rows are fetched using keyset pagination - `after` is id of the last
+        row of previous page (ids of rows are positions in whole report, so
+        they are stable between pages). Only chunks of report containing rows
+        from the page are fetched from the cache.
+
+        :param stored: stored result (see `get_stored_result`)
+        :param sort: index of column to sort by
+        :param filters: dict with filter name (see `filter_columns`) and text
+            which column should contain
+        :raises ValueError: when `after` is not id of any (filtered) row
+        :raises IndexError: when there is no column with `sort` index
+        :raises KeyError: when report has already expired
+        """
+        cache = dj_caches[self.cache_name]
+        header = cache.get(stored.header_key)
+        if header is None:
+            raise KeyError(stored.header_key)
+        index = self._get_rows_index(
+            cache,
+            stored,
+            sort,
+            desc,
+            {
+                self.filter_columns[name]: value
+                for name, value in (filters or {}).items()
+            },
+        )
+        if after is not None:
+            offset = self._find_in_index(
+                cache, stored, index, sort, desc, after
+            ) + 1
+        positions = index[offset:offset + limit]
+        return ReportPage(
+            header=header,
+            total=len(index),
+            rows=zip(positions, stored.rows.get_rows(cache, positions)),
+            next=(
+                positions[-1] if offset + limit < len(index) else None
+            ),
+        )
+
     @classmethod
     def run(cls, **kwargs):
         header = cls.get_header(**kwargs)
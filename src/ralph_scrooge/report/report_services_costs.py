@@ -6,31 +6,60 @@ from __future__ import print_function
 from __future__ import unicode_literals
 
 import logging
+from collections import defaultdict
+from functools import partial
+from itertools import chain
+from multiprocessing.pool import ThreadPool
 
+from django.conf import settings
+from django.db import connections
 
+from ralph_scrooge.db_router import is_using_replica, use_replica
+from ralph_scrooge.models import DailyCostSummary
 from ralph_scrooge.plugins import plugin_runner as plugin_runner
+from ralph_scrooge.plugins.report.base import BaseReportPlugin
 from ralph_scrooge.report.base_plugin_report import BasePluginReport
-from ralph_scrooge.utils.common import memoize, AttributeDict
+from ralph_scrooge.report.base_report import PartialRows
+from ralph_scrooge.utils.common import AttributeDict
+from ralph_scrooge.utils.dimensions import memoize_by_dimensions_version
 
 
 logger = logging.getLogger(__name__)
 
 
+def _run_in_thread(task, replica=False):
+    plugins_indexes, func = task
+    try:
+        # database used by the report is chosen per thread
+        with use_replica(replica):
+            return plugins_indexes, func()
+    finally:
+        # every thread has its own connections
+        connections.close_all()
+
+
 class ServicesCostsReport(BasePluginReport):
     """
     Reports for services
     """
     cache_section = 'services-costs-report'
+    # whole partial report is stored every time, so it's not stored too often
+    progress_update = 25
+    # columns from Information plugin (calculated first, so partial report
+    # could be filtered too)
+    filter_columns = {'service': 1, 'environment': 2, 'profit_center': 4}
 
     @classmethod
-    @memoize
+    @memoize_by_dimensions_version
     def get_plugins(cls):
         """
         Returns list of plugins to call, with information and extra cost about
         each, such as name and arguments
         """
         base_plugins = [
-            AttributeDict(name='Information', plugin_name='information'),
+            AttributeDict(
+                name='Information', plugin_name='information', run_first=True
+            ),
         ]
         extra_cost_plugins = cls._get_extra_cost_plugins()
         dynamic_extra_cost_plugins = cls._get_dynamic_extra_cost_plugins()
@@ -73,45 +102,151 @@ class ServicesCostsReport(BasePluginReport):
         :param datatime end: End of time interval for report
         :param boolean forecast: Forecast prices or real
         :param list ventures: List of ventures for which data must be taken
-        :returns dict: Complete report data for all ventures
-        :rtype dict:
+        :returns tuple: finished flag, progress, report data for all ventures
+        and set of indexes of plugins (in `get_plugins`) already included in
+        the data
+        :rtype tuple:
         """
         logger.debug("Getting report date")
         data = {se.id: {} for se in service_environments}
         plugins = cls.get_plugins()
         progress = 0
         step = 100 / len(plugins)
-        for i, plugin in enumerate(plugins):
-            try:
-                logger.info('Calling plugin {} with base usage {}'.format(
-                    plugin.plugin_name,
-                    plugin.get('plugin_kwargs', {}).get('base_usage', '-'),
-                ))
-                plugin_report = plugin_runner.run_plugin(
-                    'scrooge_reports',
-                    plugin.plugin_name,
-                    start=start,
-                    end=end,
-                    forecast=forecast,
-                    type='costs',
-                    **plugin.get('plugin_kwargs', {})
-                )
-                for service_id, service_usage in plugin_report.iteritems():
-                    if service_id in data:
-                        data[service_id].update(service_usage)
-
-                progress += step
-                yield False, progress, {}
-            except KeyError:
-                logger.warning(
-                    "Usage '{0}' has no usage plugin".format(plugin.name)
+        # costs of plugins which take them straight from DailyCost (most of
+        # columns) are fetched in single query and pivoted in memory
+        default_costs_plugins = []
+        # tasks are pairs of indexes of plugins and function returning their
+        # (merged) report
+        first_tasks = []
+        tasks = []
+        for plugin_index, plugin in enumerate(plugins):
+            plugin_obj = plugin_runner.PLUGINS_BY_NAME.get(
+                'scrooge_reports', {}
+            ).get(plugin.plugin_name)
+            if (
+                isinstance(plugin_obj, BaseReportPlugin) and
+                plugin_obj.has_default_costs
+            ):
+                default_costs_plugins.append(
+                    (plugin_index, plugin, plugin_obj)
                 )
-            except Exception as e:
-                logger.exception(
-                    "Error while generating the report: {0}".format(e)
-                )
-                raise
-        yield True, 100, data
+            else:
+                task = ([plugin_index], partial(
+                    cls._run_plugin, start, end, forecast, plugin
+                ))
+                if plugin.get('run_first'):
+                    first_tasks.append(task)
+                else:
+                    tasks.append(task)
+        if default_costs_plugins:
+            tasks.append(([i for i, _, _ in default_costs_plugins], partial(
+                cls._get_default_costs,
+                start,
+                end,
+                forecast,
+                [(p, p_obj) for _, p, p_obj in default_costs_plugins],
+            )))
+        computed_plugins = set()
+        concurrency = min(settings.REPORTS_PLUGINS_CONCURRENCY, len(tasks))
+        pool = None
+        if concurrency > 1:
+            # plugins are mostly waiting for DB, so they could be run in
+            # threads (every one with its own connection)
+            pool = ThreadPool(concurrency)
+            results = pool.imap_unordered(
+                partial(_run_in_thread, replica=is_using_replica()), tasks
+            )
+        else:
+            results = (
+                (plugins_indexes, func()) for plugins_indexes, func in tasks
+            )
+        # reports of first tasks are merged before any other (other tasks
+        # are already running in threads)
+        results = chain(
+            ((indexes, func()) for indexes, func in first_tasks), results
+        )
+        try:
+            # reports of plugins are merged as soon as they are finished, so
+            # partial report contains all already calculated columns
+            for plugins_indexes, plugin_report in results:
+                cls._update_report_data(data, plugin_report)
+                computed_plugins.update(plugins_indexes)
+                progress += step * len(plugins_indexes)
+                yield False, progress, data, frozenset(computed_plugins)
+        except Exception as e:
+            logger.exception(
+                "Error while generating the report: {0}".format(e)
+            )
+            raise
+        finally:
+            if pool is not None:
+                pool.terminate()
+        yield True, 100, data, frozenset(computed_plugins)
+
+    @classmethod
+    def _run_plugin(cls, start, end, forecast, plugin):
+        logger.info('Calling plugin {} with base usage {}'.format(
+            plugin.plugin_name,
+            plugin.get('plugin_kwargs', {}).get('base_usage', '-'),
+        ))
+        try:
+            return plugin_runner.run_plugin(
+                'scrooge_reports',
+                plugin.plugin_name,
+                start=start,
+                end=end,
+                forecast=forecast,
+                type='costs',
+                **plugin.get('plugin_kwargs', {})
+            )
+        except KeyError:
+            logger.warning(
+                "Usage '{0}' has no usage plugin".format(plugin.name)
+            )
+            return {}
+
+    @classmethod
+    def _get_default_costs(cls, start, end, forecast, default_costs_plugins):
+        """
+        Return merged reports of plugins with default costs (see
+        `BaseReportPlugin.get_costs_totals`), fetched in single query.
+        """
+        # accepted costs never change, so they are summarized once (and
+        # summaries are used by every next report); statuses are checked in
+        # the default database, since replica could be lagging
+        with use_replica(False):
+            summarized = DailyCostSummary.summarize_accepted(
+                start, end, forecast
+            )
+        if summarized:
+            logger.info('Costs summarized for {} days'.format(
+                len(summarized)
+            ))
+        logger.info('Getting costs of {} plugins at once'.format(
+            len(default_costs_plugins)
+        ))
+        totals = BaseReportPlugin.get_costs_totals(
+            start=start,
+            end=end,
+            base_usages=[
+                p.plugin_kwargs['base_usage'] for p, _ in default_costs_plugins
+            ],
+            forecast=forecast,
+        )
+        result = defaultdict(dict)
+        for plugin, plugin_obj in default_costs_plugins:
+            plugin_report = plugin_obj.pivot_costs_totals(
+                totals, plugin.plugin_kwargs['base_usage']
+            )
+            for service_id, service_usage in plugin_report.iteritems():
+                result[service_id].update(service_usage)
+        return result
+
+    @classmethod
+    def _update_report_data(cls, data, plugin_report):
+        for service_id, service_usage in plugin_report.iteritems():
+            if service_id in data:
+                data[service_id].update(service_usage)
 
     @classmethod
     def get_data(
@@ -132,7 +267,7 @@ class ServicesCostsReport(BasePluginReport):
         """
         logger.info("Generating report from {0} to {1}".format(start, end))
         services_environments = cls._get_services_environments(is_active)
-        for finished, progress, data in cls._get_report_data(
+        for finished, progress, data, computed_plugins in cls._get_report_data(
             start,
             end,
             is_active,
@@ -145,4 +280,20 @@ class ServicesCostsReport(BasePluginReport):
                     services_environments
                 )
             else:
-                yield False, progress, []
+                # partial report is prepared only when it's stored (see
+                # `BaseReport._store_partial_result`)
+                computed_columns = cls._get_computed_columns(computed_plugins)
+                yield False, progress, PartialRows(
+                    rows=cls._prepare_partial_rows(
+                        data, services_environments, set(computed_columns)
+                    ),
+                    computed_columns=computed_columns,
+                )
+
+    @classmethod
+    def _prepare_partial_rows(cls, data, services_environments, columns):
+        report_schema = cls._get_schema()
+        for se in services_environments:
+            yield cls._prepare_partial_row(
+                data.get(se.id, {}), report_schema, columns
+            )
@@ -24,6 +24,7 @@ class ServicesUsagesReport(BasePluginReport):
     per days
     """
     cache_section = 'services-usages-report'
+    filter_columns = {'service': 0, 'environment': 1}
 
     @classmethod
     def _prepare_field(cls, value, usage_type):
@@ -79,24 +80,29 @@ class ServicesUsagesReport(BasePluginReport):
         :rtype list:
         """
         logger.debug("Preparing final report")
+        # columns (every usage type for every day) are prepared once: usages
+        # of usage type in day and formatted value used when there is no
+        # usage for service environment
+        columns = []
+        for day in rrule.rrule(rrule.DAILY, dtstart=start, until=end):
+            day_data = data.get(day.date(), {})
+            for usage_type in usage_types:
+                columns.append((
+                    day_data.get(usage_type.id, {}),
+                    usage_type,
+                    cls._prepare_field(0, usage_type),
+                ))
+        missing = object()
         final_data = []
         for se in service_environments:
             # TODO: add historical information (name between start and end)
             se_data = [se.service.name, se.environment.name]
-            for day in rrule.rrule(rrule.DAILY, dtstart=start, until=end):
-                date = day.date()
-                for usage_type in usage_types:
-                    try:
-                        value = cls._prepare_field(
-                            data[date][usage_type.id][se.id],
-                            usage_type
-                        )
-                    except KeyError:
-                        value = cls._prepare_field(
-                            0,
-                            usage_type
-                        )
-                    se_data.append(value)
+            for usages, usage_type, default in columns:
+                value = usages.get(se.id, missing)
+                se_data.append(
+                    default if value is missing
+                    else cls._prepare_field(value, usage_type)
+                )
             final_data.append(se_data)
         return final_data
 
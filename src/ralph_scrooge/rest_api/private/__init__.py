@@ -24,6 +24,7 @@ from ralph_scrooge.rest_api.private.monthly_costs import (
     AcceptMonthlyCosts,
     MonthlyCosts,
 )
+from ralph_scrooge.rest_api.private.queues import QueuesStats
 from ralph_scrooge.rest_api.private.usagetypes import UsageTypesViewSet
 
 
@@ -37,6 +38,7 @@ __all__ = [
     'LeftMenuAPIView',
     'ObjectCostsContent',
     'PricingServiceUsages',
+    'QueuesStats',
     'ServicesCostsReportContent',
     'SymbolToIdAPIView',
     'UsagesReportContent',
@@ -14,6 +14,7 @@ from datetime import date, timedelta
 from dateutil.relativedelta import relativedelta
 
 from django.db import transaction
+from django.utils.encoding import force_text
 from django.utils.translation import ugettext_lazy as _
 
 from ralph_scrooge.rest_api.common import get_dates
@@ -387,6 +388,47 @@ class AllocationClientPerTeam(APIView):
             })
         return rows
 
+    def _get_service_environments(self, rows):
+        """
+        Return service environments of rows (given by ids of service and
+        environment, unless already found in uploaded file), fetched with
+        single query, and list of errors of rows without them.
+        """
+        ids = [
+            (force_text(row.get('service')), force_text(row.get('env')))
+            for row in rows
+            if not isinstance(row['service'], ServiceEnvironment)
+        ]
+        service_envs_by_ids = {}
+        if ids:
+            services_ids, envs_ids = zip(*ids)
+            for service_env in ServiceEnvironment.objects.filter(
+                service__id__in=set(services_ids),
+                environment__id__in=set(envs_ids),
+            ):
+                service_envs_by_ids[(
+                    force_text(service_env.service_id),
+                    force_text(service_env.environment_id),
+                )] = service_env
+        service_envs = []
+        errors = []
+        for row in rows:
+            if isinstance(row['service'], ServiceEnvironment):
+                service_envs.append(row['service'])
+                continue
+            service_env = service_envs_by_ids.get(
+                (force_text(row.get('service')), force_text(row.get('env')))
+            )
+            if service_env is None:
+                errors.append(
+                    'Service environment not found for service ID: {}, '
+                    'environment ID: {}'.format(
+                        row.get('service'), row.get('env')
+                    )
+                )
+            service_envs.append(service_env)
+        return service_envs, errors
+
     def get(self, request, year, month, team, format=None, *args, **kwargs):
         first_day, last_day, days_in_month = get_dates(year, month)
         return Response({
@@ -416,32 +458,19 @@ class AllocationClientPerTeam(APIView):
             team = Team.objects.get(id=team)
         except Team.DoesNotExist:
             return {'status': False, 'message': 'Team Does Not Exist.'}
-        TeamServiceEnvironmentPercent.objects.filter(
-            team_cost__team=team,
-            team_cost__start=first_day,
-            team_cost__end=last_day,
-        ).delete()
+        service_envs, errors = self._get_service_environments(
+            post_data['rows']
+        )
+        if errors:
+            return Response({'status': False, 'errors': errors})
         team_cost = TeamCost.objects.get_or_create(
             team=team,
             start=first_day,
             end=last_day,
         )[0]
-        for row in post_data['rows']:
-            if isinstance(row['service'], ServiceEnvironment):
-                service_environment = row['service']
-            else:
-                service_environment = ServiceEnvironment.objects.get(
-                    service__id=row.get('service'),
-                    environment__id=row.get('env')
-                )
-            tsep = TeamServiceEnvironmentPercent.objects.get_or_create(
-                team_cost=team_cost,
-                service_environment=service_environment,
-                defaults=dict(
-                    percent=row.get('value'),
-                )
-            )[0]
-            tsep.percent = row.get('value')
-            tsep.save()
+        team_cost.set_division({
+            service_env.id: row.get('value')
+            for row, service_env in zip(post_data['rows'], service_envs)
+        })
 
         return Response({"status": True})
@@ -11,7 +11,6 @@ from dateutil import rrule
 
 from django.conf import settings
 from django.core.cache import caches as dj_caches
-from django.db import transaction
 from django.utils.translation import ugettext_lazy as _
 from rq import get_current_job
 
@@ -147,39 +146,21 @@ class MonthlyCosts(APIView, WorkerJob):
             cache.set(key, cached, timeout=cls.cache_all_done_timeout)
 
     @classmethod
-    @transaction.atomic
-    def _save_costs(self, data, start, end, forecast):
+    def _publish_costs(cls, statuses, forecast):
         """
-        Save costs between start and end.
+        Publish costs staged by subtask jobs for every successfully
+        calculated day.
 
-        :param data: list of DailyCost instances
-        :type data: list
-        :param start: start date
-        :type start: datetime.date
-        :param end: end date
-        :type end: datetime.date
-        :param forecast: True, if forecast costs
-        :type forecast: bool
-        """
-        collector = Collector()
-        collector.save_period_costs(start, end, forecast, data)
-
-    @classmethod
-    def _process_daily_result(self, data, date, forecast):
-        """
-        Process results from subtask jobs (single day) - create daily costs
-        instances.
-
-        :param data: costs per service environments
-        :type data: dict of lists (key: service environment id, value: list of
-            costs of service environment)
-        :param date: date for which process daily results
-        :type date: datetime.date
+        :param statuses: dict with statuses (True/False) for each day
+        :type statuses: dict
         :param forecast: True, if forecast costs
         :type forecast: bool
         """
         collector = Collector()
-        return collector._create_daily_costs(date, data, forecast)
+        collector.publish_staged_costs(
+            sorted(day.date() for day, success in statuses.items() if success),
+            forecast,
+        )
 
     @classmethod
     def run(cls, start, end, forecast=False, **kwargs):
@@ -187,33 +168,25 @@ class MonthlyCosts(APIView, WorkerJob):
         Run collecting costs between start and end.
 
         It's running as "master" worker, which delegate jobs for single date to
-        subtask workers, collects results from them and process them and at the
-        end it saves all costs to the database.
+        subtask workers and waits for them to finish. Every subtask saves costs
+        of single day in staging area, so at the end master only publishes
+        costs of successfully calculated days (at once).
         """
         progress = 0
         statuses = {}
-        processed_results = []  # list of DailyCost instances for whole period
         logger.info('Recalculating costs from {} to {}'.format(start, end))
         while progress < 100:
-            progress, statuses, results = cls._check_subjobs(
+            progress, statuses = cls._check_subjobs(
                 statuses,
                 start=start,
                 end=end,
                 forecast=forecast,
                 **kwargs
             )
-            if results:
-                for day, day_results in results.iteritems():
-                    processed_results.extend(cls._process_daily_result(
-                        day_results,
-                        day,
-                        forecast,
-                    ))
             if progress < 100:
                 yield progress, statuses
                 time.sleep(settings.SCROOGE_COSTS_MASTER_SLEEP)
-        # save all costs
-        cls._save_costs(processed_results, start, end, forecast)
+        cls._publish_costs(statuses, forecast)
         yield 100, statuses
 
     @classmethod
@@ -232,7 +205,6 @@ class MonthlyCosts(APIView, WorkerJob):
         days = (end - start).days + 1
         step = 100.0 / days
         total_progress = 0
-        results = {}
         for day in rrule.rrule(rrule.DAILY, dtstart=start, until=end):
             # if day is in statuses, it was already calculated - do not check
             # it again
@@ -247,7 +219,6 @@ class MonthlyCosts(APIView, WorkerJob):
                 total_progress += step
                 statuses[day] = success
             if result:
-                results[day] = result['collector_result']
                 job = get_current_job()
                 # Pass errors from sub-job(s) to master job.
                 if not job.meta.get('validation_errors'):
@@ -258,7 +229,7 @@ class MonthlyCosts(APIView, WorkerJob):
         if len(statuses) == days:
             cls.forget_cache(start, end, **kwargs)
             total_progress = 100
-        return total_progress, statuses, results
+        return total_progress, statuses
 
 
 class DailyCostsJob(WorkerJob):
@@ -275,13 +246,17 @@ class DailyCostsJob(WorkerJob):
     @classmethod
     def run(cls, day, forecast):
         """
-        Run collecting costs for one day.
+        Run collecting costs for one day and save them in staging area.
         """
         collector = Collector()
-        result = {}
         validation_errors = []
         try:
             result = collector.process(day, forecast, perform_validation=True)
+            collector.save_staged_costs(
+                day,
+                forecast,
+                collector._create_daily_costs(day, result, forecast),
+            )
             success = True
         except DataForReportValidationError as e:
             logger.exception(e)
@@ -291,8 +266,6 @@ class DailyCostsJob(WorkerJob):
             logger.exception(e)
             success = False
         job = get_current_job()
-        # save result to job meta to keep log clean
-        job.meta['collector_result'] = result
         job.meta['validation_errors'] = validation_errors
         job.save()
         yield 100, success
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from ralph_scrooge.utils.worker_job import get_queues_stats
+
+
+class QueuesStats(APIView):
+    """
+    Depth and wait time of the oldest job for every RQ queue (ordered by
+    priority).
+    """
+    def get(self, request, *args, **kwargs):
+        return Response(get_queues_stats())
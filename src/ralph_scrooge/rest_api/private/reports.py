@@ -9,15 +9,20 @@ import itertools
 import logging
 from dateutil import parser
 
-from ralph_scrooge.csvutil import make_csv_response
+from ralph_scrooge.csvutil import make_csv_streaming_response
 from rest_framework.exceptions import ParseError
 from rest_framework.response import Response
-from rest_framework.status import HTTP_204_NO_CONTENT
+from rest_framework.status import (
+    HTTP_204_NO_CONTENT,
+    HTTP_429_TOO_MANY_REQUESTS,
+)
 from rest_framework.views import APIView
 
 from ralph_scrooge.models import UsageType
+from ralph_scrooge.report.base_report import StoredReport
 from ralph_scrooge.report.report_services_costs import ServicesCostsReport
 from ralph_scrooge.report.report_services_usages import ServicesUsagesReport
+from ralph_scrooge.utils.worker_job import TooManyJobsError
 
 logger = logging.getLogger(__name__)
 
@@ -48,6 +53,8 @@ def format_csv_header(header):
 class BaseReportContent(APIView):
     allow_csv_download = True
     section = ''
+    page_size = 100  # default number of rows in JSON page of report
+    max_page_size = 1000
 
     def __init__(self, *args, **kwargs):
         super(BaseReportContent, self).__init__(*args, **kwargs)
@@ -59,18 +66,36 @@ class BaseReportContent(APIView):
         return {}
 
     def get(self, request):
-        self.progress, result = self.run_on_worker(
-            **self._get_params(request)
-        )
+        report_format = request.query_params.get('report_format', '').lower()
+        csv_format = report_format == 'csv'
+        params = self._get_params(request)
+        try:
+            # whole report is fetched only when it's downloaded
+            self.progress, result = self.run_on_worker(
+                user=request.user,
+                fetch_result=csv_format,
+                **params
+            )
+        except TooManyJobsError:
+            return Response(
+                {
+                    'status': False,
+                    'message': (
+                        'Too many reports in progress. Please wait until '
+                        'they are finished.'
+                    ),
+                },
+                status=HTTP_429_TOO_MANY_REQUESTS,
+            )
         if result:
             self.header, self.data = result
             self._format_header()
 
         self.progress = round(self.progress, 0)
-        if request.query_params.get('report_format', '').lower() == 'csv':
+        if csv_format:
             if self.progress == 100:
                 self.header = format_csv_header(self.header)
-                return make_csv_response(
+                return make_csv_streaming_response(
                     itertools.chain(self.header, self.data),
                     '{}.csv'.format(self.section),
                 )
@@ -79,8 +104,97 @@ class BaseReportContent(APIView):
             "progress": self.progress,
             "finished": self.progress == 100,
         }
+        if report_format == 'json':
+            if self.progress == 100:
+                response_data.update(self._get_page(request, params))
+            else:
+                response_data.update(self._get_partial_page(request, params))
         return Response(response_data)
 
+    def _parse_page_params(self, request):
+        page_params = {'filters': {}}
+        for name, default in (
+            ('limit', self.page_size),
+            ('offset', 0),
+            ('after', None),
+            ('sort', None),
+        ):
+            value = request.query_params.get(name)
+            try:
+                page_params[name] = default if value is None else int(value)
+            except ValueError:
+                raise ParseError('Invalid value for {} param'.format(name))
+            if page_params[name] is not None and page_params[name] < 0:
+                raise ParseError('Invalid value for {} param'.format(name))
+        page_params['limit'] = min(page_params['limit'], self.max_page_size)
+        page_params['desc'] = self._parse_bool_param(request, 'desc')
+        for name in self.report.filter_columns:
+            if request.query_params.get(name):
+                page_params['filters'][name] = request.query_params[name]
+        return page_params
+
+    def _get_page(self, request, params):
+        """
+        Return page of finished report (rows with ids, header and id of the
+        last row to pass as `after` param to get the next page).
+
+        Page is selected by query params: `limit`, `after` (or `offset`),
+        `sort` (index of column), `desc` and filters (ex. `service`, see
+        `filter_columns` of the report).
+        """
+        page_params = self._parse_page_params(request)
+        stored = self.report.get_stored_result(**params)
+        try:
+            if stored is None:
+                raise KeyError()
+            page = self.report.get_page(stored, **page_params)
+        except KeyError:
+            # report expired - it will be generated again
+            self._clear_cache(**params)
+            return {'progress': 0, 'finished': False}
+        except ValueError:
+            raise ParseError('Invalid value for after param')
+        except IndexError:
+            raise ParseError('Invalid value for sort param')
+        return self._format_page(page)
+
+    def _get_partial_page(self, request, params):
+        """
+        Return page of unfinished report with columns which are already
+        calculated (if report provides partial results), or nothing
+        otherwise.
+        """
+        page_params = self._parse_page_params(request)
+        stored = self.report.get_stored_result(partial=True, **params)
+        if not isinstance(stored, StoredReport):
+            return {}
+        try:
+            page = self.report.get_page(stored, **page_params)
+        except KeyError:
+            # partial result expired - it's replaced by newer one soon
+            return {}
+        except ValueError:
+            raise ParseError('Invalid value for after param')
+        except IndexError:
+            raise ParseError('Invalid value for sort param')
+        result = self._format_page(page)
+        result['partial'] = True
+        # cells of other columns are null (not calculated yet)
+        result['computed_columns'] = stored.computed_columns
+        return result
+
+    def _format_page(self, page):
+        self.header = page.header
+        self._format_header()
+        return {
+            'header': self.header,
+            'rows': [
+                {'id': row_id, 'values': row} for row_id, row in page.rows
+            ],
+            'total': page.total,
+            'next': page.next,
+        }
+
     def delete(self, request):
         self._clear_cache(**self._get_params(request))
         return Response(status=HTTP_204_NO_CONTENT)
@@ -19,6 +19,7 @@ from ralph_scrooge.rest_api.private import (
     LeftMenuAPIView,
     MonthlyCosts,
     ObjectCostsContent,
+    QueuesStats,
     ServicesCostsReportContent,
     SymbolToIdAPIView,
     UsagesReportContent,
@@ -96,6 +97,11 @@ urlpatterns = [
         service_permission(ObjectCostsContent.as_view()),
         name='pricing_object_costs'
     ),
+    url(
+        r'^queues_stats/?$',
+        superuser_permission(QueuesStats.as_view()),
+        name='queues_stats'
+    ),
     url(
         r'^submenu/?$',
         login_required(SubMenu.as_view()),
@@ -84,12 +84,15 @@ class IsTeamLeader(permissions.BasePermission):
 
 class IsServiceOwner(permissions.BasePermission):
     """Checks if given user is an owner of the service given by service_uid
-    that is coming in request's payload. Can easily be extended to get
-    service_uid from URL.
+    that is coming in request's payload (or query string, in case of safe
+    methods, like GET). Can easily be extended to get service_uid from URL.
     """
 
     def has_permission(self, request, view):
-        service_uid = request.data.get('service_uid')
+        if request.method in permissions.SAFE_METHODS:
+            service_uid = request.query_params.get('service_uid')
+        else:
+            service_uid = request.data.get('service_uid')
         if service_uid is None:
             return True
         return has_permission_to_service(
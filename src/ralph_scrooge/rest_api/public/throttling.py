@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import hashlib
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import caches as dj_caches
+from rest_framework.throttling import BaseThrottle
+
+from ralph_scrooge.utils.common import get_cache_name
+
+THROTTLE_CACHE_KEY = 'scrooge_api_throttle_{}'
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Limit rate of requests to the public API per auth token (or per user, when
+    authenticated otherwise, or per client IP address) using token bucket
+    algorithm. Bucket holds at most `API_THROTTLE_BURST` requests and it's
+    refilled continuously with `API_THROTTLE_RATE` requests per second, so
+    short bursts of requests are allowed, but not more than
+    `API_THROTTLE_RATE` requests per second on average.
+
+    Bucket is stored in cache as theoretical arrival time of the next request
+    (GCRA) - it's shared by all API processes and it's updated under lock
+    (acquired using atomic `add`), so concurrent requests are counted
+    correctly.
+    """
+    timer = time.time
+    sleep = time.sleep
+    lock_timeout = 1  # seconds
+    lock_attempts = 50
+    lock_retry_delay = 0.002  # seconds
+
+    def get_cache_key(self, request):
+        token = getattr(request.auth, 'key', None)
+        if token:
+            # don't put tokens in cache keys
+            token_hash = hashlib.sha1(token.encode('utf-8')).hexdigest()
+            return THROTTLE_CACHE_KEY.format('token_{}'.format(token_hash))
+        if request.user and request.user.is_authenticated():
+            return THROTTLE_CACHE_KEY.format(
+                'user_{}'.format(request.user.pk)
+            )
+        return THROTTLE_CACHE_KEY.format(
+            'ip_{}'.format(self.get_ident(request))
+        )
+
+    def _acquire_lock(self, cache, key):
+        """
+        Try to acquire lock of the bucket for `lock_timeout` seconds (lock of
+        crashed process expires by itself). Return True if it's acquired.
+        """
+        for attempt in range(self.lock_attempts):
+            if cache.add(key, 1, self.lock_timeout):
+                return True
+            self.sleep(self.lock_retry_delay)
+        return False
+
+    def allow_request(self, request, view):
+        burst = settings.API_THROTTLE_BURST
+        if burst is None:
+            return True
+        interval = 1 / settings.API_THROTTLE_RATE
+        cache = dj_caches[get_cache_name('scrooge_api_throttle')]
+        key = self.get_cache_key(request)
+        lock_key = '{}_lock'.format(key)
+        if not self._acquire_lock(cache, lock_key):
+            # too many concurrent requests
+            self.wait_time = self.lock_timeout
+            return False
+        try:
+            now = self.timer()
+            # bucket is full when arrival time is in the past
+            arrival_time = max(cache.get(key, now), now)
+            # time after which there will be a free token in the bucket
+            wait_time = arrival_time - now - (burst - 1) * interval
+            allowed = wait_time <= 0
+            if allowed:
+                arrival_time += interval
+                # bucket is not needed when it's full again
+                cache.set(
+                    key,
+                    arrival_time,
+                    int(math.ceil(arrival_time - now)) + 1,
+                )
+            self.wait_time = max(wait_time, 0)
+        finally:
+            cache.delete(lock_key)
+        return allowed
+
+    def wait(self):
+        return self.wait_time
@@ -1,7 +1,187 @@
-from rest_framework.pagination import LimitOffsetPagination
+import base64
+import json
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, LimitOffsetPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
 
 class ScroogeLimitOffsetPagination(LimitOffsetPagination):
     # cannot set it through rest framework settings (PAGE_SIZE) - it would
     # break existing endpoints (add count, next and results to response json)
     default_limit = 50
+
+
+def get_keyset_query(ordering, position):
+    """
+    Return query selecting rows placed after `position` (values of
+    `ordering` fields), ex. for ordering (a, b) and position (x, y):
+    (a >= x) AND (a > x OR b > y) - condition on the first field alone
+    allows database (MySQL) to use index range scan.
+    """
+    query = None
+    for field, value in reversed(zip(ordering, position)):
+        after = Q(**{'{}__gt'.format(field): value})
+        if query is not None:
+            after = Q(**{'{}__gte'.format(field): value}) & (after | query)
+        query = after
+    return query
+
+
+def get_keyset_position(ordering, row):
+    """
+    Return JSON-serializable position (values of `ordering` fields) of row
+    (model instance or dict returned by `values()`).
+    """
+    position = []
+    for field in ordering:
+        value = row[field] if isinstance(row, dict) else getattr(row, field)
+        position.append(
+            value.isoformat() if hasattr(value, 'isoformat') else value
+        )
+    return position
+
+
+def iterate_by_keyset(queryset, ordering, batch_size):
+    """
+    Yield all rows of queryset, fetched in batches (every batch starts right
+    after the last row of the previous one, so no rows are skipped by
+    database as with OFFSET).
+    """
+    queryset = queryset.order_by(*ordering)
+    batch = list(queryset[:batch_size])
+    while batch:
+        for row in batch:
+            yield row
+        if len(batch) < batch_size:
+            return
+        batch = list(queryset.filter(get_keyset_query(
+            ordering, get_keyset_position(ordering, batch[-1])
+        ))[:batch_size])
+
+
+class ScroogeKeysetPagination(BasePagination):
+    """
+    Keyset (seek) pagination - instead of skipping `offset` rows, page starts
+    right after the last row of the previous page, which is passed in
+    (opaque) `cursor` query param. Rows are ordered by `ordering` fields,
+    which together have to be unique.
+
+    Count of results is not returned, but every page is fetched as fast as
+    the first one.
+    """
+    ordering = ('id',)
+    cursor_query_param = 'cursor'
+    limit_query_param = 'limit'
+    default_limit = 50
+    invalid_cursor_message = 'Invalid cursor'
+
+    def get_max_limit(self, request):
+        if request.user.is_authenticated() and request.user.groups.filter(
+            name=settings.SERVICE_ACCOUNTS_GROUP_NAME
+        ).exists():
+            return settings.API_KEYSET_SERVICE_ACCOUNT_MAX_LIMIT
+        return settings.API_KEYSET_MAX_LIMIT
+
+    def get_limit(self, request):
+        try:
+            limit = int(request.query_params[self.limit_query_param])
+        except (KeyError, ValueError):
+            return self.default_limit
+        if limit <= 0:
+            return self.default_limit
+        return min(limit, self.get_max_limit(request))
+
+    def encode_cursor(self, position):
+        return base64.urlsafe_b64encode(json.dumps(position))
+
+    def decode_cursor(self, request):
+        """
+        Return position passed in cursor (or None for the first page).
+        """
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None
+        try:
+            position = json.loads(
+                base64.urlsafe_b64decode(cursor.encode('ascii'))
+            )
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if (
+            not isinstance(position, list) or
+            len(position) != len(self.ordering)
+        ):
+            raise NotFound(self.invalid_cursor_message)
+        return position
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.limit = self.get_limit(request)
+        position = self.decode_cursor(request)
+        queryset = queryset.order_by(*self.ordering)
+        if position is not None:
+            queryset = queryset.filter(
+                get_keyset_query(self.ordering, position)
+            )
+        # one more row is fetched to check if there is a next page
+        results = list(queryset[:self.limit + 1])
+        self.next_position = None
+        if len(results) > self.limit:
+            results = results[:self.limit]
+            self.next_position = get_keyset_position(
+                self.ordering, results[-1]
+            )
+        return results
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            self.encode_cursor(self.next_position),
+        )
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
+
+
+class DailyUsageKeysetPagination(ScroogeKeysetPagination):
+    ordering = ('date', 'id')
+
+
+class DailyUsagePagination(ScroogeLimitOffsetPagination):
+    """
+    Limit-offset pagination (for compatibility with existing clients), unless
+    `cursor` query param is given (it's empty for the first page) - then
+    keyset pagination on (date, id) is used.
+    """
+    keyset_pagination_class = DailyUsageKeysetPagination
+
+    def __init__(self):
+        self.keyset_pagination = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.keyset_pagination_class.cursor_query_param in (
+            request.query_params
+        ):
+            self.keyset_pagination = self.keyset_pagination_class()
+            return self.keyset_pagination.paginate_queryset(
+                queryset, request, view
+            )
+        return super(DailyUsagePagination, self).paginate_queryset(
+            queryset, request, view
+        )
+
+    def get_paginated_response(self, data):
+        if self.keyset_pagination is not None:
+            return self.keyset_pagination.get_paginated_response(data)
+        return super(DailyUsagePagination, self).get_paginated_response(data)
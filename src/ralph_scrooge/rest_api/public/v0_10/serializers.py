@@ -5,6 +5,8 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+from collections import OrderedDict
+
 from rest_framework import serializers
 
 from ralph_scrooge.models import (
@@ -82,3 +84,50 @@ class DailyUsageSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'date', 'type', 'service_environment', 'value', 'remarks'
         ]
+
+
+class DailyUsageValuesSerializer(object):
+    """
+    Lightweight counterpart of `DailyUsageSerializer` - daily usages are
+    fetched using `values()` (with `values_fields`) instead of model
+    instances, and converted to the same representation without fields
+    machinery.
+    """
+    values_fields = (
+        'id',
+        'date',
+        'value',
+        'remarks',
+        'type_id',
+        'type__name',
+        'type__symbol',
+        'type__support_team',
+        'service_environment_id',
+        'service_environment__service__name',
+        'service_environment__service__ci_uid',
+        'service_environment__environment__name',
+    )
+
+    @classmethod
+    def to_representation(cls, row):
+        return OrderedDict([
+            ('id', row['id']),
+            ('date', row['date'].isoformat()),
+            ('type', OrderedDict([
+                ('id', row['type_id']),
+                ('name', row['type__name']),
+                ('symbol', row['type__symbol']),
+                ('support_team', row['type__support_team']),
+            ])),
+            ('service_environment', OrderedDict([
+                ('id', row['service_environment_id']),
+                ('service', row['service_environment__service__name']),
+                (
+                    'environment',
+                    row['service_environment__environment__name']
+                ),
+                ('service_uid', row['service_environment__service__ci_uid']),
+            ])),
+            ('value', row['value']),
+            ('remarks', row['remarks']),
+        ])
@@ -6,28 +6,45 @@ from __future__ import print_function
 from __future__ import unicode_literals
 
 import datetime
-from copy import deepcopy
+import hashlib
+import json
+from collections import defaultdict
+from itertools import groupby
 
 from dateutil.relativedelta import relativedelta
-from django.db.models import Sum
+from django.conf import settings
+from django.core.cache import caches as dj_caches
+from django.db.models import Q, Sum
 from django.db.models.functions import TruncMonth
+from django.http import StreamingHttpResponse
+from django.utils.http import parse_etags, quote_etag
 from rest_framework import serializers
+from rest_framework import status
 from rest_framework.authentication import TokenAuthentication
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 from rest_framework.serializers import Serializer
 from rest_framework.views import APIView
 
+from ralph_scrooge.db_router import use_replica
 from ralph_scrooge.models import (
     BaseUsage,
     CostDateStatus,
     DailyCost,
     Service,
     ServiceEnvironment,
+    ServiceOwnership,
     UsageType,
 )
 from ralph_scrooge.rest_api.public.auth import IsServiceOwner
+from ralph_scrooge.rest_api.public.throttling import TokenBucketThrottle
 from ralph_scrooge.utils.cache import memoize
+from ralph_scrooge.utils.common import get_cache_name
+from ralph_scrooge.utils.dimensions import (
+    get_costs_versions,
+    get_dimensions_version,
+)
 
 USAGE_COST_NUM_DIGITS = 2
 USAGE_VALUE_NUM_DIGITS = 5
@@ -35,6 +52,9 @@ GROUP_BY_CHOICES = (
     ('day', 'day'),
     ('month', 'month'),
 )
+COSTS_CACHE_KEY = 'scrooge_service_environment_costs_{}'
+# responses are cached per ETag, so they don't have to expire to be fresh
+COSTS_CACHE_TIMEOUT = 60 * 60 * 24  # 24 hours
 
 
 @memoize
@@ -47,9 +67,7 @@ def get_valid_types():
     )
 
 
-class ServiceEnvironmentCostsDeserializer(Serializer):
-    service_uid = serializers.CharField()
-    environment = serializers.CharField(required=False)
+class BaseCostsDeserializer(Serializer):
     date_from = serializers.DateField()
     date_to = serializers.DateField()
     group_by = serializers.ChoiceField(choices=GROUP_BY_CHOICES)
@@ -82,7 +100,10 @@ class ServiceEnvironmentCostsDeserializer(Serializer):
             raise serializers.ValidationError(err)
         return types_validated
 
-    def validate(self, attrs):
+    def _get_errors(self, attrs):
+        """Return list of errors of `attrs` (objects found during validation
+        could be stored in `attrs` under keys starting with `_`).
+        """
         errors = []
 
         # Validate correctness of date range.
@@ -90,6 +111,32 @@ class ServiceEnvironmentCostsDeserializer(Serializer):
         date_to = attrs.get('date_to')
         if date_from > date_to:
             errors.append("'date_from' should be less or equal to 'date_to'")
+        return errors
+
+    def validate(self, attrs):
+        errors = self._get_errors(attrs)
+
+        # Since `types` field is not required, but we want some default values
+        # in case it's not provided, we have to do that here (`validate_types`
+        # will only catch `types == []` case, but not the one where this field
+        # is completely omitted).
+        if attrs.get('types') is None:
+            attrs['types'] = get_valid_types()
+
+        if errors:
+            err_msg = '{}.'.format('; '.join(errors))
+            raise serializers.ValidationError(err_msg)
+        return attrs
+
+
+class ServiceEnvironmentCostsDeserializer(BaseCostsDeserializer):
+    service_uid = serializers.CharField()
+    environment = serializers.CharField(required=False)
+
+    def _get_errors(self, attrs):
+        errors = super(ServiceEnvironmentCostsDeserializer, self)._get_errors(
+            attrs
+        )
 
         service_uid = attrs.get('service_uid')
         env = attrs.get('environment')
@@ -120,18 +167,61 @@ class ServiceEnvironmentCostsDeserializer(Serializer):
                 )
             else:
                 attrs['_service_environment'] = service_env
+        return errors
 
-        # Since `types` field is not required, but we want some default values
-        # in case it's not provided, we have to do that here (`validate_types`
-        # will only catch `types == []` case, but not the one where this field
-        # is completely omitted).
-        if attrs.get('types') is None:
-            attrs['types'] = get_valid_types()
 
-        if errors:
-            err_msg = '{}.'.format('; '.join(errors))
-            raise serializers.ValidationError(err_msg)
-        return attrs
+class ServiceEnvironmentSelectorDeserializer(Serializer):
+    service_uid = serializers.CharField()
+    environment = serializers.CharField(required=False)
+
+
+class ServiceEnvironmentsCostsDeserializer(BaseCostsDeserializer):
+    # when not given, all service environments are taken into account
+    service_environments = ServiceEnvironmentSelectorDeserializer(
+        many=True, required=False
+    )
+
+    def _get_errors(self, attrs):
+        """Find service environments selected by `service_environments`
+        (every environment of service is selected when `environment` is not
+        given) - they are stored under `_service_environments` key (None if
+        all service environments should be used).
+        """
+        errors = super(ServiceEnvironmentsCostsDeserializer, self)._get_errors(
+            attrs
+        )
+        selectors = attrs.get('service_environments')
+        if selectors is None:
+            attrs['_service_environments'] = None
+            return errors
+        service_envs = defaultdict(dict)
+        for service_env in ServiceEnvironment.objects.filter(
+            service__ci_uid__in=set(s['service_uid'] for s in selectors)
+        ).select_related('service', 'environment'):
+            service_envs[service_env.service.ci_uid][
+                service_env.environment.name
+            ] = service_env
+        selected = {}
+        for selector in selectors:
+            service_uid = selector['service_uid']
+            env = selector.get('environment')
+            if service_uid not in service_envs:
+                errors.append(
+                    'service with UID "{}" does not exist'.format(service_uid)
+                )
+            elif not env:
+                for service_env in service_envs[service_uid].values():
+                    selected[service_env.id] = service_env
+            elif env not in service_envs[service_uid]:
+                errors.append(
+                    'service environment for service with UID "{}" and '
+                    'environment "{}" does not exist'.format(service_uid, env)
+                )
+            else:
+                service_env = service_envs[service_uid][env]
+                selected[service_env.id] = service_env
+        attrs['_service_environments'] = selected.values()
+        return errors
 
 
 class CostAndUsageValueSerializer(Serializer):
@@ -173,6 +263,18 @@ class ServiceEnvironmentMonthlyCostsSerializer(Serializer):
     service_environment_costs = MonthlyCostsSerializer(many=True)
 
 
+class ServiceEnvironmentDailyCostsLineSerializer(Serializer):
+    service_uid = serializers.CharField()
+    environment = serializers.CharField()
+    service_environment_costs = DailyCostsSerializer(many=True)
+
+
+class ServiceEnvironmentMonthlyCostsLineSerializer(Serializer):
+    service_uid = serializers.CharField()
+    environment = serializers.CharField()
+    service_environment_costs = MonthlyCostsSerializer(many=True)
+
+
 def date_range(start, stop, step=datetime.timedelta(days=1)):
     """This function is similar to "normal" `range`, but it operates on dates
     instead of numbers. Taken from "Python Cookbook, 3rd ed.".
@@ -191,44 +293,6 @@ def round_safe(value, precision):
     return round(value, precision)
 
 
-def _get_total_costs(qs, date_selector):
-    """Sums `cost` fields by time period given as `date_selector` (i.e. "day",
-    "month"), in queryset given as `qs`.
-
-    Please note that "other" costs (i.e. not associated with those that are
-    selected explicitly via `type` field in HTTP request) are also taken into
-    account here (hence name "total costs")!
-    """
-    total_costs = {}
-    results = qs.filter(depth=0).values(date_selector).annotate(
-        Sum('cost')
-    ).order_by(date_selector)
-    for r in results:
-        total_costs[r[date_selector]] = r['cost__sum']
-    return total_costs
-
-
-def _round_recursive(usages_and_costs):
-    """Performs rounding of values in `cost` and `usage_value` fields. And
-    because `usages_and_costs` dict can be actually a tree (costs having
-    subcosts), it does that in a recursive manner.
-    """
-    rounded = {}
-    if usages_and_costs is not None:
-        for k, v in usages_and_costs.iteritems():
-            rounded[k] = v
-            rounded[k].update({
-                'cost': round_safe(v['cost'], USAGE_COST_NUM_DIGITS),
-                'usage_value': round_safe(
-                    v['usage_value'], USAGE_VALUE_NUM_DIGITS
-                ),
-            })
-            subcosts = v.get('subcosts')
-            if subcosts is not None:
-                rounded[k]['subcosts'] = _round_recursive(subcosts)
-    return rounded
-
-
 def fetch_costs(
         service_env,
         service,
@@ -308,17 +372,9 @@ def fetch_costs(
     and `usage_values` is controlled by `USAGE_COST_NUM_DIGITS` and
     `USAGE_VALUE_NUM_DIGITS` defined in this module.
     """
-    date_range_query_params = {
-        'date__gte': date_from,
-        'date__lte': date_to,
-    }
-    if accepted_only and forecast:
-        date_range_query_params['forecast_accepted'] = True
-    elif accepted_only:
-        date_range_query_params['accepted'] = True
-    filtered_dates = CostDateStatus.objects.filter(
-        **date_range_query_params
-    ).values_list('date', flat=True)
+    filtered_dates = _get_filtered_dates(
+        date_from, date_to, accepted_only, forecast
+    )
 
     query_params = {
         'date__in': filtered_dates,
@@ -332,21 +388,8 @@ def fetch_costs(
     else:
         # This shouldn't happen.
         return {'service_environment_costs': []}
-    initial_qs = DailyCost.objects_tree.filter(**query_params)
-
-    if group_by == 'month':
-        selector = 'month'
-        initial_qs = initial_qs.annotate(month=TruncMonth('date'))
-    else:
-        selector = 'date'
-
-    total_costs = _get_total_costs(initial_qs, selector)
-
-    aggregated_costs = initial_qs.values(
-        selector, 'path', 'type__symbol', 'type__name'
-    ).annotate(
-        cost_sum=Sum('cost'), value_sum=Sum('value')
-    )
+    initial_qs, selector = _get_initial_queryset(query_params, group_by)
+    aggregated_costs = _get_aggregated_costs(initial_qs, selector, types)
 
     # Post-process aggregated costs, as they are in form of "raw", flat
     # records from DB, but in reality, costs and subcosts are trees, so we need
@@ -355,14 +398,226 @@ def fetch_costs(
     # otherwise, re-creating such tree structure would require at least a
     # couple of separate queries, which would have negative impact on
     # performance.
-    cost_trees = _create_trees(aggregated_costs, selector)
-    cost_trees_ = _replace_path_with_type_symbol(cost_trees)
-    cost_trees_filtered = _filter_by_types(cost_trees_, types)
+    cost_trees, total_costs = _build_cost_trees(
+        aggregated_costs, selector, types
+    )
+    return {
+        'service_environment_costs': _summarize_costs(
+            cost_trees,
+            total_costs,
+            date_from,
+            date_to,
+            group_by,
+            filtered_dates,
+        )
+    }
+
+
+def fetch_service_environments_costs(
+        service_envs,
+        types,
+        date_from,
+        date_to,
+        group_by,
+        accepted_only=False,
+        forecast=False,
+):
+    """The same as `fetch_costs`, but costs of many service environments
+    are fetched at once (using single grouped query for all of them). If
+    `service_envs` is None, costs of all service environments are fetched.
 
-    # Assembly the final result (i.e., the dict that will be returned as JSON).
-    final_result = {
-        'service_environment_costs': []
+    Yield pair (service environment id, summarizations of its costs) for
+    every service environment (ordered by id) - costs of next service
+    environment are post-processed only when previous pair is consumed.
+    """
+    filtered_dates = list(_get_filtered_dates(
+        date_from, date_to, accepted_only, forecast
+    ))
+    query_params = {
+        'date__in': filtered_dates,
+        'depth__lte': 1,
+        'forecast': forecast,
     }
+    if service_envs is None:
+        service_env_ids = ServiceEnvironment.objects.order_by(
+            'id'
+        ).values_list('id', flat=True)
+    else:
+        service_env_ids = sorted(se.id for se in service_envs)
+        query_params['service_environment__in'] = service_env_ids
+    initial_qs, selector = _get_initial_queryset(query_params, group_by)
+    aggregated_costs = _get_aggregated_costs(
+        initial_qs, selector, types, 'service_environment_id'
+    ).order_by('service_environment_id')
+    aggregated_costs_by_service_env = groupby(
+        aggregated_costs.iterator(),
+        key=lambda ac: ac['service_environment_id'],
+    )
+
+    # both service environments and their costs are ordered by id, so costs
+    # could be matched with service environments in a single pass
+    service_env_id, service_env_costs = next(
+        aggregated_costs_by_service_env, (None, [])
+    )
+    for se_id in service_env_ids:
+        cost_trees, total_costs = {}, {}
+        while service_env_id is not None and service_env_id <= se_id:
+            if service_env_id == se_id:
+                cost_trees, total_costs = _build_cost_trees(
+                    service_env_costs, selector, types
+                )
+            service_env_id, service_env_costs = next(
+                aggregated_costs_by_service_env, (None, [])
+            )
+        yield se_id, _summarize_costs(
+            cost_trees,
+            total_costs,
+            date_from,
+            date_to,
+            group_by,
+            filtered_dates,
+        )
+
+
+def _get_filtered_dates(date_from, date_to, accepted_only, forecast):
+    """Return dates between `date_from` and `date_to` for which costs could
+    be returned (only accepted ones, if `accepted_only` is True).
+    """
+    date_range_query_params = {
+        'date__gte': date_from,
+        'date__lte': date_to,
+    }
+    if accepted_only and forecast:
+        date_range_query_params['forecast_accepted'] = True
+    elif accepted_only:
+        date_range_query_params['accepted'] = True
+    return CostDateStatus.objects.filter(
+        **date_range_query_params
+    ).values_list('date', flat=True)
+
+
+def _get_initial_queryset(query_params, group_by):
+    """Return queryset of DailyCosts filtered by `query_params` and name of
+    the field by which they should be grouped (`date` or `month`).
+    """
+    initial_qs = DailyCost.objects_tree.filter(**query_params)
+    if group_by == 'month':
+        return initial_qs.annotate(month=TruncMonth('date')), 'month'
+    return initial_qs, 'date'
+
+
+def _get_aggregated_costs(initial_qs, date_selector, types, *fields):
+    """Return costs from `initial_qs` summed per period given by
+    `date_selector` (and per path and type). Top-level costs of every type
+    are returned (all of them are needed to calculate total costs), but
+    subcosts only of costs of `types` - path of subcost starts with type of
+    its parent cost (see `MultiPathNode._parse_path`).
+    """
+    query = Q(depth=0)
+    for type_ in types:
+        query |= Q(
+            depth=1,
+            path__startswith='{}{}'.format(type_.id, DailyCost._path_link),
+        )
+    return initial_qs.filter(query).values(
+        date_selector,
+        'depth',
+        'path',
+        'type',
+        'type__symbol',
+        'type__name',
+        *fields
+    ).annotate(
+        cost_sum=Sum('cost'), value_sum=Sum('value')
+    )
+
+
+def _build_cost_trees(aggregated_costs, date_selector, types):
+    """Build (in a single pass over `aggregated_costs`, in any order) trees
+    of rounded costs of `types` and total costs of all types per period.
+
+    Every record of `aggregated_costs` (see `_get_aggregated_costs`) has the
+    following (flat) structure:
+
+    date (as `date` or `month` - depending on `date_selector`), e.g.
+        datetime.date(2016, 10, 7)
+    depth (as `depth`), e.g. 1
+    path (as `path`), e.g. '484/483'
+    base usage type id (as `type`), e.g. 483
+    base usage type symbol (as `type__symbol`), e.g. 'subtype2'
+    base usage type name (as `type__name`), e.g. 'Subtype 2'
+    cost (as `cost_sum`), e.g. Decimal('222.00')
+    usage value (as `value_sum`), e.g. 2.0
+
+    Cost trees are returned as dict (keyed by date) of trees with the
+    following form:
+
+    {
+        'type1': {
+            'cost': 333.0,
+            'usage_value': 0.0,
+            'type': 'Type 1',
+            'subcosts': {
+                'subtype1': {
+                    'cost': 111.0,
+                    'usage_value': 1.0,
+                    'type': 'Subtype 1'
+                },
+                'subtype2': {
+                    'cost': 222.0,
+                    'usage_value': 2.0,
+                    'type': 'Subtype 2'
+                }
+            }
+        }
+    }
+
+    The pairing between costs and subcosts is done via the `path` component
+    (e.g. a cost with '484/483' is a subcost of '484').
+    """
+    type_ids = set(t.id for t in types)
+    cost_trees = defaultdict(dict)
+    total_costs = {}
+    # subcosts per (date, path of parent cost) - subcost could be processed
+    # before its parent cost
+    subcosts = defaultdict(dict)
+    for ac in aggregated_costs:
+        date_ = ac[date_selector]
+        cost = {
+            'cost': round_safe(ac['cost_sum'], USAGE_COST_NUM_DIGITS),
+            'usage_value': round_safe(
+                ac['value_sum'], USAGE_VALUE_NUM_DIGITS
+            ),
+            'type': ac['type__name'],
+        }
+        if ac['depth'] == 0:
+            # "other" costs (i.e. not associated with `types`) are also taken
+            # into account in total costs
+            total_costs[date_] = total_costs.get(date_, 0) + ac['cost_sum']
+            if ac['type'] in type_ids:
+                cost['subcosts'] = subcosts[date_, ac['path']]
+                cost_trees[date_][ac['type__symbol']] = cost
+        else:
+            parent_path = ac['path'].split(DailyCost._path_link)[0]
+            subcosts[date_, parent_path][ac['type__symbol']] = cost
+    return cost_trees, total_costs
+
+
+def _summarize_costs(
+        cost_trees,
+        total_costs,
+        date_from,
+        date_to,
+        group_by,
+        filtered_dates,
+):
+    """Return summarizations of costs (for every day or month between
+    `date_from` and `date_to`) from `cost_trees` and `total_costs` (see
+    `_build_cost_trees`) - see `fetch_costs` for details.
+    """
+    # Assembly the final result (i.e., the list that will be returned as
+    # JSON).
+    service_environment_costs = []
     if group_by == 'month':
         delta = relativedelta(months=1)
         date_range_ = date_range(
@@ -397,165 +652,227 @@ def fetch_costs(
             'total_cost': round_safe(
                 total_cost_for_date, USAGE_COST_NUM_DIGITS
             ),
-            'costs': _round_recursive(cost_trees_filtered.get(date_, {})),
+            'costs': cost_trees.get(date_, {}),
         }
-        final_result['service_environment_costs'].append(costs_for_date)
-    return final_result
-
-
-def _create_trees(aggregated_costs, date_selector):
-    """From `aggregated_costs`, where each record (`ac`) has the following
-    (flat) structure:
-
-    date (as `date` or `month` - depending on `date_selector`, which may be
-        "day" or "month" - in the former case it will be `date`, and `month`
-        in the latter), e.g. datetime.datetime(2016, 10, 7, 0, 0)
-    path (as `path`), e.g. '484/483'
-    base usage type symbol (as `type__symbol`), e.g. 'subtype2'
-    cost (as `cost_sum`), e.g. Decimal('222.00')
-    usage value (as `value_sum`), e.g. 2.0
+        service_environment_costs.append(costs_for_date)
+    return service_environment_costs
 
-    ...create a dict `cost_trees`, where each entry is a tree with the
-    following form:
 
-    datetime.date(2016, 10, 7): {
-        '484': {
-            '_type_symbol': 'type1',
-            'cost': Decimal('333.00'),
-            'usage_value': 0.0,
-            'type': 'Type 1',
-            'subcosts': {  #  subcosts are optional
-                '484/482': {
-                    '_type_symbol': 'subtype1',
-                    'cost': Decimal('111.00'),
-                    'usage_value': 1.0,
-                    'type': 'Subtype 1'
-                },
-                '484/483': {
-                    '_type_symbol': 'subtype2',
-                    'cost': Decimal('222.00'),
-                    'usage_value': 2.0,
-                    'type': 'Subtype 2'
-                }
-            }
-        }
-    }
+def get_costs_etag(params):
+    """Return ETag of costs fetched with `params` (validated data of
+    `ServiceEnvironmentCostsDeserializer`), without fetching them.
 
-    The pairing between costs and subcosts is done via the `path` component
-    (e.g. a cost with '484/483' is a subcost of '484').
+    ETag is derived from `params`, accepted flags (see `CostDateStatus`) and
+    version of costs (see `get_costs_versions`) of every date in the range
+    and dimensions version (names and symbols of types are returned together
+    with costs), so it's changed every time when costs could change.
     """
-    cost_trees = {}
-    # We need to process all parent costs before processing any subcosts -
-    # hence order by `depth` here.
-    for ac in aggregated_costs.order_by('depth'):
-        date_ = ac[date_selector]
-        d = {
-            ac['path']: {
-                # `_type_symbol` is just a temporary key, that is removed later
-                # in the process, so anyone dealing with this code shouldn't
-                # rely on it (hence it starts with `_`).
-                '_type_symbol': ac['type__symbol'],
-                'cost': ac['cost_sum'],
-                'usage_value': ac['value_sum'],
-                'type': ac['type__name'],
-            }
-        }
-        if "/" in ac['path']:
-            parent = ac['path'].split("/")[0]
-            if cost_trees[date_].get(parent) is None:
-                cost_trees[date_][parent] = {'subcosts': d}
-            else:
-                if cost_trees[date_][parent].get('subcosts') is None:
-                    cost_trees[date_][parent]['subcosts'] = d
-                else:
-                    cost_trees[date_][parent]['subcosts'].update(d)
-        else:
-            d[ac['path']].update({'subcosts': {}})
-            if cost_trees.get(date_) is None:
-                cost_trees[date_] = d
-            else:
-                cost_trees[date_].update(d)
-    return cost_trees
+    statuses = list(CostDateStatus.objects.filter(
+        date__gte=params['date_from'],
+        date__lte=params['date_to'],
+    ).order_by('date').values_list('date', 'accepted', 'forecast_accepted'))
+    versions = get_costs_versions([date_ for date_, _, _ in statuses])
+    service_env = params.get('_service_environment')
+    service = params.get('_service')
+    key = [
+        service_env.id if service_env else None,
+        service.id if service else None,
+        sorted(t.id for t in params['types']),
+        params['date_from'].isoformat(),
+        params['date_to'].isoformat(),
+        params['group_by'],
+        params['accepted_only'],
+        params['forecast'],
+        get_dimensions_version(),
+        [
+            (date_.isoformat(), accepted, forecast_accepted, versions[date_])
+            for date_, accepted, forecast_accepted in statuses
+        ],
+    ]
+    return hashlib.md5(json.dumps(key)).hexdigest()
 
 
-def _replace_path_with_type_symbol(cost_trees):
-    """Having a dict with cost trees (for the description of its structure
-    see `_create_trees` function`), replace `path` components (e.g. '484',
-    '484/482', '484/483') with the contents of the `_type_symbol` field and
-    finally remove that field.
-    So in the case described in `create_trees`, '484' will become 'type1',
-    '484/482' will become 'subtype1' and '484/483' will be 'subtype2'.
+def estimate_costs_query_cost(date_from, date_to, service_envs_count, types):
+    """Return estimated cost of fetching costs - number of (date, service
+    environment, type) combinations which have to be aggregated.
+
+    >>> estimate_costs_query_cost(
+    ...     datetime.date(2017, 1, 1), datetime.date(2017, 1, 31), 2, [1, 2]
+    ... )
+    124
     """
-    cost_trees_ = {}
-    tmp_dict = {}
-    for k, v in cost_trees.items():
-        if k == 'subcosts':
-            for kk, vv in v.items():
-                type_symbol = vv.pop('_type_symbol')
-                d = {type_symbol: vv}
-                if tmp_dict.get(k) is not None:
-                    tmp_dict[k].update(d)
-                else:
-                    tmp_dict[k] = d
-        elif type(v) == dict:
-            for kk, vv in v.items():
-                type_symbol = vv.pop('_type_symbol')
-                d = {type_symbol: _replace_path_with_type_symbol(vv)}
-                if cost_trees_.get(k) is not None:
-                    cost_trees_[k].update(d)
-                else:
-                    cost_trees_[k] = d
-        else:
-            tmp_dict[k] = v
-    cost_trees_.update(tmp_dict)
-    return cost_trees_
+    days = (date_to - date_from).days + 1
+    return days * service_envs_count * len(types)
 
 
-def _filter_by_types(cost_trees, types):
-    """Makes a copy of `cost_trees` and filters out top-level costs from it
-    if their types are not in `types`.
+def check_costs_query_cost(params, service_envs_count):
+    """Return error response if estimated cost of fetching costs for `params`
+    (validated data of costs deserializer) exceeds `API_COSTS_QUERY_MAX_COST`
+    (None otherwise).
     """
-    cost_trees_ = deepcopy(cost_trees)
-    types_ = [t.symbol for t in types]
-    for date_, parent_cost in cost_trees_.iteritems():
-        for type_ in parent_cost.keys():
-            if type_ not in types_:
-                del parent_cost[type_]
-    return cost_trees_
+    cost = estimate_costs_query_cost(
+        params['date_from'], params['date_to'], service_envs_count,
+        params['types'],
+    )
+    if cost <= settings.API_COSTS_QUERY_MAX_COST:
+        return None
+    return Response(
+        {'non_field_errors': [
+            'Query is too expensive (estimated cost: {}, max cost: {}) - '
+            'narrow date range, service environments or types.'.format(
+                cost, settings.API_COSTS_QUERY_MAX_COST
+            )
+        ]},
+        status=400,
+    )
 
 
 class ServiceEnvironmentCosts(APIView):
     authentication_classes = (TokenAuthentication,)
     permission_classes = (IsAuthenticated, IsServiceOwner)
+    throttle_classes = (TokenBucketThrottle,)
+    serializer_classes = {
+        'day': ServiceEnvironmentDailyCostsSerializer,
+        'month': ServiceEnvironmentMonthlyCostsSerializer,
+    }
 
-    def post(self, request, *args, **kwargs):
-        deserializer = ServiceEnvironmentCostsDeserializer(data=request.data)
-        if deserializer.is_valid():
-            service_env = deserializer.validated_data.get('_service_environment')  # noqa: E501
-            service = deserializer.validated_data.get('_service')
-            types = deserializer.validated_data['types']
-            date_from = deserializer.validated_data['date_from']
-            date_to = deserializer.validated_data['date_to']
-            group_by = deserializer.validated_data['group_by']
-            accepted_only = deserializer.validated_data['accepted_only']
-            forecast = deserializer.validated_data['forecast']
-
+    def _get_costs(self, params, etag):
+        """Return serialized costs for `params` - they are cached (server
+        side) under `etag`, so the same costs are not fetched twice.
+        """
+        cache = dj_caches[get_cache_name('scrooge_costs_api')]
+        cache_key = COSTS_CACHE_KEY.format(etag)
+        data = cache.get(cache_key)
+        if data is None:
             costs = fetch_costs(
-                service_env,
-                service,
-                types,
-                date_from,
-                date_to,
-                group_by,
-                accepted_only,
-                forecast,
+                params.get('_service_environment'),
+                params.get('_service'),
+                params['types'],
+                params['date_from'],
+                params['date_to'],
+                params['group_by'],
+                params['accepted_only'],
+                params['forecast'],
             )
-            if group_by == 'day':
-                return Response(
-                    ServiceEnvironmentDailyCostsSerializer(costs).data
-                )
-            elif group_by == 'month':
+            data = self.serializer_classes[params['group_by']](costs).data
+            cache.set(cache_key, data, COSTS_CACHE_TIMEOUT)
+        return data
+
+    def _get_response(self, request, data, conditional=False):
+        deserializer = ServiceEnvironmentCostsDeserializer(data=data)
+        if not deserializer.is_valid():
+            return Response(deserializer.errors, status=400)
+        params = deserializer.validated_data
+        if params.get('_service_environment'):
+            service_envs_count = 1
+        else:
+            service_envs_count = ServiceEnvironment.objects.filter(
+                service=params['_service']
+            ).count()
+        error_response = check_costs_query_cost(params, service_envs_count)
+        if error_response is not None:
+            return error_response
+        # versions of costs used by ETag are bumped when costs are committed
+        # to the default database, so costs cached under ETag (and ETag
+        # itself) are not read from replica, which could be lagging behind
+        with use_replica(False):
+            etag = get_costs_etag(params)
+            headers = {'ETag': quote_etag(etag)}
+            if conditional and request.META.get('HTTP_IF_NONE_MATCH'):
+                etags = parse_etags(request.META['HTTP_IF_NONE_MATCH'])
+                if etag in etags or '*' in etags:
+                    return Response(
+                        status=status.HTTP_304_NOT_MODIFIED, headers=headers
+                    )
+            return Response(self._get_costs(params, etag), headers=headers)
+
+    def get(self, request, *args, **kwargs):
+        """The same as `post`, but params are passed in query string (`types`
+        param could be repeated) and response is not sent again (304 is
+        returned instead) when ETag given in `If-None-Match` header is still
+        valid.
+        """
+        data = request.query_params.dict()
+        if 'types' in request.query_params:
+            data['types'] = request.query_params.getlist('types')
+        return self._get_response(request, data, conditional=True)
+
+    def post(self, request, *args, **kwargs):
+        return self._get_response(request, request.data)
+
+
+class ServiceEnvironmentsCosts(APIView):
+    """Costs of many service environments at once (all service environments
+    owned by the user, when `service_environments` are not given). Costs are
+    streamed as newline-delimited JSON - one line (in the same format as
+    returned by `ServiceEnvironmentCosts`, extended by `service_uid` and
+    `environment`) per service environment.
+    """
+    authentication_classes = (TokenAuthentication,)
+    permission_classes = (IsAuthenticated,)
+    throttle_classes = (TokenBucketThrottle,)
+    serializer_classes = {
+        'day': ServiceEnvironmentDailyCostsLineSerializer,
+        'month': ServiceEnvironmentMonthlyCostsLineSerializer,
+    }
+
+    def _get_lines(self, service_envs, params):
+        """Yield costs of every service environment as JSON line."""
+        serializer_class = self.serializer_classes[params['group_by']]
+        renderer = JSONRenderer()
+        if service_envs is None:
+            service_envs_by_id = ServiceEnvironment.objects.select_related(
+                'service', 'environment',
+            ).in_bulk()
+        else:
+            service_envs_by_id = {se.id: se for se in service_envs}
+        for service_env_id, costs in fetch_service_environments_costs(
+            service_envs,
+            params['types'],
+            params['date_from'],
+            params['date_to'],
+            params['group_by'],
+            params['accepted_only'],
+            params['forecast'],
+        ):
+            service_env = service_envs_by_id[service_env_id]
+            yield renderer.render(serializer_class({
+                'service_uid': service_env.service.ci_uid,
+                'environment': service_env.environment.name,
+                'service_environment_costs': costs,
+            }).data) + b'\n'
+
+    def post(self, request, *args, **kwargs):
+        deserializer = ServiceEnvironmentsCostsDeserializer(data=request.data)
+        if not deserializer.is_valid():
+            return Response(deserializer.errors, status=400)
+        params = deserializer.validated_data
+        service_envs = params['_service_environments']
+        if not request.user.is_superuser:
+            owned_services = set(ServiceOwnership.objects.filter(
+                owner=request.user
+            ).values_list('service_id', flat=True))
+            if service_envs is None:
+                service_envs = list(ServiceEnvironment.objects.filter(
+                    service__in=owned_services
+                ).select_related('service', 'environment'))
+            elif any(
+                se.service_id not in owned_services for se in service_envs
+            ):
                 return Response(
-                    ServiceEnvironmentMonthlyCostsSerializer(costs).data
+                    {'detail': (
+                        'You do not have permission to perform this action.'
+                    )},
+                    status=status.HTTP_403_FORBIDDEN,
                 )
-        return Response(deserializer.errors, status=400)
+        if service_envs is None:
+            service_envs_count = ServiceEnvironment.objects.count()
+        else:
+            service_envs_count = len(service_envs)
+        error_response = check_costs_query_cost(params, service_envs_count)
+        if error_response is not None:
+            return error_response
+        return StreamingHttpResponse(
+            self._get_lines(service_envs, params),
+            content_type='application/x-ndjson',
+        )
@@ -5,8 +5,12 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import json
+
 import django_filters
+from django.http import StreamingHttpResponse
 from rest_framework import filters, viewsets
+from rest_framework.decorators import list_route
 
 from ralph_scrooge.models import (
     DailyUsage,
@@ -15,13 +19,17 @@ from ralph_scrooge.models import (
     UsageType
 )
 from ralph_scrooge.rest_api.public.v0_10.pagination import (
-    ScroogeLimitOffsetPagination
+    DailyUsageKeysetPagination,
+    DailyUsagePagination,
+    iterate_by_keyset,
 )
 from ralph_scrooge.rest_api.public.v0_10.serializers import (
     DailyUsageSerializer,
+    DailyUsageValuesSerializer,
     PricingServiceSerializer,
     UsageTypeSerializer,
 )
+from ralph_scrooge.rest_api.public.throttling import TokenBucketThrottle
 
 
 class UsageTypesViewSet(viewsets.ReadOnlyModelViewSet):
@@ -32,6 +40,7 @@ class UsageTypesViewSet(viewsets.ReadOnlyModelViewSet):
     )
     lookup_field = 'symbol'
     lookup_value_regex = '[^/]+'
+    throttle_classes = (TokenBucketThrottle,)
 
 
 class PricingServicesViewSet(viewsets.ReadOnlyModelViewSet):
@@ -42,6 +51,7 @@ class PricingServicesViewSet(viewsets.ReadOnlyModelViewSet):
     )
     lookup_field = 'symbol'
     lookup_value_regex = '[^/]+'
+    throttle_classes = (TokenBucketThrottle,)
 
 
 class DailyUsageFilter(django_filters.FilterSet):
@@ -67,4 +77,38 @@ class DailyUsageViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = DailyUsageSerializer
     filter_backends = (filters.DjangoFilterBackend,)
     filter_class = DailyUsageFilter
-    pagination_class = ScroogeLimitOffsetPagination
+    pagination_class = DailyUsagePagination
+    throttle_classes = (TokenBucketThrottle,)
+    # number of daily usages fetched from database at once during export
+    export_batch_size = 5000
+
+    def _get_values_queryset(self):
+        return self.filter_queryset(self.get_queryset()).values(
+            *DailyUsageValuesSerializer.values_fields
+        )
+
+    def list(self, request, *args, **kwargs):
+        page = self.paginate_queryset(self._get_values_queryset())
+        return self.get_paginated_response([
+            DailyUsageValuesSerializer.to_representation(row) for row in page
+        ])
+
+    @list_route(methods=['get'])
+    def export(self, request, *args, **kwargs):
+        """
+        Stream all (filtered) daily usages as newline-delimited JSON (one
+        daily usage per line), without pagination.
+        """
+        rows = iterate_by_keyset(
+            self._get_values_queryset(),
+            DailyUsageKeysetPagination.ordering,
+            self.export_batch_size,
+        )
+        return StreamingHttpResponse(
+            (
+                json.dumps(DailyUsageValuesSerializer.to_representation(row)) +
+                '\n'
+                for row in rows
+            ),
+            content_type='application/x-ndjson',
+        )
@@ -7,18 +7,21 @@ from __future__ import unicode_literals
 
 import logging
 from collections import defaultdict
-from datetime import datetime
+from datetime import datetime, timedelta
 
 from django.conf import settings
 from django.core.exceptions import ObjectDoesNotExist
-from django.db import transaction
+from django.db import connection, IntegrityError, transaction
+from django.db.models import Q
 from django.http import HttpResponse
+from django.utils.encoding import force_text
 from rest_framework import status
 from rest_framework import serializers
 from rest_framework.decorators import (
     api_view,
     authentication_classes,
     permission_classes,
+    throttle_classes,
 )
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
@@ -26,9 +29,11 @@ from rest_framework.serializers import Serializer
 
 from ralph_scrooge.models import (
     CostDateStatus,
+    DailyPricingObject,
     DailyUsage,
     PRICING_OBJECT_TYPES,
     PricingObject,
+    PricingObjectServiceChange,
     PricingService,
     PricingServicePlugin,
     Service,
@@ -37,12 +42,51 @@ from ralph_scrooge.models import (
 )
 from ralph_scrooge.plugins.cost.collector import Collector
 from ralph_scrooge.rest_api.public.auth import TastyPieLikeTokenAuthentication
+from ralph_scrooge.rest_api.public.throttling import TokenBucketThrottle
+from ralph_scrooge.utils.common import get_cache_name, get_queue_name
+from ralph_scrooge.utils.dimensions import (
+    bump_daily_pricing_objects_version_on_commit,
+)
+from ralph_scrooge.utils.worker_job import WorkerJob
 
 logger = logging.getLogger(__name__)
 
 # special object for ignoring rows with unknown pricing object when
 # `ignore_unknown_services` is set to true
 IGNORE_USAGE_PRICING_OBJECT = object()
+# max number of values in single `IN` query
+QUERY_BATCH_SIZE = 500
+# deleting daily usages (of given date) matching keys from temporary table -
+# joined with it, if database supports joins in DELETE, or using correlated
+# subquery otherwise
+SQL_DELETE_BY_KEYS = {
+    'mysql': """
+        DELETE du FROM {table} AS du
+            JOIN {keys_table} USING (type_id, daily_pricing_object_id)
+        WHERE du.date = %s
+    """,
+    'postgresql': """
+        DELETE FROM {table} AS du USING {keys_table} AS k
+        WHERE du.date = %s
+            AND du.type_id = k.type_id
+            AND du.daily_pricing_object_id = k.daily_pricing_object_id
+    """,
+}
+# temporary table has to be dropped with TEMPORARY keyword on MySQL,
+# otherwise it causes implicit commit of the current transaction
+SQL_DROP_KEYS_TABLE = {
+    'mysql': 'DROP TEMPORARY TABLE {}',
+}
+SQL_DROP_KEYS_TABLE_DEFAULT = 'DROP TABLE {}'
+SQL_DELETE_BY_KEYS_DEFAULT = """
+    DELETE FROM {table}
+    WHERE date = %s AND EXISTS (
+        SELECT 1 FROM {keys_table}
+        WHERE {keys_table}.type_id = {table}.type_id
+            AND {keys_table}.daily_pricing_object_id =
+                {table}.daily_pricing_object_id
+    )
+"""
 
 
 # TODO(xor-xor): Consider some better naming for dicts in this hierarchy:
@@ -70,6 +114,174 @@ class MultipleServiceEnvironmentsReturned(Exception):
     pass
 
 
+def _in_batches(values, batch_size=QUERY_BATCH_SIZE):
+    values = list(values)
+    for i in range(0, len(values), batch_size):
+        yield values[i:i + batch_size]
+
+
+def _normalize(value, type_=force_text):
+    """
+    Normalize raw (incoming) value in the same way as serializer field does
+    (return None if value is invalid).
+
+    >>> _normalize(' abc ')
+    u'abc'
+    >>> _normalize('12', int)
+    12
+    >>> _normalize('abc', int) is None
+    True
+    """
+    if value is None:
+        return None
+    try:
+        value = type_(value)
+    except (TypeError, ValueError):
+        return None
+    return value.strip() if isinstance(value, basestring) else value
+
+
+class UsagesResolver(object):
+    """
+    Resolves usage types, pricing objects and service environments referenced
+    by all usages of the incoming pricing service usage at once (in a few
+    `IN` queries), instead of querying for each of usages separately.
+
+    Only values which were found are resolved here - `None` is returned for
+    any other (ex. malformed or missing) value, so the caller could fall back
+    to querying for it separately (and report error in the same way as
+    before).
+    """
+    # ways of referencing service (name of field: service lookup)
+    SERVICE_FIELDS = (
+        ('service_id', 'service_id'),
+        ('service_uid', 'service__ci_uid'),
+        ('service', 'service__name'),
+    )
+
+    def __init__(self, initial_data):
+        self.usage_types = {}
+        self.pricing_objects = {}
+        self.service_environments = {}
+        self.dummy_pricing_objects = {}
+        usages = initial_data.get('usages')
+        if not isinstance(usages, list):
+            return
+        usages = [u for u in usages if isinstance(u, dict)]
+        self._fetch_usage_types({
+            _normalize(usage.get('symbol'))
+            for u in usages if isinstance(u.get('usages'), list)
+            for usage in u['usages'] if isinstance(usage, dict)
+        })
+        self._fetch_pricing_objects({
+            _normalize(u.get('pricing_object')) for u in usages
+        })
+        self._fetch_service_environments(usages)
+
+    def _fetch_usage_types(self, symbols):
+        symbols.discard(None)
+        for batch in _in_batches(symbols):
+            # `objects_admin` instead of `objects` b/c we allow uploading usage
+            # values for UsageTypes which are inactive at given moment
+            self.usage_types.update(
+                (ut.symbol, ut)
+                for ut in UsageType.objects_admin.filter(symbol__in=batch)
+            )
+
+    def _fetch_pricing_objects(self, names):
+        names.discard(None)
+        found = defaultdict(list)
+        for batch in _in_batches(names):
+            for pricing_object in PricingObject.objects.filter(
+                name__in=batch
+            ):
+                found[pricing_object.name].append(pricing_object)
+        # ambiguous names are not resolved here
+        self.pricing_objects.update(
+            (name, pricing_objects[0])
+            for name, pricing_objects in found.items()
+            if len(pricing_objects) == 1
+        )
+
+    def _fetch_service_environments(self, usages):
+        keys = set()
+        for u in usages:
+            for field, lookup in self.SERVICE_FIELDS:
+                if u.get(field):
+                    value = _normalize(
+                        u[field], int if field == 'service_id' else force_text
+                    )
+                    if value is not None:
+                        keys.add((lookup, value, _normalize(
+                            u.get('environment')
+                        )))
+                    break
+        found = defaultdict(list)
+        # every key is filtered by two params
+        for batch in _in_batches(keys, QUERY_BATCH_SIZE // 2):
+            query = Q()
+            for lookup, value, environment in batch:
+                query |= Q(**{lookup: value, 'environment__name': environment})
+            for se in ServiceEnvironment.objects.filter(query).select_related(
+                'service', 'environment'
+            ):
+                for key in (
+                    ('service_id', se.service_id),
+                    ('service__ci_uid', se.service.ci_uid),
+                    ('service__name', se.service.name),
+                ):
+                    found[key + (se.environment.name,)].append(se)
+        self.service_environments.update(
+            (key, service_envs) for key, service_envs in found.items()
+            if key in keys
+        )
+        for batch in _in_batches({
+            se.id for ses in found.values() for se in ses
+        }):
+            self.dummy_pricing_objects.update(
+                (po.service_environment_id, po)
+                for po in PricingObject.objects.filter(
+                    type_id=PRICING_OBJECT_TYPES.DUMMY,
+                    service_environment__in=batch,
+                )
+            )
+
+    def get_usage_type(self, symbol):
+        return self.usage_types.get(symbol)
+
+    def get_pricing_object(self, name):
+        return self.pricing_objects.get(name)
+
+    def get_service_environments(self, lookup, value, environment):
+        """
+        Return list of service environments matching params (or None if
+        there is no such).
+        """
+        return self.service_environments.get((lookup, value, environment))
+
+    def get_dummy_pricing_object(self, service_environment):
+        try:
+            return self.dummy_pricing_objects[service_environment.id]
+        except KeyError:
+            return service_environment.dummy_pricing_object
+
+
+def _get_resolver(serializer):
+    """
+    Return usages resolver shared by all (nested) serializers of the
+    incoming data.
+    """
+    root = serializer.root
+    resolver = getattr(root, '_usages_resolver', None)
+    if resolver is None:
+        initial_data = getattr(root, 'initial_data', None)
+        resolver = UsagesResolver(
+            initial_data if isinstance(initial_data, dict) else {}
+        )
+        root._usages_resolver = resolver
+    return resolver
+
+
 def new_usage(symbol=None, value=None, remarks=None):
     return {
         'symbol': symbol,
@@ -93,7 +305,10 @@ class UsageDeserializer(UsageSerializer):
         # `objects_admin` instead of `objects` b/c we allow uploading usage
         # values for UsageTypes which are inactive at given moment (but e.g.
         # will be active soon).
-        if not UsageType.objects_admin.filter(symbol=value).exists():
+        if (
+            _get_resolver(self).get_usage_type(value) is None and
+            not UsageType.objects_admin.filter(symbol=value).exists()
+        ):
             err = (
                 'usage type for symbol "{}" does not exist'
                 .format(value)
@@ -146,9 +361,9 @@ class UsagesDeserializer(UsagesSerializer):
         pricing_object_name = value
         if pricing_object_name is not None:
             try:
-                value = PricingObject.objects.get(
-                    name=pricing_object_name
-                )
+                value = _get_resolver(self).get_pricing_object(
+                    pricing_object_name
+                ) or PricingObject.objects.get(name=pricing_object_name)
             except PricingObject.DoesNotExist:
                 msg = (
                     "pricing_object {} does not exist".format(
@@ -203,7 +418,9 @@ class UsagesDeserializer(UsagesSerializer):
                     "should be only one ({})".format(e.message)
                 )
             else:
-                attrs['pricing_object'] = service_env.dummy_pricing_object
+                attrs['pricing_object'] = (
+                    _get_resolver(self).get_dummy_pricing_object(service_env)
+                )
             if err is not None:
                 if self.root.initial_data.get('ignore_unknown_services'):
                     attrs['pricing_object'] = IGNORE_USAGE_PRICING_OBJECT
@@ -229,7 +446,9 @@ class UsagesDeserializer(UsagesSerializer):
         else:
             se_params['service__name'] = attrs['service']
         try:
-            se = ServiceEnvironment.objects.get(**se_params)
+            se = self._get_prefetched_service_env(se_params)
+            if se is None:
+                se = ServiceEnvironment.objects.get(**se_params)
         except ServiceEnvironment.DoesNotExist:
             params = ", ".join(
                 ["{}={}".format(k, v) for k, v in se_params.items()]
@@ -246,6 +465,23 @@ class UsagesDeserializer(UsagesSerializer):
             )
         return se
 
+    def _get_prefetched_service_env(self, se_params):
+        """
+        Return service environment matching params from usages resolver (or
+        None if it wasn't found there).
+        """
+        se_params = se_params.copy()
+        environment = se_params.pop('environment__name')
+        lookup, value = se_params.items()[0]
+        service_envs = _get_resolver(self).get_service_environments(
+            lookup, value, environment
+        )
+        if service_envs is None:
+            return None
+        if len(service_envs) > 1:
+            raise ServiceEnvironment.MultipleObjectsReturned()
+        return service_envs[0]
+
 
 def new_pricing_service_usage(
         pricing_service=None,
@@ -303,6 +539,7 @@ class PricingServiceUsageDeserializer(PricingServiceUsageSerializer):
 @api_view(['GET'])
 @authentication_classes((TastyPieLikeTokenAuthentication,))
 @permission_classes((IsAuthenticated,))
+@throttle_classes((TokenBucketThrottle,))
 def list_pricing_service_usages(
         request, usages_date, pricing_service_id, *args, **kwargs
 ):
@@ -409,6 +646,7 @@ def get_usages(usages_date, pricing_service, filter_by_service=None):
 @api_view(['POST'])
 @authentication_classes((TastyPieLikeTokenAuthentication,))
 @permission_classes((IsAuthenticated,))
+@throttle_classes((TokenBucketThrottle,))
 def create_pricing_service_usages(request, *args, **kwargs):
     deserializer = PricingServiceUsageDeserializer(data=request.data)
     if deserializer.is_valid():
@@ -443,6 +681,34 @@ def save_usages(ps_usage):
     DailyUsage.objects.bulk_create(daily_usages)
 
 
+def save_usages_by_usage_type(ps_usage):
+    """The same as `save_usages`, but usages of every usage type are replaced
+    (previous ones removed and new ones saved) in separate transaction, so
+    transactions are smaller, while readers still never see only part of
+    usages of given usage type.
+    """
+    logger.info("Saving usages for pricing service {}".format(
+        ps_usage['pricing_service']
+    ))
+    daily_usages, usages_daily_pricing_objects = get_usages_for_save(ps_usage)
+    daily_usages_by_type = defaultdict(list)
+    for daily_usage in daily_usages:
+        daily_usages_by_type[daily_usage.type].append(daily_usage)
+    for usage_type, daily_pricing_objects in (
+        usages_daily_pricing_objects.iteritems()
+    ):
+        with transaction.atomic():
+            remove_previous_daily_usages(
+                ps_usage['overwrite'],
+                ps_usage['date'],
+                {usage_type: daily_pricing_objects},
+            )
+            DailyUsage.objects.bulk_create(
+                daily_usages_by_type[usage_type],
+                batch_size=QUERY_BATCH_SIZE,
+            )
+
+
 def _recalculate_costs(ps_name, date):
     pss = PricingService.objects.filter(
         active=True,
@@ -451,20 +717,104 @@ def _recalculate_costs(ps_name, date):
     if ps_name not in pss:
         return
 
-    collector = Collector()
-    plugins = [p for p in collector.get_plugins() if p.name in pss]
-
-    for forecast in [False, True]:
-        if CostDateStatus.objects.filter(
+    # recalculate costs on worker, when usages are already committed;
+    # recalculations requested for the same date (ex. by many subsequent
+    # uploads) are merged into single one as long as it's waiting in queue
+    transaction.on_commit(
+        lambda: RecalculateCostsJob().run_on_worker(
             date=date,
-            **{'forecast_accepted' if forecast else 'accepted': True}
-        ).exists():
-            logger.warning(
-                "Costs for {:%Y-%m-%d} are already accepted and won't be "
-                "recalculated (forecast={}).".format(date, forecast)
+            pricing_services=list(pss),
+        )
+    )
+
+
+class RecalculateCostsJob(WorkerJob):
+    """
+    Recalculate costs of (fixed price) pricing services for single day.
+    """
+    queue_name = get_queue_name('scrooge_costs')
+    cache_name = get_cache_name('scrooge_costs')
+    cache_section = 'scrooge_recalculate_costs'
+    coalesce_pending = True
+
+    @classmethod
+    def run(cls, date, pricing_services):
+        collector = Collector()
+        plugins = [
+            p for p in collector.get_plugins() if p.name in pricing_services
+        ]
+        for forecast in [False, True]:
+            if CostDateStatus.objects.filter(
+                date=date,
+                **{'forecast_accepted' if forecast else 'accepted': True}
+            ).exists():
+                logger.warning(
+                    "Costs for {:%Y-%m-%d} are already accepted and won't be "
+                    "recalculated (forecast={}).".format(date, forecast)
+                )
+                continue
+            with transaction.atomic():
+                collector.calculate_daily_costs_for_day(
+                    date, forecast, plugins
+                )
+        yield 100, True
+
+
+def get_daily_pricing_objects(pricing_objects, date):
+    """
+    Return dict with daily pricing object (at given date) for every one of
+    pricing objects (keyed by pricing object id). Missing daily pricing
+    objects are created (in bulk).
+    """
+    pricing_objects = {po.id: po for po in pricing_objects}
+
+    def fetch(pricing_objects_ids):
+        result = {}
+        for batch in _in_batches(pricing_objects_ids):
+            result.update(
+                (dpo.pricing_object_id, dpo)
+                for dpo in DailyPricingObject.objects.filter(
+                    date=date,
+                    pricing_object__in=batch,
+                )
             )
-            continue
-        collector.calculate_daily_costs_for_day(date, forecast, plugins)
+        return result
+
+    result = fetch(pricing_objects.keys())
+    missing = set(pricing_objects) - set(result)
+    if not missing:
+        return result
+    try:
+        with transaction.atomic():
+            DailyPricingObject.objects.bulk_create([
+                DailyPricingObject(
+                    date=date,
+                    pricing_object_id=pricing_object_id,
+                    service_environment_id=(
+                        pricing_objects[pricing_object_id]
+                        .service_environment_id
+                    ),
+                ) for pricing_object_id in missing
+            ], batch_size=QUERY_BATCH_SIZE)
+    except IntegrityError:
+        # some of them were created in the meantime - fall back to creating
+        # them one by one
+        for pricing_object_id in missing:
+            result[pricing_object_id] = (
+                pricing_objects[pricing_object_id].get_daily_pricing_object(
+                    date
+                )
+            )
+        return result
+    # bulk_create doesn't call `save` nor send signals, so services changes
+    # log and version of cached daily pricing objects are updated here
+    PricingObjectServiceChange.backfill(
+        date, date + timedelta(days=1), pricing_object_ids=missing
+    )
+    bump_daily_pricing_objects_version_on_commit(date)
+    # ids of created objects are not returned by bulk_create (in most of DBs)
+    result.update(fetch(missing))
+    return result
 
 
 def get_usages_for_save(pricing_service_usage):
@@ -480,6 +830,14 @@ def get_usages_for_save(pricing_service_usage):
     usage_types_cache = {}
     daily_usages = []
     usages_daily_pricing_objects = defaultdict(list)
+    daily_pricing_objects = get_daily_pricing_objects(
+        [
+            usages['pricing_object']
+            for usages in pricing_service_usage['usages']
+            if usages['pricing_object'] is not IGNORE_USAGE_PRICING_OBJECT
+        ],
+        pricing_service_usage['date'],
+    )
 
     for usages in pricing_service_usage['usages']:
         for usage in usages['usages']:
@@ -498,18 +856,16 @@ def get_usages_for_save(pricing_service_usage):
                     )
                 )
                 continue
-            daily_pricing_object = (
-                usages['pricing_object'].get_daily_pricing_object(
-                    pricing_service_usage['date']
-                )
-            )
+            daily_pricing_object = daily_pricing_objects[
+                usages['pricing_object'].id
+            ]
             daily_usage = DailyUsage(
                 date=pricing_service_usage['date'],
                 type=usage_type,
                 value=usage['value'],
                 daily_pricing_object=daily_pricing_object,
-                service_environment=(
-                    daily_pricing_object.service_environment
+                service_environment_id=(
+                    daily_pricing_object.service_environment_id
                 ),
                 remarks=usage.get('remarks', ''),
             )
@@ -526,12 +882,57 @@ def remove_previous_daily_usages(overwrite, date, usages_dp_objs):
     docs for our REST API. Please note, that 'no' variant is deliberately
     ignored here, because that's default behavior.
     """
-    if overwrite in ('values_only', 'delete_all_previous'):
+    if overwrite == 'delete_all_previous':
         logger.debug('Remove previous values ({})'.format(overwrite))
-        for ut, dp_objs in usages_dp_objs.iteritems():
-            previous_usages = DailyUsage.objects.filter(date=date, type=ut)
-            if overwrite == 'values_only':
-                previous_usages = previous_usages.filter(
-                    daily_pricing_object__in=dp_objs
-                )
-            previous_usages.delete()
+        DailyUsage.objects.filter(
+            date=date, type__in=usages_dp_objs.keys()
+        ).delete()
+    elif overwrite == 'values_only':
+        logger.debug('Remove previous values ({})'.format(overwrite))
+        keys = set(
+            (ut.id, dp_obj.id)
+            for ut, dp_objs in usages_dp_objs.iteritems()
+            for dp_obj in dp_objs
+        )
+        if len(keys) <= QUERY_BATCH_SIZE:
+            query = Q()
+            for ut, dp_objs in usages_dp_objs.iteritems():
+                query |= Q(type=ut, daily_pricing_object__in=dp_objs)
+            if query:
+                DailyUsage.objects.filter(query, date=date).delete()
+        else:
+            _delete_daily_usages_by_keys(date, keys)
+
+
+def _delete_daily_usages_by_keys(date, keys):
+    """Delete daily usages of given date matching (usage type id, daily
+    pricing object id) keys. Keys are stored in temporary table (with primary
+    key on them) joined with daily usages, instead of passing (possibly huge)
+    list of ids to the query.
+    """
+    table = DailyUsage._meta.db_table
+    keys_table = '{}_keys'.format(table)
+    cursor = connection.cursor()
+    cursor.execute("""
+        CREATE TEMPORARY TABLE {} (
+            type_id integer NOT NULL,
+            daily_pricing_object_id integer NOT NULL,
+            PRIMARY KEY (type_id, daily_pricing_object_id)
+        )
+    """.format(keys_table))
+    try:
+        for batch in _in_batches(keys):
+            cursor.executemany(
+                """
+                INSERT INTO {} (type_id, daily_pricing_object_id)
+                VALUES (%s, %s)
+                """.format(keys_table),
+                batch
+            )
+        cursor.execute(SQL_DELETE_BY_KEYS.get(
+            connection.vendor, SQL_DELETE_BY_KEYS_DEFAULT
+        ).format(table=table, keys_table=keys_table), [date])
+    finally:
+        cursor.execute(SQL_DROP_KEYS_TABLE.get(
+            connection.vendor, SQL_DROP_KEYS_TABLE_DEFAULT
+        ).format(keys_table))
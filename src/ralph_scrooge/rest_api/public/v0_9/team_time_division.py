@@ -26,6 +26,7 @@ from ralph_scrooge.rest_api.public.auth import (
     IsTeamLeader,
     TastyPieLikeTokenAuthentication,
 )
+from ralph_scrooge.rest_api.public.throttling import TokenBucketThrottle
 from ralph_scrooge.rest_api.common import get_dates
 
 
@@ -34,25 +35,19 @@ class PercentSerializer(Serializer):
     environment = serializers.CharField(required=True)
     percent = serializers.FloatField(required=True)
 
-    def validate(self, attrs):
-        err = None
-
-        # Validate service environment (given indirectly by service_uid and
-        # env).
-        service_uid = attrs.get('service_uid')
-        env = attrs.get('environment')
-        if not ServiceEnvironment.objects.filter(
-            service__ci_uid=service_uid,
-            environment__name=env,
-        ).exists():
-            err = (
-                'Service environment for service with UID "{}" and '
-                'environment "{}" does not exist.'.format(service_uid, env)
-            )
 
-        if err is not None:
-            raise serializers.ValidationError(err)
-        return attrs
+def _get_service_environments(division):
+    """
+    Return service environments of all percents of division (by service UID
+    and environment name), fetched with single query.
+    """
+    service_envs = ServiceEnvironment.objects.filter(
+        service__ci_uid__in=set(d['service_uid'] for d in division),
+        environment__name__in=set(d['environment'] for d in division),
+    ).select_related('service', 'environment')
+    return {
+        (se.service.ci_uid, se.environment.name): se for se in service_envs
+    }
 
 
 def new_percent(service_uid, environment, percent):
@@ -84,9 +79,29 @@ class TeamTimeDivisionSerializer(Serializer):
     division = PercentSerializer(many=True, required=True)
 
     def validate_division(self, value):
+        """
+        Validate service environments (given indirectly by service_uid and
+        env) of all percents at once - found ones are stored under
+        `_service_environment` key, errors are reported for every percent.
+        """
         division = value
         if division is None or len(division) == 0:
             raise serializers.ValidationError("This field cannot be empty.")
+        service_envs = _get_service_environments(division)
+        errors = []
+        for d in division:
+            service_uid = d['service_uid']
+            env = d['environment']
+            d['_service_environment'] = service_envs.get((service_uid, env))
+            if d['_service_environment'] is None:
+                errors.append({'non_field_errors': [
+                    'Service environment for service with UID "{}" and '
+                    'environment "{}" does not exist.'.format(service_uid, env)
+                ]})
+            else:
+                errors.append({})
+        if any(errors):
+            raise serializers.ValidationError(errors)
         return value
 
     def validate(self, attrs):
@@ -139,6 +154,7 @@ def new_team_time_division(team_id, year, month, division):
 class TeamTimeDivision(APIView):
     authentication_classes = (TastyPieLikeTokenAuthentication,)
     permission_classes = (IsAuthenticated, IsTeamLeader)
+    throttle_classes = (TokenBucketThrottle,)
 
     def get(self, request, year, month, team_id, *args, **kwargs):
         year, month, team_id = _args_to_int(year, month, team_id)
@@ -167,7 +183,7 @@ class TeamTimeDivision(APIView):
         serializer = TeamTimeDivisionSerializer(data=request.data)
         if serializer.is_valid():
             save_team_time_division(
-                serializer.data['division'],
+                serializer.validated_data['division'],
                 year,
                 month,
                 team_id
@@ -182,28 +198,17 @@ def _args_to_int(*args):
 
 @transaction.atomic
 def save_team_time_division(division, year, month, team_id):
+    """
+    Replace division of team time in given month with `division` (validated
+    by `TeamTimeDivisionSerializer`).
+    """
     first_day, last_day, days_in_month = get_dates(year, month)
-
-    # Previously uploaded division(s) for a given team and dates should be
-    # removed.
-    TeamServiceEnvironmentPercent.objects.filter(
-        team_cost__team=team_id,
-        team_cost__start=first_day,
-        team_cost__end=last_day,
-    ).delete()
-
     team_cost = TeamCost.objects.get_or_create(
         team_id=team_id,
         start=first_day,
         end=last_day,
     )[0]
-    for percent in division:
-        service_environment = ServiceEnvironment.objects.get(
-            service__ci_uid=percent.get('service_uid'),
-            environment__name=percent.get('environment')
-        )
-        TeamServiceEnvironmentPercent.objects.create(
-            team_cost=team_cost,
-            service_environment=service_environment,
-            percent=percent.get('percent'),
-        )
+    team_cost.set_division({
+        percent['_service_environment'].id: percent['percent']
+        for percent in division
+    })
@@ -0,0 +1,382 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import csv
+import json
+import logging
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+from django.utils.encoding import force_text
+from rest_framework import serializers
+from rest_framework import status
+from rest_framework.decorators import (
+    api_view,
+    authentication_classes,
+    permission_classes,
+    throttle_classes,
+)
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.serializers import Serializer
+
+from ralph_scrooge.db_router import pin_to_primary
+from ralph_scrooge.models import (
+    PricingService,
+    UsagesUpload,
+    UsagesUploadChunk,
+    UsagesUploadStatus,
+)
+from ralph_scrooge.rest_api.public.auth import TastyPieLikeTokenAuthentication
+from ralph_scrooge.rest_api.public.throttling import TokenBucketThrottle
+from ralph_scrooge.rest_api.public.v0_9.pricing_service_usages import (
+    _recalculate_costs,
+    PricingServiceUsageDeserializer,
+    save_usages_by_usage_type,
+)
+from ralph_scrooge.utils.common import get_cache_name, get_queue_name
+from ralph_scrooge.utils.worker_job import WorkerJob
+
+logger = logging.getLogger(__name__)
+
+# fields of single (flat) row of uploaded usages
+SERVICE_FIELDS = (
+    'service', 'service_id', 'service_uid', 'environment', 'pricing_object'
+)
+USAGE_FIELDS = ('symbol', 'value', 'remarks')
+# max number of errors of rows stored with the upload
+MAX_ERRORS = 100
+
+
+class ChunkParseError(Exception):
+    pass
+
+
+def parse_ndjson(content):
+    """
+    Return list of rows (dicts) from newline-delimited JSON.
+
+    >>> parse_ndjson('{"value": 1}\\n\\n{"symbol": "b"}')
+    [{u'value': 1}, {u'symbol': u'b'}]
+    """
+    rows = []
+    for line_number, line in enumerate(content.splitlines(), start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            raise ChunkParseError('Line {}: {}'.format(line_number, e))
+        if not isinstance(row, dict):
+            raise ChunkParseError(
+                'Line {}: JSON object expected'.format(line_number)
+            )
+        rows.append(row)
+    return rows
+
+
+def parse_csv(content):
+    """
+    Return list of rows (dicts) from CSV with header (empty cells are
+    skipped).
+
+    >>> sorted(parse_csv('symbol,value,remarks\\na,1,\\n')[0].items())
+    [(u'symbol', u'a'), (u'value', u'1')]
+    """
+    rows = []
+    reader = csv.DictReader(content.splitlines())
+    try:
+        for row in reader:
+            rows.append({
+                key.decode('utf-8').strip(): value.decode('utf-8')
+                for key, value in row.items()
+                if key is not None and value not in (None, '')
+            })
+    except (csv.Error, UnicodeDecodeError) as e:
+        raise ChunkParseError('Line {}: {}'.format(reader.line_num, e))
+    return rows
+
+
+def row_to_usages(row):
+    """
+    Convert flat row of upload into usages of single service environment (or
+    pricing object), as accepted by `UsagesDeserializer`.
+
+    >>> sorted(row_to_usages({'pricing_object': 'po1', 'value': 1}).items())
+    [(u'pricing_object', u'po1'), (u'usages', [{u'value': 1}])]
+    """
+    usages = {k: row[k] for k in SERVICE_FIELDS if k in row}
+    usages['usages'] = [{k: row[k] for k in USAGE_FIELDS if k in row}]
+    return usages
+
+
+class UsagesUploadSerializer(Serializer):
+    id = serializers.IntegerField(read_only=True)
+    pricing_service = serializers.CharField(source='pricing_service.name')
+    date = serializers.DateField()
+    overwrite = serializers.CharField()
+    ignore_unknown_services = serializers.BooleanField()
+    status = serializers.SerializerMethodField()
+    chunks = serializers.SerializerMethodField()
+    errors = serializers.SerializerMethodField()
+
+    def get_status(self, obj):
+        return UsagesUploadStatus.from_id(obj.status).name
+
+    def get_chunks(self, obj):
+        return obj.chunks.count()
+
+    def get_errors(self, obj):
+        return json.loads(obj.errors) if obj.errors else []
+
+
+class UsagesUploadDeserializer(Serializer):
+    pricing_service = serializers.CharField()
+    date = serializers.DateField()
+    overwrite = serializers.CharField(required=False, default='no')
+    ignore_unknown_services = serializers.BooleanField(
+        required=False, default=False
+    )
+
+    def validate_overwrite(self, value):
+        return PricingServiceUsageDeserializer().validate_overwrite(value)
+
+    def validate_pricing_service(self, value):
+        try:
+            return PricingService.objects.get(name=value)
+        except PricingService.DoesNotExist:
+            raise serializers.ValidationError(
+                "Unknown service name: {}".format(value)
+            )
+
+
+class ProcessUsagesUploadJob(WorkerJob):
+    """
+    Validate and save usages of committed upload.
+    """
+    queue_name = get_queue_name('scrooge_costs')
+    cache_name = get_cache_name('scrooge_costs')
+    cache_section = 'scrooge_usages_upload'
+
+    @classmethod
+    def _get_errors(cls, deserializer, positions):
+        """
+        Return list of errors of the upload - errors of usages are reported
+        with position (number of chunk and row in chunk) of the usage.
+        """
+        errors = []
+        for field, field_errors in deserializer.errors.items():
+            if field != 'usages' or not isinstance(field_errors, list):
+                errors.append({field: field_errors})
+                continue
+            for position, row_errors in zip(positions, field_errors):
+                if row_errors:
+                    errors.append({
+                        'chunk': position[0],
+                        'row': position[1],
+                        'errors': row_errors,
+                    })
+        return errors
+
+    @classmethod
+    def run(cls, upload_id):
+        upload = UsagesUpload.objects.select_related('pricing_service').get(
+            id=upload_id
+        )
+        upload.status = UsagesUploadStatus.processing.id
+        upload.save()
+        try:
+            usages = []
+            # (chunk number, row number in chunk) of every usage
+            positions = []
+            for chunk in upload.chunks.all():
+                for row_number, row in enumerate(
+                    json.loads(chunk.rows), start=1
+                ):
+                    usages.append(row_to_usages(row))
+                    positions.append((chunk.number, row_number))
+            deserializer = PricingServiceUsageDeserializer(data={
+                'pricing_service': upload.pricing_service.name,
+                'date': upload.date.isoformat(),
+                'overwrite': upload.overwrite,
+                'ignore_unknown_services': upload.ignore_unknown_services,
+                'usages': usages,
+            })
+            if not deserializer.is_valid():
+                errors = cls._get_errors(deserializer, positions)
+                upload.status = UsagesUploadStatus.failed.id
+                upload.errors = json.dumps(errors[:MAX_ERRORS])
+                upload.save()
+                # failed upload can't be committed again
+                upload.chunks.all().delete()
+                yield 100, False
+                return
+            ps_usage = deserializer.validated_data
+            save_usages_by_usage_type(ps_usage)
+            if settings.ENABLE_RECALCULATE_COSTS_ON_POST:
+                _recalculate_costs(ps_usage['pricing_service'], upload.date)
+        except Exception as e:
+            logger.exception('Error while processing usages upload')
+            upload.status = UsagesUploadStatus.failed.id
+            upload.errors = json.dumps(
+                [{'non_field_errors': [force_text(e)]}]
+            )
+            upload.save()
+            upload.chunks.all().delete()
+            raise
+        upload.chunks.all().delete()
+        upload.status = UsagesUploadStatus.done.id
+        upload.save()
+        if upload.created_by is not None:
+            # usages are saved later than the upload was committed
+            pin_to_primary(upload.created_by)
+        yield 100, True
+
+
+def _get_upload(request, upload_id, lock=False):
+    """
+    Return upload with given id created by user who is sending the request
+    (or None if there is no such). If lock is True, upload is locked until
+    the end of the current transaction.
+    """
+    uploads = UsagesUpload.objects.select_related('pricing_service')
+    if lock:
+        uploads = uploads.select_for_update()
+    if not request.user.is_superuser:
+        uploads = uploads.filter(created_by=request.user)
+    try:
+        return uploads.get(id=upload_id)
+    except UsagesUpload.DoesNotExist:
+        return None
+
+
+def _upload_not_found(upload_id):
+    return Response(
+        {'error': 'Upload with ID {} does not exist.'.format(upload_id)},
+        status=status.HTTP_404_NOT_FOUND,
+    )
+
+
+def _upload_not_open(upload):
+    return Response(
+        {'error': 'Upload is already {}.'.format(
+            UsagesUploadStatus.from_id(upload.status).name
+        )},
+        status=status.HTTP_400_BAD_REQUEST,
+    )
+
+
+@api_view(['POST'])
+@authentication_classes((TastyPieLikeTokenAuthentication,))
+@permission_classes((IsAuthenticated,))
+@throttle_classes((TokenBucketThrottle,))
+def create_usages_upload(request, *args, **kwargs):
+    """
+    Start upload of usages of pricing service for single day. Usages are
+    sent in chunks (see `add_usages_upload_chunk`) and saved asynchronously
+    after committing the upload (see `commit_usages_upload`).
+    """
+    deserializer = UsagesUploadDeserializer(data=request.data)
+    if not deserializer.is_valid():
+        return Response(deserializer.errors, status=400)
+    upload = UsagesUpload.objects.create(
+        created_by=request.user,
+        **deserializer.validated_data
+    )
+    return Response(
+        UsagesUploadSerializer(upload).data, status=status.HTTP_201_CREATED
+    )
+
+
+@api_view(['GET'])
+@authentication_classes((TastyPieLikeTokenAuthentication,))
+@permission_classes((IsAuthenticated,))
+@throttle_classes((TokenBucketThrottle,))
+def get_usages_upload(request, upload_id, *args, **kwargs):
+    upload = _get_upload(request, upload_id)
+    if upload is None:
+        return _upload_not_found(upload_id)
+    return Response(UsagesUploadSerializer(upload).data)
+
+
+@api_view(['POST'])
+@authentication_classes((TastyPieLikeTokenAuthentication,))
+@permission_classes((IsAuthenticated,))
+@throttle_classes((TokenBucketThrottle,))
+def add_usages_upload_chunk(request, upload_id, *args, **kwargs):
+    """
+    Add chunk of usages to the upload. Usages are sent in request body as
+    newline-delimited JSON (one usage per line) or as CSV (with header, when
+    content type is `text/csv`). Every usage (row) has fields:
+    `pricing_object` or `service` / `service_id` / `service_uid` (together
+    with `environment`) and `symbol`, `value` and (optional) `remarks`.
+
+    Chunks are numbered in order in which they are sent, unless `number`
+    query param is given (sending chunk with the same number again replaces
+    it).
+    """
+    number = request.query_params.get('number')
+    if number is not None and not number.isdigit():
+        return Response({'error': 'Invalid chunk number.'}, status=400)
+    try:
+        if request.content_type.startswith('text/csv'):
+            rows = parse_csv(request.body)
+        else:
+            rows = parse_ndjson(request.body)
+    except ChunkParseError as e:
+        return Response({'error': force_text(e)}, status=400)
+    if not rows:
+        return Response({'error': 'Chunk is empty.'}, status=400)
+    with transaction.atomic():
+        # upload is locked, so chunks sent concurrently get different
+        # numbers and no chunk is added after committing the upload
+        upload = _get_upload(request, upload_id, lock=True)
+        if upload is None:
+            return _upload_not_found(upload_id)
+        if upload.status != UsagesUploadStatus.open.id:
+            return _upload_not_open(upload)
+        if number is None:
+            number = (
+                upload.chunks.aggregate(number=Max('number'))['number'] or 0
+            ) + 1
+        UsagesUploadChunk.objects.update_or_create(
+            upload=upload,
+            number=int(number),
+            defaults={'rows': json.dumps(rows)},
+        )
+    return Response(
+        {'chunk': int(number), 'rows': len(rows)},
+        status=status.HTTP_201_CREATED,
+    )
+
+
+@api_view(['POST'])
+@authentication_classes((TastyPieLikeTokenAuthentication,))
+@permission_classes((IsAuthenticated,))
+@throttle_classes((TokenBucketThrottle,))
+def commit_usages_upload(request, upload_id, *args, **kwargs):
+    """
+    Finish the upload - its usages are validated and saved on worker. Poll
+    upload (see `get_usages_upload`) to check its status.
+    """
+    with transaction.atomic():
+        # chunks being added are finished before committing the upload (see
+        # `add_usages_upload_chunk`)
+        upload = _get_upload(request, upload_id, lock=True)
+        if upload is None:
+            return _upload_not_found(upload_id)
+        if upload.status != UsagesUploadStatus.open.id:
+            return _upload_not_open(upload)
+        if not upload.chunks.exists():
+            return Response({'error': 'Upload has no chunks.'}, status=400)
+        upload.status = UsagesUploadStatus.queued.id
+        upload.save()
+    ProcessUsagesUploadJob().run_on_worker(upload_id=upload.id)
+    return Response(
+        UsagesUploadSerializer(upload).data, status=status.HTTP_202_ACCEPTED
+    )
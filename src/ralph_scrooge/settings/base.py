@@ -27,6 +27,7 @@ MIDDLEWARE_CLASSES = (
     'django.middleware.locale.LocaleMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'ralph_scrooge.middleware.ReadFromReplica',
     'django.contrib.messages.middleware.MessageMiddleware',
 )
 
@@ -82,6 +83,21 @@ DATABASES = {
     },
 }
 
+# alias of database (in DATABASES) which is a replica of the default one -
+# when it's configured, reports (on workers) and read-only requests to paths
+# from DATABASE_REPLICA_PATHS are reading from it (see `ReplicaRouter`)
+DATABASE_REPLICA_ALIAS = 'replica'
+DATABASE_ROUTERS = ['ralph_scrooge.db_router.ReplicaRouter']
+DATABASE_REPLICA_PATHS = (
+    '/scrooge/api/',
+    '/scrooge/rest/components/',
+    '/scrooge/rest/costcard/',
+    '/scrooge/rest/pricing_object_costs/',
+)
+# user who has changed some data is reading from the default database for
+# this number of seconds (not from replica, which could be lagging behind)
+DATABASE_REPLICA_PIN_TIMEOUT = 60
+
 TIME_ZONE = 'Europe/Warsaw'
 
 LOGIN_URL = '/login/'
@@ -100,6 +116,29 @@ RQ_QUEUES = {
 }
 for queue in RQ_QUEUE_LIST:
     RQ_QUEUES[queue] = dict(RQ_QUEUES['default'])
+# Order in which ScroogeWorker checks its queues for jobs (the first one has
+# the highest priority), no matter of order of queues passed to the worker.
+# Interactive reports go first, so month recalculation will not starve them.
+RQ_QUEUES_PRIORITY = (
+    'scrooge_report', 'reports_pricing', 'scrooge_costs',
+    'scrooge_costs_master', 'default'
+)
+# Hooks (dotted paths to functions) run once at ScroogeWorker start (before
+# any job is processed)
+SCROOGE_WORKER_PRELOAD = [
+    'ralph_scrooge.utils.warmup.load_plugins',
+    'ralph_scrooge.utils.warmup.load_dimensions',
+]
+# Add 'ralph_scrooge.utils.warmup.load_daily_pricing_objects' to
+# SCROOGE_WORKER_PRELOAD to keep service environments of pricing objects for
+# this number of days in worker's memory (shared with forked work horses)
+SCROOGE_WORKER_PRELOAD_DAYS = 31
+# Max number of unfinished reports generated at the same time by single user
+# (None means no limit)
+REPORTS_MAX_JOBS_PER_USER = 3
+# Number of report plugins (columns of services costs report) calculated
+# concurrently (every one in separate thread, using separate DB connection)
+REPORTS_PLUGINS_CONCURRENCY = 4
 
 
 CACHES = dict(
@@ -117,6 +156,9 @@ CACHES = dict(
 )
 
 USAGE_OWNERS_GROUP_NAME = 'usage-owners'
+# members of this group (ex. accounts of exporters) could fetch bigger pages
+# of results from the API
+SERVICE_ACCOUNTS_GROUP_NAME = 'service-accounts'
 
 # -----------------------------------------
 # SCROOGE SETTINGS
@@ -360,6 +402,19 @@ REST_FRAMEWORK = {
     # PAGE_SIZE can NOT be set - it would break existing endpoints (changed
     # structure etc)!
 }
+# max number of results per page when keyset pagination is used (see
+# `ScroogeKeysetPagination`) - for regular users and for service accounts
+API_KEYSET_MAX_LIMIT = 1000
+API_KEYSET_SERVICE_ACCOUNT_MAX_LIMIT = 20000
+# requests to the public API are limited per token (see
+# `TokenBucketThrottle`) - at most API_THROTTLE_BURST requests at once and
+# API_THROTTLE_RATE requests per second on average (set API_THROTTLE_BURST to
+# None to disable limiting)
+API_THROTTLE_BURST = 60
+API_THROTTLE_RATE = 1
+# max estimated cost (days x service environments x types) of single costs
+# query of the public API - more expensive queries are rejected
+API_COSTS_QUERY_MAX_COST = 500000
 
 # For sending notifications re: detected anomalies / missing values in uploaded
 # usages.
@@ -24,6 +24,12 @@ DATABASES = {
 
 SOUTH_TESTS_MIGRATE = False
 
+# test transaction is not visible in other threads' DB connections
+REPORTS_PLUGINS_CONCURRENCY = 1
+
+# tests of API are sending many requests as the same user
+API_THROTTLE_BURST = None
+
 LOGGING['handlers']['file']['filename'] = 'scrooge.log'  # noqa
 
 try:
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import datetime
+
+from django.core.management import call_command
+from django.utils.timezone import now
+
+from ralph_scrooge.models import (
+    UsagesUpload,
+    UsagesUploadChunk,
+    UsagesUploadStatus,
+)
+from ralph_scrooge.tests import ScroogeTestCase
+from ralph_scrooge.tests.utils.factory import PricingServiceFactory
+
+
+class TestDeleteOldUsagesUploadsChunks(ScroogeTestCase):
+    def setUp(self):
+        self.pricing_service = PricingServiceFactory()
+
+    def _create_upload(self, status, days_ago):
+        upload = UsagesUpload.objects.create(
+            pricing_service=self.pricing_service,
+            date=datetime.date(2016, 9, 8),
+            status=status.id,
+            created=now() - datetime.timedelta(days=days_ago),
+        )
+        UsagesUploadChunk.objects.create(upload=upload, number=1, rows='[]')
+        return upload
+
+    def _get_status(self, upload):
+        return UsagesUpload.objects.get(pk=upload.pk).status
+
+    def test_delete_old_usages_uploads_chunks(self):
+        failed = self._create_upload(UsagesUploadStatus.failed, 1)
+        abandoned = self._create_upload(UsagesUploadStatus.open, 10)
+        interrupted = self._create_upload(UsagesUploadStatus.processing, 10)
+        pending = self._create_upload(UsagesUploadStatus.open, 1)
+        call_command('delete_old_usages_uploads_chunks', num_days=7)
+        for upload in (failed, abandoned, interrupted):
+            self.assertEqual(
+                self._get_status(upload), UsagesUploadStatus.failed.id
+            )
+            self.assertFalse(upload.chunks.exists())
+        self.assertEqual(self._get_status(pending), UsagesUploadStatus.open.id)
+        self.assertTrue(pending.chunks.exists())
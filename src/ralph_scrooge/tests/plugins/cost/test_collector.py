@@ -10,12 +10,16 @@ from dateutil import rrule
 import mock
 
 
+from ralph_scrooge.models import CostDateStatus, DailyCost, DailyCostStaging
 from ralph_scrooge.tests import ScroogeTestCase
 from ralph_scrooge.plugins.cost.collector import Collector
 from ralph_scrooge.tests.utils.factory import (
+    BaseUsageFactory,
     CostDateStatusFactory,
+    DailyCostFactory,
     ServiceEnvironmentFactory,
 )
+from ralph_scrooge.utils.dimensions import get_costs_versions
 
 
 class TestCollector(ScroogeTestCase):
@@ -26,6 +30,7 @@ class TestCollector(ScroogeTestCase):
         self.end = date(2013, 10, 30)
         self.service_environments = ServiceEnvironmentFactory.create_batch(2)
         self.collector = Collector()
+        self.base_usage = BaseUsageFactory()
 
         self.dates1 = self._dates_between(self.start, self.checkpoint)
         self.dates2 = self._dates_between(
@@ -92,4 +97,69 @@ class TestCollector(ScroogeTestCase):
             ))
         process_mock.assert_has_calls(calls)
 
+    def _stage_costs(self, day, cost):
+        costs = {
+            self.service_environments[0].id: [{
+                'type': self.base_usage,
+                'cost': cost,
+                '_children': [{'type': self.base_usage, 'cost': cost}],
+            }],
+        }
+        self.collector.save_staged_costs(
+            day,
+            False,
+            self.collector._create_daily_costs(day, costs, False),
+        )
+
+    def test_save_staged_costs(self):
+        self._stage_costs(self.today, 10)
+        self._stage_costs(self.today, 20)
+        self.assertEqual(
+            list(DailyCostStaging.objects.values_list('cost', 'depth')),
+            [(20, 0), (20, 1)],
+        )
+        self.assertEqual(DailyCost.objects_tree.count(), 0)
+
+    def test_publish_staged_costs(self):
+        DailyCostFactory(date=self.today, type=self.base_usage)
+        DailyCostFactory(date=self.checkpoint, type=self.base_usage)
+        self._stage_costs(self.today, 10)
+        self._stage_costs(self.checkpoint, 20)
+        self.collector.publish_staged_costs([self.today], False)
+        self.assertEqual(
+            list(DailyCost.objects_tree.filter(date=self.today).values_list(
+                'cost', 'depth', 'service_environment',
+            ).order_by('depth')),
+            [
+                (10, 0, self.service_environments[0].id),
+                (10, 1, self.service_environments[0].id),
+            ]
+        )
+        # costs of not published day are untouched
+        self.assertEqual(
+            DailyCost.objects_tree.filter(date=self.checkpoint).count(), 1
+        )
+        self.assertEqual(
+            list(DailyCostStaging.objects.values_list('date', flat=True)),
+            [self.checkpoint] * 2,
+        )
+        self.assertTrue(CostDateStatus.objects.get(date=self.today).calculated)
+        self.assertFalse(
+            CostDateStatus.objects.filter(date=self.checkpoint).exists()
+        )
+
+    @mock.patch(
+        'ralph_scrooge.plugins.cost.collector.transaction.on_commit',
+        lambda func: func()
+    )
+    def test_publish_staged_costs_bumps_costs_version(self):
+        versions = get_costs_versions([self.today, self.checkpoint])
+        self._stage_costs(self.today, 10)
+        self.collector.publish_staged_costs([self.today], False)
+        new_versions = get_costs_versions([self.today, self.checkpoint])
+        self.assertNotEqual(new_versions[self.today], versions[self.today])
+        self.assertEqual(
+            new_versions[self.checkpoint], versions[self.checkpoint]
+        )
+
     # TODO: add more unit tests
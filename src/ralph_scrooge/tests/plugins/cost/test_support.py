@@ -7,11 +7,14 @@ from __future__ import unicode_literals
 from datetime import date
 from decimal import Decimal as D
 
+import mock
+from django.core.cache import cache
 
 from ralph_scrooge import models
 from ralph_scrooge.plugins.cost.support import SupportPlugin
 from ralph_scrooge.tests import ScroogeTestCase
 from ralph_scrooge.tests.utils.factory import PricingObjectFactory
+from ralph_scrooge.utils.dimensions import DailyPricingObjectsCache
 
 
 class TestSupportPlugin(ScroogeTestCase):
@@ -70,6 +73,44 @@ class TestSupportPlugin(ScroogeTestCase):
             ]
         })
 
+    def test_costs_with_preloaded_daily_pricing_objects(self):
+        cache.clear()
+        daily_pricing_objects = DailyPricingObjectsCache()
+        with mock.patch.object(
+            daily_pricing_objects, '_get_dates', return_value=[self.today]
+        ):
+            daily_pricing_objects.load(1)
+        # support without daily pricing object at this day
+        models.SupportCost(
+            start=self.start,
+            end=self.end,
+            pricing_object=PricingObjectFactory(),
+            cost=3000,
+            forecast_cost=6000,
+            support_id=2,
+        ).save()
+        with mock.patch(
+            'ralph_scrooge.plugins.cost.support.daily_pricing_objects',
+            daily_pricing_objects,
+        ):
+            costs = SupportPlugin.costs(
+                date=self.today,
+                service_environments=self.service_environments[:5],
+                forecast=False,
+            )
+        self.assertEquals(costs, {
+            se.id: [
+                {
+                    'type': self.support_type,
+                    'cost': D('100'),
+                    'pricing_object_id': po.id,
+                }
+            ]
+            for se, po in zip(
+                self.service_environments[:3], self.pricing_objects[:3]
+            )
+        })
+
     def test_costs_forecast(self):
         costs = SupportPlugin.costs(
             date=self.today,
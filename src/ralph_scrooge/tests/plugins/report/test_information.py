@@ -8,6 +8,9 @@ from __future__ import unicode_literals
 from datetime import date, timedelta
 from unittest import skip
 
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
 from ralph_scrooge import models
 from ralph_scrooge.tests import ScroogeTestCase
 from ralph_scrooge.plugins.report.information import Information
@@ -70,3 +73,23 @@ class TestInformationPlugin(ScroogeTestCase):
                 'environment': self.service_environment2.environment.name,
             },
         })
+
+    def test_costs_queries_count(self):
+        ServiceEnvironmentFactory.create_batch(5)
+        with CaptureQueriesContext(connection) as queries:
+            result = Information(
+                service_environments=models.ServiceEnvironment.objects.all(),
+                start=self.report_start,
+                end=self.report_end,
+            )
+        # service environments, services history
+        self.assertEqual(len(queries), 2)
+        self.assertEqual(len(result), 7)
+        self.assertEqual(
+            result[self.service_environment2.id]['service'],
+            self.service_environment2.service.name,
+        )
+        self.assertEqual(
+            result[self.service_environment2.id]['business_line'],
+            self.pc2.business_line.name,
+        )
@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import mock
+from django.core.cache import cache
+
+from ralph_scrooge.report.base_report import BaseReport, PartialRows
+from ralph_scrooge.tests import ScroogeTestCase
+from ralph_scrooge.utils.worker_job import _get_cache_key
+
+HEADER = [['Name', 'Cost']]
+ROWS = [['Service {}'.format(i), '{}.00'.format(i)] for i in range(5)]
+ROWS[3][1] = '10.00'  # sorted numerically, it's the greatest value
+
+
+class SampleReport(BaseReport):
+    cache_section = 'test_report'
+    result_chunk_size = 2
+    filter_columns = {'service': 0}
+
+    @staticmethod
+    def get_header(**kwargs):
+        return HEADER
+
+    @staticmethod
+    def get_data(**kwargs):
+        yield True, 100, ROWS
+
+
+class SamplePartialReport(SampleReport):
+    @staticmethod
+    def get_data(**kwargs):
+        for progress in (30, 60):
+            yield False, progress, ROWS[:progress // 30]
+        yield True, 100, ROWS
+
+
+class SampleDictReport(SampleReport):
+    @staticmethod
+    def get_data(**kwargs):
+        yield True, 100, {'type': ROWS}
+
+
+@mock.patch('ralph_scrooge.utils.worker_job.django_rq.get_queue')
+class TestBaseReport(ScroogeTestCase):
+    def setUp(self):
+        cache.clear()
+        self.job = mock.Mock(
+            id='job-1', is_finished=False, is_failed=False, meta={}
+        )
+        self.report = SampleReport()
+        self.report.get_rq_job = mock.Mock(return_value=self.job)
+
+    def _generate_report(self, get_queue_mock):
+        get_queue_mock.return_value.enqueue_call.return_value = self.job
+        self.assertEqual(self.report.run_on_worker(a=1), (0, None))
+        # executed on worker
+        return self.report._worker_func(a=1)
+
+    def test_job_result_is_not_whole_report(self, get_queue_mock):
+        stored = self._generate_report(get_queue_mock)
+        self.assertEqual(len(stored.rows), len(ROWS))
+        self.assertEqual(stored.rows.chunks, 3)
+
+    def test_run_on_worker_without_fetching_result(self, get_queue_mock):
+        self._generate_report(get_queue_mock)
+        self.assertEqual(
+            self.report.run_on_worker(a=1, fetch_result=False), (100, None)
+        )
+
+    def test_run_on_worker_fetch_result(self, get_queue_mock):
+        self._generate_report(get_queue_mock)
+        progress, (header, rows) = self.report.run_on_worker(a=1)
+        self.assertEqual(progress, 100)
+        self.assertEqual(header, HEADER)
+        self.assertEqual(list(rows), ROWS)
+
+    def test_run_on_worker_expired_result(self, get_queue_mock):
+        stored = self._generate_report(get_queue_mock)
+        cache.delete(stored.header_key)
+        self.assertEqual(self.report.run_on_worker(a=1), (100, None))
+        # report is generated again
+        self.assertEqual(self.report.run_on_worker(a=1), (0, None))
+
+    def test_run_on_worker_not_chunked_result(self, get_queue_mock):
+        self.report = SampleDictReport()
+        self.report.get_rq_job = mock.Mock(return_value=self.job)
+        self._generate_report(get_queue_mock)
+        self.assertEqual(
+            self.report.run_on_worker(a=1), (100, (HEADER, {'type': ROWS}))
+        )
+
+    def test_get_page(self, get_queue_mock):
+        self._generate_report(get_queue_mock)
+        stored = self.report.get_stored_result(a=1)
+        page = self.report.get_page(stored, limit=2)
+        self.assertEqual(page.header, HEADER)
+        self.assertEqual(page.total, 5)
+        self.assertEqual(page.rows, [(0, ROWS[0]), (1, ROWS[1])])
+        self.assertEqual(page.next, 1)
+        page = self.report.get_page(stored, limit=2, after=page.next)
+        self.assertEqual(page.rows, [(2, ROWS[2]), (3, ROWS[3])])
+        page = self.report.get_page(stored, limit=2, after=page.next)
+        self.assertEqual(page.rows, [(4, ROWS[4])])
+        self.assertIsNone(page.next)
+
+    def test_get_page_sorted(self, get_queue_mock):
+        self._generate_report(get_queue_mock)
+        stored = self.report.get_stored_result(a=1)
+        page = self.report.get_page(stored, limit=2, sort=1, desc=True)
+        self.assertEqual(page.rows, [(3, ROWS[3]), (4, ROWS[4])])
+        page = self.report.get_page(
+            stored, limit=2, sort=1, desc=True, after=page.next
+        )
+        self.assertEqual(page.rows, [(2, ROWS[2]), (1, ROWS[1])])
+
+    def test_get_page_after_found_in_cached_index(self, get_queue_mock):
+        self._generate_report(get_queue_mock)
+        stored = self.report.get_stored_result(a=1)
+        for sort, desc in ((None, False), (0, False), (1, True)):
+            positions = []
+            page = self.report.get_page(stored, limit=1, sort=sort, desc=desc)
+            positions.append(page.rows[0][0])
+            # index is calculated once, rows are not iterated again
+            with mock.patch.object(
+                type(stored.rows), 'iterate', side_effect=AssertionError
+            ):
+                while page.next is not None:
+                    page = self.report.get_page(
+                        stored, limit=1, sort=sort, desc=desc, after=page.next
+                    )
+                    positions.append(page.rows[0][0])
+            self.assertEqual(positions, self.report._get_rows_index(
+                cache, stored, sort, desc, {}
+            ))
+            self.assertEqual(len(positions), len(ROWS))
+
+    def test_get_page_filtered(self, get_queue_mock):
+        self._generate_report(get_queue_mock)
+        stored = self.report.get_stored_result(a=1)
+        page = self.report.get_page(
+            stored, limit=2, filters={'service': 'service 4'}
+        )
+        self.assertEqual(page.total, 1)
+        self.assertEqual(page.rows, [(4, ROWS[4])])
+
+    def test_get_page_invalid_after(self, get_queue_mock):
+        self._generate_report(get_queue_mock)
+        stored = self.report.get_stored_result(a=1)
+        with self.assertRaises(ValueError):
+            self.report.get_page(
+                stored, limit=2, after=0, filters={'service': 'service 4'}
+            )
+        with self.assertRaises(ValueError):
+            self.report.get_page(stored, limit=2, sort=1, after=len(ROWS))
+
+    def _store_partial_result(self):
+        key = _get_cache_key(SampleReport.cache_section, a=1)
+        # costs are not calculated yet
+        stored = SampleReport._store_partial_result(cache, key, (
+            HEADER,
+            PartialRows(
+                rows=([row[0], None] for row in ROWS[:2]),
+                computed_columns=[0],
+            ),
+        ))
+        cache.set(key, (50, self.job.id, stored))
+
+    def test_replaced_partial_results_are_deleted(self, get_queue_mock):
+        self.report = SamplePartialReport()
+        self.report.get_rq_job = mock.Mock(return_value=self.job)
+        store_partial_result = SamplePartialReport._store_partial_result
+        partial_results = []
+
+        def store_partial_result_mock(cache, key, data):
+            partial_results.append(store_partial_result(cache, key, data))
+            return partial_results[-1]
+
+        with mock.patch.object(
+            SamplePartialReport,
+            '_store_partial_result',
+            staticmethod(store_partial_result_mock),
+        ):
+            stored = self._generate_report(get_queue_mock)
+        self.assertTrue(partial_results)
+        for partial_result in partial_results:
+            self.assertIsNone(cache.get(partial_result.header_key))
+            with self.assertRaises(KeyError):
+                list(partial_result.rows.iterate(cache))
+        self.assertEqual(list(stored.rows.iterate(cache)), ROWS)
+
+    def test_run_on_worker_partial_result(self, get_queue_mock):
+        self._store_partial_result()
+        progress, (header, rows) = self.report.run_on_worker(a=1)
+        self.assertEqual(progress, 50)
+        self.assertEqual(
+            list(rows), [['Service 0', None], ['Service 1', None]]
+        )
+
+    def test_get_page_of_partial_result(self, get_queue_mock):
+        self._store_partial_result()
+        self.assertIsNone(self.report.get_stored_result(a=1))
+        stored = self.report.get_stored_result(partial=True, a=1)
+        self.assertEqual(stored.computed_columns, [0])
+        page = self.report.get_page(stored, limit=10, sort=1, desc=True)
+        self.assertEqual(page.total, 2)
+        self.assertEqual(page.rows, [
+            (1, ['Service 1', None]), (0, ['Service 0', None]),
+        ])
+        # not calculated cells are never matched by filters
+        with mock.patch.object(
+            SampleReport, 'filter_columns', {'service': 0, 'cost': 1}
+        ):
+            page = self.report.get_page(
+                stored, limit=10, filters={'cost': 'none'}
+            )
+        self.assertEqual(page.total, 0)
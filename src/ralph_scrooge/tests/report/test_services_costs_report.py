@@ -0,0 +1,255 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from datetime import date
+from decimal import Decimal as D
+from multiprocessing.pool import ThreadPool
+
+import mock
+from django.db import connection
+from django.test import override_settings, TransactionTestCase
+
+from ralph_scrooge.db_router import is_using_replica, use_replica
+from ralph_scrooge.models import CostDateStatus, DailyCost, DailyCostSummary
+from ralph_scrooge.plugins import plugin_runner
+from ralph_scrooge.plugins.report.base import BaseReportPlugin
+from ralph_scrooge.report.report_services_costs import ServicesCostsReport
+from ralph_scrooge.tests import ScroogeTestCase, ScroogeTestCaseMixin
+from ralph_scrooge.utils.common import AttributeDict
+from ralph_scrooge.tests.utils.factory import (
+    CostDateStatusFactory,
+    DailyCostFactory,
+    PricingServiceFactory,
+    ServiceEnvironmentFactory,
+    TeamFactory,
+    UsageTypeFactory,
+)
+
+
+class ServicesCostsReportTestMixin(object):
+    def setUp(self):
+        self.start = date(2013, 10, 1)
+        self.end = date(2013, 10, 30)
+        self.service_environments = ServiceEnvironmentFactory.create_batch(3)
+        self.usage_type = UsageTypeFactory(usage_type='RU')
+        self.team = TeamFactory()
+        self.pricing_service = PricingServiceFactory()
+        for day in (self.start, self.end):
+            for se in self.service_environments[:2]:
+                for base_usage in (
+                    self.usage_type, self.team, self.pricing_service
+                ):
+                    DailyCostFactory(
+                        date=day,
+                        service_environment=se,
+                        type=base_usage,
+                        cost=D('10'),
+                        value=D('2'),
+                        forecast=False,
+                    )
+
+    def _get_data(self):
+        return list(ServicesCostsReport._get_report_data(
+            start=self.start,
+            end=self.end,
+            is_active=False,
+            forecast=False,
+            service_environments=self.service_environments,
+        ))[-1][2]
+
+
+class TestServicesCostsReport(ServicesCostsReportTestMixin, ScroogeTestCase):
+    def test_get_report_data(self):
+        data = self._get_data()
+        self.assertDictContainsSubset({
+            'cost_{}'.format(self.usage_type.id): D('20'),
+            'count_{}'.format(self.usage_type.id): 4,
+            'cost_{}'.format(self.team.id): D('20'),
+            'cost_{}'.format(self.pricing_service.id): D('20'),
+        }, data[self.service_environments[0].id])
+        self.assertNotIn(
+            'cost_{}'.format(self.usage_type.id),
+            data[self.service_environments[2].id],
+        )
+
+    def test_get_report_data_same_as_calling_every_plugin(self):
+        expected = {se.id: {} for se in self.service_environments}
+        for plugin in ServicesCostsReport.get_plugins():
+            plugin_report = plugin_runner.run_plugin(
+                'scrooge_reports',
+                plugin.plugin_name,
+                start=self.start,
+                end=self.end,
+                forecast=False,
+                type='costs',
+                **plugin.get('plugin_kwargs', {})
+            )
+            ServicesCostsReport._update_report_data(expected, plugin_report)
+        self.assertEqual(self._get_data(), expected)
+
+    def test_get_report_data_summarizes_accepted_days(self):
+        CostDateStatusFactory(date=self.start, calculated=True, accepted=True)
+        CostDateStatusFactory(date=self.end, calculated=True)
+        data = self._get_data()
+        self.assertTrue(CostDateStatus.objects.get(date=self.start).summarized)
+        self.assertFalse(CostDateStatus.objects.get(date=self.end).summarized)
+        self.assertEqual(
+            DailyCostSummary.objects.filter(date=self.start).count(), 6
+        )
+        self.assertFalse(DailyCostSummary.objects.filter(date=self.end))
+        self.assertEqual(
+            data[self.service_environments[0].id][
+                'cost_{}'.format(self.usage_type.id)
+            ],
+            D('20'),
+        )
+
+    def test_get_report_data_uses_summaries(self):
+        CostDateStatusFactory(date=self.start, calculated=True, accepted=True)
+        data = self._get_data()
+        # summarized costs are not read from DailyCost anymore
+        DailyCost.objects.filter(date=self.start).delete()
+        self.assertEqual(self._get_data(), data)
+
+    def test_accepted_days_summarized_using_default_database(self):
+        CostDateStatusFactory(date=self.start, calculated=True, accepted=True)
+        summarize = DailyCostSummary.summarize
+        using_replica = []
+
+        def summarize_mock(dates, forecast):
+            using_replica.append(is_using_replica())
+            return summarize(dates, forecast)
+
+        with mock.patch.object(
+            DailyCostSummary, 'summarize', staticmethod(summarize_mock)
+        ):
+            # report jobs are reading from replica
+            with use_replica():
+                self._get_data()
+        self.assertEqual(using_replica, [False])
+
+    @override_settings(REPORTS_PLUGINS_CONCURRENCY=2)
+    @mock.patch('ralph_scrooge.plugins.plugin_runner.run_plugin')
+    @mock.patch.object(ServicesCostsReport, 'get_plugins')
+    def test_get_report_data_concurrently(self, get_plugins, run_plugin):
+        get_plugins.return_value = [
+            AttributeDict(name=name, plugin_name=name)
+            for name in ('plugin_1', 'plugin_2', 'plugin_3', 'plugin_4')
+        ]
+        se = self.service_environments[0]
+        run_plugin.side_effect = lambda chain, name, **kwargs: {
+            se.id: {name: 1}
+        }
+        results = list(ServicesCostsReport._get_report_data(
+            start=self.start,
+            end=self.end,
+            is_active=False,
+            forecast=False,
+            service_environments=self.service_environments,
+        ))
+        self.assertEqual(
+            [progress for finished, progress, data, computed in results],
+            [25, 50, 75, 100, 100],
+        )
+        self.assertEqual(results[-1][3], {0, 1, 2, 3})
+        # partial data contains already calculated columns
+        self.assertEqual(len(results[0][2][se.id]), 4)
+        self.assertEqual(results[-1][2][se.id], {
+            'plugin_1': 1, 'plugin_2': 1, 'plugin_3': 1, 'plugin_4': 1,
+        })
+
+    @override_settings(REPORTS_PLUGINS_CONCURRENCY=2)
+    @mock.patch('ralph_scrooge.plugins.plugin_runner.run_plugin')
+    @mock.patch.object(ServicesCostsReport, 'get_plugins')
+    def test_get_data_partial_rows_concurrently(self, get_plugins, run_plugin):
+        get_plugins.return_value = [
+            AttributeDict(name='Info', plugin_name='info', run_first=True),
+            AttributeDict(name='plugin_1', plugin_name='plugin_1'),
+            AttributeDict(name='plugin_2', plugin_name='plugin_2'),
+        ]
+
+        def run_plugin_mock(chain, name, type, **kwargs):
+            if type == 'schema':
+                return {name: {
+                    'name': name, 'currency': True, 'total_cost': True,
+                }}
+            return {se.id: {name: 1} for se in self.service_environments}
+        run_plugin.side_effect = run_plugin_mock
+        results = []
+        for finished, progress, rows in ServicesCostsReport.get_data(
+            start=self.start,
+            end=self.end,
+        ):
+            if finished:
+                break
+            results.append((rows.computed_columns, list(rows.rows)[0]))
+        # columns of the first plugin are always calculated first
+        self.assertEqual(results[0], ([0], ['1.00', None, None, None]))
+        self.assertEqual(len(results[1][0]), 2)
+        self.assertEqual(results[1][1].count(None), 2)
+        self.assertEqual(results[2], (
+            [0, 1, 2], ['1.00', '1.00', '1.00', None]
+        ))
+        # total cost is in the final report only
+        self.assertEqual(rows[0], ['1.00', '1.00', '1.00', '3.00'])
+
+    def test_schema_fetched_once_per_report(self):
+        data = self._get_data()
+        with mock.patch.object(
+            ServicesCostsReport,
+            '_get_schema',
+            wraps=ServicesCostsReport._get_schema,
+        ) as get_schema:
+            rows = ServicesCostsReport._prepare_final_report(
+                data, self.service_environments
+            )
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(get_schema.call_count, 1)
+
+    @mock.patch.object(ServicesCostsReport, '_prepare_row')
+    def test_get_data_partial_rows_prepared_lazily(self, prepare_row):
+        prepare_row.return_value = []
+        finished, progress, rows = next(ServicesCostsReport.get_data(
+            start=self.start,
+            end=self.end,
+        ))
+        self.assertFalse(finished)
+        self.assertFalse(prepare_row.called)
+        self.assertEqual(len(list(rows.rows)), 3)
+
+
+class TestServicesCostsReportInThreads(
+    ServicesCostsReportTestMixin, ScroogeTestCaseMixin, TransactionTestCase
+):
+    """
+    Plugins run in threads are using their own DB connections, so data has
+    to be committed to be visible for them.
+    """
+    def test_get_report_data_same_as_in_single_thread(self):
+        if connection.vendor == 'sqlite' and (
+            connection.is_in_memory_db(connection.settings_dict['NAME']) and
+            not connection.features.can_share_in_memory_db
+        ):
+            self.skipTest('In-memory database is not shared between threads')
+        expected = self._get_data()
+        self.assertEqual(
+            expected[self.service_environments[0].id][
+                'cost_{}'.format(self.usage_type.id)
+            ],
+            D('20'),
+        )
+        # every plugin is run separately (in its own thread), instead of
+        # fetching default costs of all of them at once
+        with override_settings(REPORTS_PLUGINS_CONCURRENCY=3), \
+                mock.patch.object(
+                    BaseReportPlugin, 'has_default_costs', False
+                ), mock.patch(
+                    'ralph_scrooge.report.report_services_costs.ThreadPool',
+                    wraps=ThreadPool,
+                ) as thread_pool:
+            self.assertEqual(self._get_data(), expected)
+        thread_pool.assert_called_once_with(3)
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from datetime import date
+
+from ralph_scrooge.report.report_services_usages import ServicesUsagesReport
+from ralph_scrooge.tests import ScroogeTestCase
+from ralph_scrooge.tests.utils.factory import (
+    ServiceEnvironmentFactory,
+    UsageTypeFactory,
+)
+
+
+class TestServicesUsagesReport(ScroogeTestCase):
+    def setUp(self):
+        self.start = date(2013, 10, 1)
+        self.end = date(2013, 10, 2)
+        self.se1, self.se2 = ServiceEnvironmentFactory.create_batch(2)
+        self.ut1 = UsageTypeFactory(rounding=2)
+        self.ut2 = UsageTypeFactory(rounding=0, divide_by=3)
+
+    def test_prepare_final_report(self):
+        data = {
+            self.start: {
+                self.ut1.id: {self.se1.id: 1.234, self.se2.id: 5},
+                self.ut2.id: {self.se1.id: 12345},
+            },
+            # no usages of second usage type this day
+            self.end: {
+                self.ut1.id: {self.se2.id: 0.5},
+            },
+        }
+        result = ServicesUsagesReport._prepare_final_report(
+            self.start,
+            self.end,
+            [self.ut1, self.ut2],
+            data,
+            [self.se1, self.se2],
+        )
+        self.assertEqual(result, [
+            [
+                self.se1.service.name, self.se1.environment.name,
+                '1.23', '12', '0.00', '0',
+            ],
+            [
+                self.se2.service.name, self.se2.environment.name,
+                '5.00', '0', '0.50', '0',
+            ],
+        ])
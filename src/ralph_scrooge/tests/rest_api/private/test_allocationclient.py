@@ -435,3 +435,64 @@ class TestAllocationClient(ScroogeTestCase):
                 "template": "taballocationclientdivision.html",
             }
         )
+
+    def test_save_team_division_replaces_previous_one(self):
+        team_base = factory.TeamFactory()
+        service_environment1 = factory.ServiceEnvironmentFactory()
+        service_environment2 = factory.ServiceEnvironmentFactory()
+        url = '/scrooge/rest/allocationclient/{0}/{1}/{2}/{3}/save/'.format(
+            team_base.id, self.date.year, self.date.month, 'teamdivision'
+        )
+        self.client.post(url, {'rows': [{
+            "service": service_environment1.service.id,
+            "env": service_environment1.environment.id,
+            "value": 100,
+        }]}, format='json')
+        response = self.client.post(url, {'rows': [
+            {
+                "service": service_environment1.service.id,
+                "env": service_environment1.environment.id,
+                "value": 30,
+            },
+            {
+                "service": service_environment2.service.id,
+                "env": service_environment2.environment.id,
+                "value": 70,
+            },
+        ]}, format='json')
+        self.assertTrue(json.loads(response.content)['status'])
+        self.assertEquals(
+            sorted(models.TeamServiceEnvironmentPercent.objects.values_list(
+                'service_environment', 'percent'
+            )),
+            [(service_environment1.id, 30), (service_environment2.id, 70)],
+        )
+
+    def test_save_team_division_with_unknown_service_environments(self):
+        team_base = factory.TeamFactory()
+        service_environment = factory.ServiceEnvironmentFactory()
+        response = self.client.post(
+            '/scrooge/rest/allocationclient/{0}/{1}/{2}/{3}/save/'.format(
+                team_base.id, self.date.year, self.date.month, 'teamdivision'
+            ),
+            {'rows': [
+                {
+                    "service": service_environment.service.id,
+                    "env": service_environment.environment.id,
+                    "value": 50,
+                },
+                {"service": 0, "env": 0, "value": 25},
+                {
+                    "service": service_environment.service.id,
+                    "env": 0,
+                    "value": 25,
+                },
+            ]},
+            format='json'
+        )
+        result = json.loads(response.content)
+        self.assertFalse(result['status'])
+        self.assertEquals(len(result['errors']), 2)
+        self.assertFalse(
+            models.TeamServiceEnvironmentPercent.objects.exists()
+        )
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import json
+from datetime import date
+
+import mock
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.urlresolvers import reverse
+from rest_framework.test import APIClient
+
+from ralph_scrooge.report.base_report import PartialRows
+from ralph_scrooge.report.report_services_costs import ServicesCostsReport
+from ralph_scrooge.tests import ScroogeTestCase
+from ralph_scrooge.tests.utils.factory import ServiceEnvironmentFactory
+from ralph_scrooge.utils.worker_job import _get_cache_key
+
+
+class TestServicesCostsReportContent(ScroogeTestCase):
+    def setUp(self):
+        cache.clear()
+        self.job = mock.Mock(id='job-1', is_finished=True, is_failed=False)
+        for target, side_effect in (
+            ('django_rq.get_queue', lambda name: self),
+            ('WorkerJob.get_rq_job', lambda job_id: self.job),
+        ):
+            patcher = mock.patch(
+                'ralph_scrooge.utils.worker_job.{}'.format(target),
+                side_effect=side_effect,
+            )
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        get_user_model().objects.create_superuser(
+            'test', 'test@test.test', 'test'
+        )
+        self.client = APIClient()
+        self.client.login(username='test', password='test')
+        self.service_environments = ServiceEnvironmentFactory.create_batch(3)
+
+    def enqueue_call(self, func, kwargs, **options):
+        # (fake queue) execute job immediately, without connecting to RQ
+        self.job.result = func(**kwargs)
+        return self.job
+
+    def _get(self, **params):
+        params.update(start='2016-10-01', end='2016-10-31')
+        response = self.client.get(
+            reverse('services_costs_report_rest'), params
+        )
+        return json.loads(response.content)
+
+    def _get_page(self, **params):
+        # first request starts the report (executed synchronously in tests)
+        self._get()
+        return self._get(report_format='json', **params)
+
+    def test_get_page(self):
+        result = self._get_page(limit=2)
+        self.assertTrue(result['finished'])
+        self.assertEqual(result['total'], 3)
+        self.assertEqual([row['id'] for row in result['rows']], [0, 1])
+        self.assertEqual(result['next'], 1)
+        result = self._get(report_format='json', limit=2, after=1)
+        self.assertEqual([row['id'] for row in result['rows']], [2])
+        self.assertIsNone(result['next'])
+
+    def test_get_page_filtered_by_service(self):
+        service_environment = self.service_environments[1]
+        result = self._get_page(service=service_environment.service.name)
+        self.assertEqual(result['total'], 1)
+        self.assertEqual(
+            result['rows'][0]['values'][0], service_environment.id
+        )
+
+    def test_get_page_invalid_params(self):
+        self._get()
+        for params in ({'limit': 'a'}, {'sort': 1000}, {'after': 1000}):
+            response = self.client.get(
+                reverse('services_costs_report_rest'),
+                dict(
+                    start='2016-10-01',
+                    end='2016-10-31',
+                    report_format='json',
+                    **params
+                ),
+            )
+            self.assertEqual(response.status_code, 400)
+
+    def test_get_partial_page(self):
+        self.job.is_finished = False
+        key = _get_cache_key(
+            ServicesCostsReport.cache_section,
+            start=date(2016, 10, 1),
+            end=date(2016, 10, 31),
+            forecast=False,
+            is_active=False,
+        )
+        stored = ServicesCostsReport._store_partial_result(
+            cache, key, ([['Name', 'Cost']], PartialRows(
+                rows=[['a', None], ['b', None]], computed_columns=[0],
+            ))
+        )
+        cache.set(key, (50, self.job.id, stored))
+        result = self._get(report_format='json', limit=1)
+        self.assertFalse(result['finished'])
+        self.assertTrue(result['partial'])
+        self.assertEqual(result['total'], 2)
+        self.assertEqual(
+            result['rows'], [{'id': 0, 'values': ['a', None]}]
+        )
+        self.assertEqual(result['computed_columns'], [0])
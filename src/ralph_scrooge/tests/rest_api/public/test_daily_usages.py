@@ -5,13 +5,27 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import json
 
+import mock
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
 from django.core.urlresolvers import reverse
+from django.test import override_settings
 
 from rest_framework import status
 from rest_framework.test import APIClient
 
+from ralph_scrooge.models import DailyUsage
+from ralph_scrooge.rest_api.public.v0_10.pagination import (
+    get_keyset_position,
+    get_keyset_query,
+)
+from ralph_scrooge.rest_api.public.v0_10.serializers import (
+    DailyUsageSerializer,
+)
+from ralph_scrooge.rest_api.public.v0_10.views import DailyUsageViewSet
 from ralph_scrooge.tests import ScroogeTestCase
 from ralph_scrooge.tests.utils.factory import (
     DailyUsageFactory,
@@ -22,11 +36,11 @@ from ralph_scrooge.tests.utils.factory import (
 class TestUsageTypesAPI(ScroogeTestCase):
 
     def setUp(self):
-        superuser = get_user_model().objects.create_superuser(
+        self.superuser = get_user_model().objects.create_superuser(
             'test', 'test@test.test', 'test'
         )
         self.client = APIClient()
-        self.client.force_authenticate(superuser)
+        self.client.force_authenticate(self.superuser)
         se1 = ServiceEnvironmentFactory(service__ci_uid='sc-123')
         se2 = ServiceEnvironmentFactory(service__ci_uid='sc-321')
         DailyUsageFactory.create_batch(
@@ -63,3 +77,88 @@ class TestUsageTypesAPI(ScroogeTestCase):
         )
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.json()['count'], 20)
+
+    def test_daily_usages_representation(self):
+        response = self.client.get(reverse('v0_10:dailyusage-list'))
+        self.assertEqual(
+            sorted(response.json()['results'], key=lambda u: u['id']),
+            json.loads(json.dumps(DailyUsageSerializer(
+                DailyUsage.objects.order_by('id')[:50], many=True
+            ).data))
+        )
+
+    def _get_all_pages(self, limit):
+        ids = []
+        url = '{}?cursor=&limit={}'.format(
+            reverse('v0_10:dailyusage-list'), limit
+        )
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn('count', response.json())
+            results = response.json()['results']
+            self.assertLessEqual(len(results), limit)
+            ids.extend(usage['id'] for usage in results)
+            url = response.json()['next']
+        return ids
+
+    def test_get_daily_usages_with_keyset_pagination(self):
+        self.assertEqual(
+            self._get_all_pages(limit=7),
+            list(DailyUsage.objects.order_by('date', 'id').values_list(
+                'id', flat=True
+            ))
+        )
+
+    def test_keyset_query(self):
+        ordering = ('date', 'service_environment', 'id')
+        rows = list(DailyUsage.objects.order_by(*ordering).values(*ordering))
+        position = get_keyset_position(ordering, rows[15])
+        queryset = DailyUsage.objects.filter(
+            get_keyset_query(ordering, position)
+        )
+        self.assertEqual(
+            sorted(queryset.values_list('id', flat=True)),
+            sorted(row['id'] for row in rows[16:]),
+        )
+        # leading condition on the first field allows index range scan
+        self.assertIn('"date" >= ', str(queryset.query))
+
+    def test_keyset_pagination_invalid_cursor(self):
+        response = self.client.get(
+            '{}?cursor=invalid'.format(reverse('v0_10:dailyusage-list'))
+        )
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    @override_settings(
+        API_KEYSET_MAX_LIMIT=5, API_KEYSET_SERVICE_ACCOUNT_MAX_LIMIT=25
+    )
+    def test_keyset_pagination_max_limit(self):
+        url = '{}?cursor=&limit=100'.format(reverse('v0_10:dailyusage-list'))
+        response = self.client.get(url)
+        self.assertEqual(len(response.json()['results']), 5)
+        self.superuser.groups.add(
+            Group.objects.create(name=settings.SERVICE_ACCOUNTS_GROUP_NAME)
+        )
+        response = self.client.get(url)
+        self.assertEqual(len(response.json()['results']), 25)
+
+    @mock.patch.object(DailyUsageViewSet, 'export_batch_size', 7)
+    def test_export_daily_usages(self):
+        response = self.client.get(
+            '{}?{}'.format(
+                reverse('v0_10:dailyusage-export'), 'service_uid=sc-321'
+            )
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        usages = [
+            json.loads(line)
+            for line in b''.join(response.streaming_content).splitlines()
+        ]
+        self.assertEqual(
+            [usage['id'] for usage in usages],
+            list(DailyUsage.objects.filter(
+                service_environment__service__ci_uid='sc-321'
+            ).order_by('date', 'id').values_list('id', flat=True))
+        )
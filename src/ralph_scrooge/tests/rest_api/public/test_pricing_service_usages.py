@@ -8,25 +8,37 @@ from __future__ import unicode_literals
 import datetime
 import json
 
+import mock
 from django.contrib.auth import get_user_model
 from django.core.urlresolvers import reverse
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
 from rest_framework.test import APIClient
 
 from ralph_scrooge.models import (
     DailyUsage,
     Environment,
+    PricingObjectServiceChange,
     PricingService,
     Service,
     ServiceUsageTypes,
     UsageType,
 )
+from ralph_scrooge.rest_api.public.v0_9.pricing_service_usages import (
+    RecalculateCostsJob,
+    remove_previous_daily_usages,
+)
 from ralph_scrooge.tests import ScroogeTestCase
 from ralph_scrooge.tests.utils.factory import (
+    CostDateStatusFactory,
+    DailyPricingObjectFactory,
     DailyUsageFactory,
     PricingObjectFactory,
     PricingServiceFactory,
+    ServiceEnvironmentFactory,
     UsageTypeFactory,
 )
+from ralph_scrooge.utils.dimensions import get_daily_pricing_objects_versions
 
 
 class TestPricingServiceUsages(ScroogeTestCase):
@@ -1295,3 +1307,180 @@ class TestPricingServiceUsages(ScroogeTestCase):
             content_type='application/json',
         )
         self.assertEquals(resp.status_code, 201)
+
+    def _post_usages(self, date, pricing_objects):
+        usages = []
+        for pricing_object in pricing_objects:
+            se = pricing_object.service_environment
+            for params in (
+                {'pricing_object': pricing_object.name},
+                {
+                    'service': se.service.name,
+                    'environment': se.environment.name,
+                },
+                {
+                    'service_id': se.service.id,
+                    'environment': se.environment.name,
+                },
+            ):
+                params['usages'] = [
+                    {'symbol': self.usage_type.symbol, 'value': 40},
+                ]
+                usages.append(params)
+        with CaptureQueriesContext(connection) as queries:
+            resp = self.client.post(
+                reverse('create_pricing_service_usages'),
+                json.dumps({
+                    "pricing_service": self.pricing_service.name,
+                    "date": date.strftime("%Y-%m-%d"),
+                    "usages": usages,
+                }),
+                content_type='application/json',
+            )
+        self.assertEquals(resp.status_code, 201)
+        return len(queries)
+
+    def test_number_of_queries_does_not_depend_on_number_of_usages(self):
+        queries_count = self._post_usages(
+            self.date, [self.pricing_object1, self.pricing_object2]
+        )
+        pricing_objects = PricingObjectFactory.create_batch(5)
+        self.assertEqual(
+            self._post_usages(
+                self.date + datetime.timedelta(days=1), pricing_objects
+            ),
+            queries_count,
+        )
+        self.assertEqual(
+            DailyUsage.objects.filter(
+                date=self.date + datetime.timedelta(days=1)
+            ).count(),
+            15,
+        )
+
+    def test_daily_pricing_objects_version_bumped_on_commit(self):
+        date = self.date + datetime.timedelta(days=1)
+        versions = get_daily_pricing_objects_versions([date])
+        with mock.patch(
+            'ralph_scrooge.utils.dimensions.transaction.on_commit'
+        ) as on_commit_mock:
+            self._post_usages(date, PricingObjectFactory.create_batch(2))
+        # version is not bumped until created daily pricing objects are
+        # committed
+        self.assertEqual(get_daily_pricing_objects_versions([date]), versions)
+        for call in on_commit_mock.call_args_list:
+            call[0][0]()
+        self.assertNotEqual(
+            get_daily_pricing_objects_versions([date]), versions
+        )
+
+    def test_services_changes_logged_for_created_daily_pricing_objects(self):
+        service_environment = ServiceEnvironmentFactory()
+        DailyPricingObjectFactory(
+            pricing_object=self.pricing_object1,
+            service_environment=service_environment,
+            date=self.date - datetime.timedelta(days=1),
+        )
+        self._post_usages(self.date, [self.pricing_object1])
+        change = PricingObjectServiceChange.objects.get(
+            pricing_object=self.pricing_object1
+        )
+        self.assertEqual(change.date, self.date)
+        self.assertEqual(
+            change.service_environment_before, service_environment
+        )
+        self.assertEqual(
+            change.service_environment_after, self.service_environment1
+        )
+
+
+class TestRemovePreviousDailyUsages(ScroogeTestCase):
+    def setUp(self):
+        self.date = datetime.date(2016, 9, 8)
+        self.ut1, self.ut2 = UsageTypeFactory.create_batch(2)
+        self.dpo1, self.dpo2 = DailyPricingObjectFactory.create_batch(
+            2, date=self.date
+        )
+        for ut in (self.ut1, self.ut2):
+            for dpo in (self.dpo1, self.dpo2):
+                DailyUsageFactory(
+                    date=self.date, type=ut, daily_pricing_object=dpo
+                )
+        # usage of other day should remain untouched
+        self.other_day_usage = DailyUsageFactory(
+            date=self.date - datetime.timedelta(days=1),
+            type=self.ut1,
+            daily_pricing_object=self.dpo1,
+        )
+
+    def _get_remaining(self):
+        return set(DailyUsage.objects.values_list(
+            'date', 'type_id', 'daily_pricing_object_id'
+        ))
+
+    def _test_values_only(self):
+        remove_previous_daily_usages('values_only', self.date, {
+            self.ut1: [self.dpo1, self.dpo2],
+            self.ut2: [self.dpo2],
+        })
+        self.assertEqual(self._get_remaining(), {
+            (self.other_day_usage.date, self.ut1.id, self.dpo1.id),
+            (self.date, self.ut2.id, self.dpo1.id),
+        })
+
+    def test_values_only(self):
+        self._test_values_only()
+
+    @mock.patch(
+        'ralph_scrooge.rest_api.public.v0_9.pricing_service_usages.QUERY_BATCH_SIZE',  # noqa: E501
+        1
+    )
+    def test_values_only_with_keys_table(self):
+        self._test_values_only()
+
+    @mock.patch(
+        'ralph_scrooge.rest_api.public.v0_9.pricing_service_usages.QUERY_BATCH_SIZE',  # noqa: E501
+        1
+    )
+    def test_values_only_with_keys_table_rolled_back(self):
+        remaining = self._get_remaining()
+        with self.assertRaises(ValueError):
+            with transaction.atomic():
+                self._test_values_only()
+                raise ValueError()
+        # deleting usages is not committed in the middle of transaction
+        self.assertEqual(self._get_remaining(), remaining)
+
+    def test_delete_all_previous(self):
+        remove_previous_daily_usages(
+            'delete_all_previous', self.date, {self.ut2: [self.dpo2]}
+        )
+        self.assertEqual(self._get_remaining(), {
+            (self.other_day_usage.date, self.ut1.id, self.dpo1.id),
+            (self.date, self.ut1.id, self.dpo1.id),
+            (self.date, self.ut1.id, self.dpo2.id),
+        })
+
+
+class TestRecalculateCostsJob(ScroogeTestCase):
+    def setUp(self):
+        self.date = datetime.date(2016, 9, 8)
+        self.pricing_service = PricingServiceFactory()
+
+    @mock.patch('ralph_scrooge.plugins.cost.collector.Collector.calculate_daily_costs_for_day')  # noqa: E501
+    def test_run(self, calculate_mock):
+        list(RecalculateCostsJob.run(self.date, [self.pricing_service.name]))
+        plugins = calculate_mock.call_args[0][2]
+        self.assertEqual(
+            [p.name for p in plugins], [self.pricing_service.name]
+        )
+        calculate_mock.assert_has_calls([
+            mock.call(self.date, False, plugins),
+            mock.call(self.date, True, plugins),
+        ])
+
+    @mock.patch('ralph_scrooge.plugins.cost.collector.Collector.calculate_daily_costs_for_day')  # noqa: E501
+    def test_run_when_costs_are_accepted(self, calculate_mock):
+        CostDateStatusFactory(date=self.date, accepted=True)
+        list(RecalculateCostsJob.run(self.date, [self.pricing_service.name]))
+        calculate_mock.assert_called_once_with(self.date, True, [mock.ANY])
@@ -8,12 +8,17 @@ from __future__ import unicode_literals
 import datetime
 import json
 
+import mock
 from ddt import ddt, data
+from django.core.cache import cache
 from django.core.urlresolvers import reverse
+from django.test.utils import override_settings
 from rest_framework.test import APIClient
 
+from ralph_scrooge.db_router import is_using_replica
 from ralph_scrooge.models import (
     BaseUsage,
+    CostDateStatus,
     DailyCost,
     Environment,
     OwnershipType,
@@ -27,7 +32,9 @@ from ralph_scrooge.models import (
 from ralph_scrooge.rest_api.public.v0_10.service_environment_costs import (
     USAGE_COST_NUM_DIGITS,
     USAGE_VALUE_NUM_DIGITS,
+    _build_cost_trees,
     date_range,
+    fetch_costs,
 )
 from ralph_scrooge.tests import ScroogeTestCase
 from ralph_scrooge.tests.utils.factory import (
@@ -37,6 +44,7 @@ from ralph_scrooge.tests.utils.factory import (
     UsageTypeFactory,
     DailyCostFactory,
 )
+from ralph_scrooge.utils.dimensions import bump_costs_version
 
 # Let's abbreviate this name for convenience.
 strptime = datetime.datetime.strptime
@@ -46,6 +54,7 @@ strptime = datetime.datetime.strptime
 class TestServiceEnvironmentCosts(ScroogeTestCase):
 
     def setUp(self):
+        cache.clear()
         self.date1 = datetime.date(2016, 8, 1)
         self.date1_as_str = self.date1.strftime("%Y-%m-%d")
         self.date2 = datetime.date(2016, 10, 1)
@@ -95,29 +104,31 @@ class TestServiceEnvironmentCosts(ScroogeTestCase):
         `parent` arg should be a tuple (pricing service, date as string) - this
         pricing service will be used as a parent for created DailyCosts.
 
-        Subcosts are linked to parent costs via `path` field, e.g. a cost with
-        `path` "0/1" is a subcost of a cost with `path` "0". And also, parent
-        costs can be distinguished from subcosts by `depth` field, which will
-        be 0 in the former case, and 1 in the latter.
+        Subcosts are linked to parent costs via `path` field (built from ids
+        of types, as in `MultiPathNode`), e.g. a cost with `path` "3/1" is a
+        subcost of a cost with `path` "3". And also, parent costs can be
+        distinguished from subcosts by `depth` field, which will be 0 in the
+        former case, and 1 in the latter.
 
         `forecast` designates if costs should be created as "forecasted" (in
         in contrast to "normal" ones).
         """
         pricing_object = self.pricing_object1
+        # costs are changed, as they would be by costs collector
+        for dc in daily_costs:
+            bump_costs_version(
+                dc[1] if isinstance(dc[1], datetime.date)
+                else strptime(dc[1], '%Y-%m-%d').date()
+            )
         if not service_env:
             service_env = self.service_environment1
         if parent is not None:
             parent_value = parent_cost = 0
-            children = set([dc[0] for dc in daily_costs])
-            child_id_lookup = {}
-            for n, c in enumerate(children):
-                child_id_lookup[c] = n
 
-        for n, dc in enumerate(daily_costs, 1):
+        for dc in daily_costs:
             if parent is not None:
                 parent_value += dc[2]
                 parent_cost += dc[3]
-                id_ = child_id_lookup[dc[0]]
             DailyCostFactory(
                 type=dc[0],
                 pricing_object=pricing_object,
@@ -126,7 +137,10 @@ class TestServiceEnvironmentCosts(ScroogeTestCase):
                 value=dc[2],
                 cost=dc[3],
                 depth=(1 if parent is not None else 0),
-                path=("0/{}".format(id_) if parent is not None else str(n)),
+                path=(
+                    "{}/{}".format(parent[0].id, dc[0].id)
+                    if parent is not None else str(dc[0].id)
+                ),
                 forecast=forecast,
             )
         if parent is not None:
@@ -138,7 +152,7 @@ class TestServiceEnvironmentCosts(ScroogeTestCase):
                 value=parent_value,
                 cost=parent_cost,
                 depth=0,
-                path="0",
+                path=str(parent[0].id),
                 forecast=forecast,
             )
 
@@ -149,6 +163,67 @@ class TestServiceEnvironmentCosts(ScroogeTestCase):
             content_type='application/json',
         )
 
+    def send_get_request(self, **headers):
+        return self.client.get(
+            reverse('service_environment_costs'),
+            self.payload,
+            **headers
+        )
+
+    def send_batch_request(self):
+        resp = self.client.post(
+            reverse('service_environments_costs'),
+            json.dumps(self.payload),
+            content_type='application/json',
+        )
+        if resp.status_code != 200:
+            return resp.status_code, json.loads(resp.content)
+        self.assertEquals(resp['Content-Type'], 'application/x-ndjson')
+        return resp.status_code, [
+            json.loads(line)
+            for line in b''.join(resp.streaming_content).splitlines()
+        ]
+
+    def _prepare_costs_for_batch(self):
+        self.create_daily_costs(
+            ((self.usage_type1, self.date1, 10, 20),),
+            parent=(self.pricing_service, self.date1_as_str),
+        )
+        self.create_daily_costs(
+            ((self.usage_type2, self.date1, 11, 30),),
+            service_env=self.service_environment2,
+            parent=(self.pricing_service, self.date1_as_str),
+        )
+        CostDateStatusFactory(date=self.date1, accepted=True)
+        self.payload = {
+            "service_environments": [
+                {
+                    "service_uid": self.service_uid1,
+                    "environment": self.environment1,
+                },
+                {"service_uid": self.service_uid2},
+            ],
+            "date_from": self.date1_as_str,
+            "date_to": self.date1_as_str,
+            "group_by": "day",
+            "types": [self.pricing_service.symbol],
+        }
+
+    def _prepare_costs_for_get(self):
+        self.create_daily_costs(
+            ((self.usage_type1, self.date1, 10, 20),),
+            parent=(self.pricing_service, self.date1_as_str),
+        )
+        CostDateStatusFactory(date=self.date1, accepted=True)
+        self.payload = {
+            "service_uid": self.service_uid1,
+            "environment": self.environment1,
+            "date_from": self.date1_as_str,
+            "date_to": self.date1_as_str,
+            "group_by": "day",
+            "types": [self.pricing_service.symbol],
+        }
+
     def test_for_error_when_date_from_is_greater_than_date_to(self):
         self.payload = {
             "service_uid": self.service_uid1,
@@ -1111,3 +1186,202 @@ class TestServiceEnvironmentCosts(ScroogeTestCase):
         self.assertEqual(
             costs['service_environment_costs'][2]['total_cost'], 0
         )
+
+    def test_get_returns_the_same_costs_as_post(self):
+        self._prepare_costs_for_get()
+        resp = self.send_get_request()
+        self.assertEquals(resp.status_code, 200)
+        self.assertEquals(
+            json.loads(resp.content),
+            json.loads(self.send_post_request().content)
+        )
+        costs = json.loads(resp.content)['service_environment_costs']
+        self.assertEquals(costs[0]['total_cost'], 20)
+
+    def test_get_returns_not_modified_when_costs_were_not_changed(self):
+        self._prepare_costs_for_get()
+        etag = self.send_get_request()['ETag']
+        resp = self.send_get_request(HTTP_IF_NONE_MATCH=etag)
+        self.assertEquals(resp.status_code, 304)
+        self.assertEquals(resp['ETag'], etag)
+        # costs were recalculated
+        bump_costs_version(self.date1)
+        resp = self.send_get_request(HTTP_IF_NONE_MATCH=etag)
+        self.assertEquals(resp.status_code, 200)
+        self.assertNotEqual(resp['ETag'], etag)
+
+    def test_get_reads_costs_from_default_database(self):
+        self._prepare_costs_for_get()
+        using_replica = []
+
+        def fetch_costs_mock(*args, **kwargs):
+            using_replica.append(is_using_replica())
+            return fetch_costs(*args, **kwargs)
+
+        with mock.patch(
+            'ralph_scrooge.rest_api.public.v0_10.service_environment_costs.'
+            'fetch_costs',
+            fetch_costs_mock,
+        ):
+            resp = self.send_get_request()
+        self.assertEquals(resp.status_code, 200)
+        # costs cached under ETag are never read from (lagging) replica
+        self.assertEqual(using_replica, [False])
+
+    def test_etag_is_changed_when_costs_are_accepted(self):
+        self._prepare_costs_for_get()
+        CostDateStatus.objects.filter(date=self.date1).update(accepted=False)
+        etag = self.send_get_request()['ETag']
+        CostDateStatus.objects.filter(date=self.date1).update(accepted=True)
+        resp = self.send_get_request(HTTP_IF_NONE_MATCH=etag)
+        self.assertEquals(resp.status_code, 200)
+        self.assertEquals(
+            json.loads(resp.content)['service_environment_costs'][0][
+                'total_cost'
+            ],
+            20
+        )
+
+    def test_get_is_allowed_only_for_superuser_and_service_owner(self):
+        self._prepare_costs_for_get()
+        regular_user = ScroogeUser.objects.create_user(
+            'username2', 'username2@test.test', 'pass2'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(regular_user)
+        resp = self.send_get_request()
+        self.assertEquals(resp.status_code, 403)
+
+    @override_settings(API_COSTS_QUERY_MAX_COST=1)
+    def test_for_error_when_query_is_too_expensive(self):
+        self._prepare_costs_for_get()
+        self.assertEquals(self.send_get_request().status_code, 200)
+        # 2 days x 1 service environment x 1 type
+        self.payload['date_to'] = '2016-08-02'
+        resp = self.send_get_request()
+        self.assertEquals(resp.status_code, 400)
+        self.assertIn(
+            'estimated cost: 2, max cost: 1',
+            json.loads(resp.content)['non_field_errors'][0]
+        )
+
+    def test_batch_returns_the_same_costs_as_single_requests(self):
+        self._prepare_costs_for_batch()
+        status_code, lines = self.send_batch_request()
+        self.assertEquals(status_code, 200)
+        self.assertEquals(
+            [(line['service_uid'], line['environment']) for line in lines],
+            [
+                (self.service_uid1, self.environment1),
+                (self.service_uid2, self.environment2),
+            ]
+        )
+        batch_payload = self.payload
+        for line in lines:
+            self.payload = dict(
+                batch_payload,
+                service_uid=line['service_uid'],
+                environment=line['environment'],
+            )
+            del self.payload['service_environments']
+            self.assertEquals(
+                line['service_environment_costs'],
+                json.loads(
+                    self.send_post_request().content
+                )['service_environment_costs'],
+            )
+        self.assertEquals(
+            lines[1]['service_environment_costs'][0]['total_cost'], 30
+        )
+
+    def test_batch_with_unknown_service_environment(self):
+        self._prepare_costs_for_batch()
+        self.payload['service_environments'].append({
+            'service_uid': self.service_uid1, 'environment': 'unknown',
+        })
+        status_code, errors = self.send_batch_request()
+        self.assertEquals(status_code, 400)
+        self.assertIn(
+            '"unknown" does not exist', errors['non_field_errors'][0]
+        )
+
+    def test_for_error_when_batch_query_is_too_expensive(self):
+        self._prepare_costs_for_batch()
+        # 1 day x 2 service environments x 1 type
+        with override_settings(API_COSTS_QUERY_MAX_COST=2):
+            self.assertEquals(self.send_batch_request()[0], 200)
+        with override_settings(API_COSTS_QUERY_MAX_COST=1):
+            self.assertEquals(self.send_batch_request()[0], 400)
+
+    def test_batch_returns_only_owned_service_environments(self):
+        self._prepare_costs_for_batch()
+        regular_user = ScroogeUser.objects.create_user(
+            'username2', 'username2@test.test', 'pass2'
+        )
+        ServiceOwnership.objects.create(
+            service=self.service_environment2.service,
+            type=OwnershipType.business,
+            owner=regular_user
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(regular_user)
+        status_code, _ = self.send_batch_request()
+        self.assertEquals(status_code, 403)
+
+        del self.payload['service_environments']
+        status_code, lines = self.send_batch_request()
+        self.assertEquals(status_code, 200)
+        self.assertEquals(
+            [(line['service_uid'], line['environment']) for line in lines],
+            [(self.service_uid2, self.environment2)]
+        )
+
+
+class TestBuildCostTrees(ScroogeTestCase):
+    def setUp(self):
+        self.date = datetime.date(2016, 10, 7)
+        self.type1, self.type2, self.subtype = UsageTypeFactory.create_batch(3)
+
+    def _record(self, type_, path, cost, value):
+        return {
+            'date': self.date,
+            'depth': path.count('/'),
+            'path': path,
+            'type': type_.id,
+            'type__symbol': type_.symbol,
+            'type__name': type_.name,
+            'cost_sum': cost,
+            'value_sum': value,
+        }
+
+    def test_build_cost_trees(self):
+        path1 = str(self.type1.id)
+        aggregated_costs = [
+            # subcost is processed before its parent
+            self._record(
+                self.subtype, '{}/{}'.format(path1, self.subtype.id),
+                1.234, 0.123456
+            ),
+            self._record(self.type1, path1, 1.234, 0),
+            self._record(self.type2, str(self.type2.id), 10, 1),
+        ]
+        cost_trees, total_costs = _build_cost_trees(
+            aggregated_costs, 'date', [self.type1]
+        )
+        self.assertEqual(total_costs, {self.date: 11.234})
+        self.assertEqual(cost_trees, {
+            self.date: {
+                self.type1.symbol: {
+                    'cost': 1.23,
+                    'usage_value': 0,
+                    'type': self.type1.name,
+                    'subcosts': {
+                        self.subtype.symbol: {
+                            'cost': 1.23,
+                            'usage_value': 0.12346,
+                            'type': self.subtype.name,
+                        },
+                    },
+                },
+            },
+        })
@@ -155,6 +155,46 @@ class TestTeamTimeDivision(ScroogeTestCase):
         self.assertIn(self.service2_uid, resp.content)
         self.assertIn(self.service1_env_name, resp.content)
 
+    def test_for_errors_of_every_non_existing_service_env(self):
+        division = {
+            "division": [
+                {
+                    "service_uid": self.service1_uid,
+                    "environment": self.service2_env_name,
+                    "percent": 50.0,
+                },
+                {
+                    "service_uid": self.service2_uid,
+                    "environment": self.service2_env_name,
+                    "percent": 20.0,
+                },
+                {
+                    "service_uid": self.service3_uid,
+                    "environment": self.service1_env_name,
+                    "percent": 30.0,
+                }
+            ]
+        }
+        resp = self.client.post(
+            reverse(
+                'team_time_division',
+                kwargs={
+                    'year': self.date.year,
+                    'month': self.date.month,
+                    'team_id': self.team.id,
+                },
+            ),
+            json.dumps(division),
+            content_type='application/json',
+        )
+        self.assertEquals(resp.status_code, 400)
+        errors = json.loads(resp.content)['division']
+        self.assertEquals(len(errors), 3)
+        self.assertIn(self.service1_uid, errors[0]['non_field_errors'][0])
+        self.assertEquals(errors[1], {})
+        self.assertIn(self.service3_uid, errors[2]['non_field_errors'][0])
+        self.assertEquals(TeamServiceEnvironmentPercent.objects.count(), 0)
+
     def test_for_error_when_percents_doesnt_sum_up_to_100(self):
         # We are testing here *both* validation of `percent` field, and the
         # correctness of saved values.
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import datetime
+
+import mock
+from django.contrib.auth import get_user_model
+from django.core.cache import cache, caches as dj_caches
+from django.core.urlresolvers import reverse
+from django.test.utils import override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from ralph_scrooge.models import UsagesUpload
+from ralph_scrooge.rest_api.public.throttling import TokenBucketThrottle
+from ralph_scrooge.tests import ScroogeTestCase
+from ralph_scrooge.utils.common import get_cache_name
+from ralph_scrooge.tests.utils.factory import PricingServiceFactory
+
+
+@override_settings(API_THROTTLE_BURST=2, API_THROTTLE_RATE=0.5)
+@mock.patch.object(TokenBucketThrottle, 'timer')
+class TestTokenBucketThrottle(ScroogeTestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            'test', 'test@test.test', 'test'
+        )
+        self.upload = UsagesUpload.objects.create(
+            created_by=self.user,
+            pricing_service=PricingServiceFactory(),
+            date=datetime.date(2016, 9, 8),
+        )
+        self.client = APIClient()
+        self.client.credentials(
+            HTTP_AUTHORIZATION='Token {}'.format(
+                Token.objects.get_or_create(user=self.user)[0].key
+            )
+        )
+
+    def _get(self, timer_mock, time):
+        timer_mock.return_value = time
+        return self.client.get(
+            reverse('get_usages_upload', args=(self.upload.id,))
+        )
+
+    def test_burst_is_limited(self, timer_mock):
+        self.assertEqual(self._get(timer_mock, 100).status_code, 200)
+        self.assertEqual(self._get(timer_mock, 100).status_code, 200)
+        resp = self._get(timer_mock, 101.5)
+        self.assertEqual(resp.status_code, 429)
+        # single request is refilled every 2 seconds (at 102), so next
+        # request is allowed after 0.5 second (rounded up)
+        self.assertEqual(resp['Retry-After'], '1')
+
+    def test_bucket_is_refilled(self, timer_mock):
+        self._get(timer_mock, 100)
+        self._get(timer_mock, 100)
+        self.assertEqual(self._get(timer_mock, 101).status_code, 429)
+        self.assertEqual(self._get(timer_mock, 102).status_code, 200)
+        self.assertEqual(self._get(timer_mock, 102).status_code, 429)
+        self.assertEqual(self._get(timer_mock, 104).status_code, 200)
+        self.assertEqual(self._get(timer_mock, 104).status_code, 429)
+        # bucket is never filled over the burst
+        self.assertEqual(self._get(timer_mock, 200).status_code, 200)
+        self.assertEqual(self._get(timer_mock, 200).status_code, 200)
+        self.assertEqual(self._get(timer_mock, 200).status_code, 429)
+
+    def test_burst_is_not_doubled_at_refill(self, timer_mock):
+        self.assertEqual(self._get(timer_mock, 103.9).status_code, 200)
+        self.assertEqual(self._get(timer_mock, 103.9).status_code, 200)
+        # only one request is refilled in 2 seconds
+        self.assertEqual(self._get(timer_mock, 105.9).status_code, 200)
+        self.assertEqual(self._get(timer_mock, 105.9).status_code, 429)
+
+    @mock.patch.object(TokenBucketThrottle, 'sleep')
+    def test_interleaved_requests_are_counted(self, sleep_mock, timer_mock):
+        timer_mock.return_value = 100
+        request = mock.Mock(auth=mock.Mock(key='token'))
+        throttle_cache = dj_caches[get_cache_name('scrooge_api_throttle')]
+        self.assertTrue(TokenBucketThrottle().allow_request(request, None))
+        get = throttle_cache.get
+        interleaved = []
+
+        def interleaved_get(key, *args, **kwargs):
+            # other request is processed while this one is checked
+            if not interleaved:
+                interleaved.append(None)
+                interleaved[0] = TokenBucketThrottle().allow_request(
+                    request, None
+                )
+            return get(key, *args, **kwargs)
+
+        with mock.patch.object(throttle_cache, 'get', interleaved_get):
+            allowed = TokenBucketThrottle().allow_request(request, None)
+        # other request waits for the lock of the bucket (and gives up)
+        self.assertTrue(allowed)
+        self.assertFalse(interleaved[0])
+        self.assertEqual(
+            sleep_mock.call_count, TokenBucketThrottle.lock_attempts
+        )
+        # bucket is empty now
+        self.assertFalse(TokenBucketThrottle().allow_request(request, None))
+
+    def test_requests_are_limited_per_token(self, timer_mock):
+        self._get(timer_mock, 100)
+        self._get(timer_mock, 100)
+        user2 = get_user_model().objects.create_user(
+            'test2', 'test2@test.test', 'test2'
+        )
+        self.client.credentials(
+            HTTP_AUTHORIZATION='Token {}'.format(
+                Token.objects.get_or_create(user=user2)[0].key
+            )
+        )
+        # upload of the other user is not found
+        self.assertEqual(self._get(timer_mock, 100).status_code, 404)
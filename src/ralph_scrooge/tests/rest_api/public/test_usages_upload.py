@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import datetime
+import json
+
+import mock
+from django.contrib.auth import get_user_model
+from django.core.urlresolvers import reverse
+from rest_framework.test import APIClient
+
+from ralph_scrooge.models import (
+    DailyUsage,
+    ServiceUsageTypes,
+    UsagesUpload,
+    UsagesUploadStatus,
+)
+from ralph_scrooge.rest_api.public.v0_9.usages_upload import (
+    ProcessUsagesUploadJob,
+)
+from ralph_scrooge.tests import ScroogeTestCase
+from ralph_scrooge.tests.utils.factory import (
+    PricingObjectFactory,
+    PricingServiceFactory,
+    UsageTypeFactory,
+)
+
+
+@mock.patch.object(ProcessUsagesUploadJob, 'run_on_worker')
+class TestUsagesUpload(ScroogeTestCase):
+    def setUp(self):
+        self.date = datetime.date(2016, 9, 8)
+        self.pricing_service = PricingServiceFactory()
+        self.pricing_object = PricingObjectFactory()
+        self.usage_type = UsageTypeFactory()
+        ServiceUsageTypes.objects.create(
+            usage_type=self.usage_type,
+            pricing_service=self.pricing_service,
+            start=datetime.date(2016, 9, 1),
+            end=datetime.date.max,
+        )
+        self.user = get_user_model().objects.create_user(
+            'test', 'test@test.test', 'test'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _create_upload(self):
+        resp = self.client.post(
+            reverse('create_usages_upload'),
+            json.dumps({
+                'pricing_service': self.pricing_service.name,
+                'date': self.date.strftime('%Y-%m-%d'),
+            }),
+            content_type='application/json',
+        )
+        self.assertEqual(resp.status_code, 201)
+        return json.loads(resp.content)['id']
+
+    def _add_chunk(self, upload_id, content, content_type):
+        return self.client.post(
+            reverse('add_usages_upload_chunk', args=(upload_id,)),
+            content,
+            content_type=content_type,
+        )
+
+    def _add_chunks(self, upload_id, symbol):
+        se = self.pricing_object.service_environment
+        rows = (
+            {
+                'pricing_object': self.pricing_object.name,
+                'symbol': symbol,
+                'value': 10,
+            },
+            {
+                'service': se.service.name,
+                'environment': se.environment.name,
+                'symbol': symbol,
+                'value': 20,
+            },
+        )
+        resp = self._add_chunk(
+            upload_id,
+            '\n'.join(json.dumps(row) for row in rows),
+            'application/x-ndjson',
+        )
+        self.assertEqual(resp.status_code, 201)
+        resp = self._add_chunk(
+            upload_id,
+            'service_id,environment,symbol,value,remarks\n'
+            '{},{},{},30,\n'.format(
+                se.service.id, se.environment.name, symbol
+            ),
+            'text/csv',
+        )
+        self.assertEqual(resp.status_code, 201)
+
+    def _commit(self, upload_id, run_on_worker_mock):
+        resp = self.client.post(
+            reverse('commit_usages_upload', args=(upload_id,))
+        )
+        self.assertEqual(resp.status_code, 202)
+        run_on_worker_mock.assert_called_once_with(upload_id=upload_id)
+        # executed on worker
+        list(ProcessUsagesUploadJob.run(upload_id))
+        resp = self.client.get(reverse('get_usages_upload', args=(upload_id,)))
+        return json.loads(resp.content)
+
+    def test_upload(self, run_on_worker_mock):
+        upload_id = self._create_upload()
+        self._add_chunks(upload_id, self.usage_type.symbol)
+        result = self._commit(upload_id, run_on_worker_mock)
+        self.assertEqual(result['status'], 'done')
+        self.assertEqual(result['chunks'], 0)
+        self.assertEqual(
+            sorted(DailyUsage.objects.filter(
+                date=self.date, type=self.usage_type
+            ).values_list('value', flat=True)),
+            [10, 20, 30],
+        )
+
+    def test_upload_with_invalid_rows(self, run_on_worker_mock):
+        upload_id = self._create_upload()
+        self._add_chunks(upload_id, 'fake_symbol')
+        result = self._commit(upload_id, run_on_worker_mock)
+        self.assertEqual(result['status'], 'failed')
+        self.assertEqual(
+            [(e['chunk'], e['row']) for e in result['errors']],
+            [(1, 1), (1, 2), (2, 1)],
+        )
+        self.assertIn(
+            'does not exist', result['errors'][0]['errors']['usages'][0][
+                'symbol'
+            ][0]
+        )
+        self.assertFalse(DailyUsage.objects.exists())
+        # chunks of failed upload are not needed anymore
+        self.assertFalse(
+            UsagesUpload.objects.get(id=upload_id).chunks.exists()
+        )
+
+    @mock.patch(
+        'ralph_scrooge.rest_api.public.v0_9.usages_upload.'
+        'save_usages_by_usage_type'
+    )
+    def test_upload_with_error(self, save_usages_mock, run_on_worker_mock):
+        save_usages_mock.side_effect = ValueError('Nieprawidłowa wartość')
+        upload_id = self._create_upload()
+        self._add_chunks(upload_id, self.usage_type.symbol)
+        with self.assertRaises(ValueError):
+            list(ProcessUsagesUploadJob.run(upload_id))
+        resp = self.client.get(reverse('get_usages_upload', args=(upload_id,)))
+        result = json.loads(resp.content)
+        self.assertEqual(result['status'], 'failed')
+        self.assertEqual(result['errors'], [
+            {'non_field_errors': ['Nieprawidłowa wartość']},
+        ])
+
+    def test_add_invalid_chunk(self, run_on_worker_mock):
+        upload_id = self._create_upload()
+        resp = self._add_chunk(upload_id, '{"a": 1}\n[1]', 'application/json')
+        self.assertEqual(resp.status_code, 400)
+        self.assertIn('Line 2', json.loads(resp.content)['error'])
+
+    def test_add_chunk_to_committed_upload(self, run_on_worker_mock):
+        upload_id = self._create_upload()
+        self._add_chunks(upload_id, self.usage_type.symbol)
+        UsagesUpload.objects.filter(id=upload_id).update(
+            status=UsagesUploadStatus.queued.id
+        )
+        resp = self._add_chunk(upload_id, '{"a": 1}', 'application/json')
+        self.assertEqual(resp.status_code, 400)
+
+    def test_upload_of_other_user_is_not_accessible(self, run_on_worker_mock):
+        upload_id = self._create_upload()
+        self.client.force_authenticate(get_user_model().objects.create_user(
+            'test2', 'test2@test.test', 'test2'
+        ))
+        resp = self.client.get(reverse('get_usages_upload', args=(upload_id,)))
+        self.assertEqual(resp.status_code, 404)
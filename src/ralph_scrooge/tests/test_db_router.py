@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import mock
+from django.core.cache import cache
+from django.db import connections
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase
+
+from ralph_scrooge.db_router import (
+    finish_request,
+    ReplicaRouter,
+    use_replica,
+)
+from ralph_scrooge.middleware import ReadFromReplica
+from ralph_scrooge.models import DailyCost
+
+
+@mock.patch(
+    'ralph_scrooge.db_router.get_replica_alias', return_value='replica'
+)
+class TestReplicaRouter(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.router = ReplicaRouter()
+        self.middleware = ReadFromReplica()
+        self.factory = RequestFactory()
+        self.user = mock.Mock(pk=1)
+        self.user.is_authenticated.return_value = True
+
+    def tearDown(self):
+        finish_request()
+
+    def _start_request(self, method, path):
+        request = getattr(self.factory, method)(path)
+        request.user = self.user
+        self.middleware.process_request(request)
+        return request
+
+    def test_reads_from_replica_in_use_replica_block(self, get_alias_mock):
+        self.assertIsNone(self.router.db_for_read(DailyCost))
+        with use_replica():
+            self.assertEqual(self.router.db_for_read(DailyCost), 'replica')
+            self.assertEqual(self.router.db_for_write(DailyCost), 'default')
+        self.assertIsNone(self.router.db_for_read(DailyCost))
+
+    def test_reads_from_default_without_replica(self, get_alias_mock):
+        get_alias_mock.return_value = None
+        with use_replica():
+            self.assertIsNone(self.router.db_for_read(DailyCost))
+
+    def test_reads_from_default_in_transaction(self, get_alias_mock):
+        with use_replica(), mock.patch.object(
+            connections['default'], 'in_atomic_block', True
+        ):
+            self.assertIsNone(self.router.db_for_read(DailyCost))
+
+    def test_read_only_api_request_reads_from_replica(self, get_alias_mock):
+        self._start_request('get', '/scrooge/api/v0.10/usage-types/')
+        self.assertEqual(self.router.db_for_read(DailyCost), 'replica')
+        finish_request()
+        self.assertIsNone(self.router.db_for_read(DailyCost))
+        self._start_request('get', '/scrooge/rest/submenu/')
+        self.assertIsNone(self.router.db_for_read(DailyCost))
+
+    def test_user_is_pinned_to_default_after_change(self, get_alias_mock):
+        request = self._start_request(
+            'post', '/scrooge/api/v0.10/pricing-service-usages/'
+        )
+        self.assertIsNone(self.router.db_for_read(DailyCost))
+        self.middleware.process_response(request, HttpResponse(status=201))
+        finish_request()
+        self._start_request('get', '/scrooge/api/v0.10/usage-types/')
+        self.assertIsNone(self.router.db_for_read(DailyCost))
+        # other users are still reading from replica
+        self.user = mock.Mock(pk=2)
+        self.user.is_authenticated.return_value = True
+        self._start_request('get', '/scrooge/api/v0.10/usage-types/')
+        self.assertEqual(self.router.db_for_read(DailyCost), 'replica')
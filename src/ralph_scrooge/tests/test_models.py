@@ -8,6 +8,8 @@ from __future__ import unicode_literals
 import datetime
 from decimal import Decimal as D
 
+import mock
+
 
 from ralph_scrooge import models
 from ralph_scrooge.tests import ScroogeTestCase
@@ -335,3 +337,142 @@ class TestModelRepr(ScroogeTestCase):
             support_cost.start,
             support_cost.end,
         ))
+
+
+class TestPricingObjectServiceChange(ScroogeTestCase):
+    def setUp(self):
+        self.se1, self.se2 = ServiceEnvironmentFactory.create_batch(2)
+        self.pricing_object = PricingObjectFactory()
+        self.day1 = datetime.date(2013, 10, 10)
+        self.day2 = datetime.date(2013, 10, 11)
+        self.day3 = datetime.date(2013, 10, 12)
+
+    def _create_daily_pricing_object(self, date, service_environment):
+        return DailyPricingObjectFactory(
+            pricing_object=self.pricing_object,
+            service_environment=service_environment,
+            date=date,
+        )
+
+    def _get_changes(self):
+        return list(models.PricingObjectServiceChange.objects.order_by(
+            'date'
+        ).values_list(
+            'date',
+            'service_environment_before',
+            'service_environment_after',
+        ))
+
+    def test_change_logged_on_save(self):
+        self._create_daily_pricing_object(self.day1, self.se1)
+        self._create_daily_pricing_object(self.day2, self.se2)
+        self.assertEqual(self._get_changes(), [
+            (self.day2, self.se1.id, self.se2.id),
+        ])
+
+    def test_change_logged_on_save_of_previous_day(self):
+        self._create_daily_pricing_object(self.day2, self.se2)
+        self._create_daily_pricing_object(self.day1, self.se1)
+        self.assertEqual(self._get_changes(), [
+            (self.day2, self.se1.id, self.se2.id),
+        ])
+
+    def test_change_removed_when_service_environment_restored(self):
+        self._create_daily_pricing_object(self.day1, self.se1)
+        dpo = self._create_daily_pricing_object(self.day2, self.se2)
+        self._create_daily_pricing_object(self.day3, self.se1)
+        self.assertEqual(len(self._get_changes()), 2)
+        dpo = models.DailyPricingObject.objects.get(pk=dpo.pk)
+        dpo.service_environment = self.se1
+        dpo.save()
+        self.assertEqual(self._get_changes(), [])
+
+    def test_changes_removed_when_daily_pricing_object_deleted(self):
+        self._create_daily_pricing_object(self.day1, self.se1)
+        dpo = self._create_daily_pricing_object(self.day2, self.se2)
+        self._create_daily_pricing_object(self.day3, self.se1)
+        self.assertEqual(len(self._get_changes()), 2)
+        dpo.delete()
+        self.assertEqual(self._get_changes(), [])
+
+    def test_changes_removed_when_daily_pricing_objects_deleted_in_bulk(self):
+        self._create_daily_pricing_object(self.day1, self.se1)
+        self._create_daily_pricing_object(self.day2, self.se2)
+        self._create_daily_pricing_object(self.day3, self.se1)
+        models.DailyPricingObject.objects.filter(date=self.day3).delete()
+        self.assertEqual(self._get_changes(), [
+            (self.day2, self.se1.id, self.se2.id),
+        ])
+
+    def _test_backfill(self):
+        for day, se in zip(
+            (self.day1, self.day2, self.day3), (self.se1, self.se2, self.se2)
+        ):
+            self._create_daily_pricing_object(day, se)
+        # daily pricing object without previous day
+        self._create_daily_pricing_object(
+            datetime.date(2013, 10, 20), self.se1
+        )
+        models.PricingObjectServiceChange.objects.all().delete()
+        result = models.PricingObjectServiceChange.backfill(
+            self.day1, datetime.date(2013, 10, 31)
+        )
+        self.assertEqual(result, 1)
+        self.assertEqual(self._get_changes(), [
+            (self.day2, self.se1.id, self.se2.id),
+        ])
+
+    def _test_backfill_pricing_objects(self):
+        other_pricing_object = PricingObjectFactory()
+        for pricing_object in (self.pricing_object, other_pricing_object):
+            for day, se in zip((self.day1, self.day2), (self.se1, self.se2)):
+                DailyPricingObjectFactory(
+                    pricing_object=pricing_object,
+                    service_environment=se,
+                    date=day,
+                )
+        models.PricingObjectServiceChange.objects.filter(
+            pricing_object=self.pricing_object
+        ).delete()
+        with mock.patch.object(
+            models.PricingObjectServiceChange, 'backfill_ids_batch_size', 1
+        ):
+            result = models.PricingObjectServiceChange.backfill(
+                self.day1, self.day3, pricing_object_ids=[
+                    self.pricing_object.id, PricingObjectFactory().id,
+                ]
+            )
+        self.assertEqual(result, 1)
+        self.assertEqual(
+            models.PricingObjectServiceChange.objects.filter(
+                date=self.day2
+            ).count(),
+            2,
+        )
+
+    def test_backfill_window_function(self):
+        # window functions are used only if database supports them
+        if not models.PricingObjectServiceChange._supports_window_functions():
+            self.skipTest('Database does not support window functions')
+        self._test_backfill()
+
+    def test_backfill_pricing_objects_window_function(self):
+        if not models.PricingObjectServiceChange._supports_window_functions():
+            self.skipTest('Database does not support window functions')
+        self._test_backfill_pricing_objects()
+
+    def test_backfill_pricing_objects_self_join(self):
+        with mock.patch.object(
+            models.PricingObjectServiceChange,
+            '_supports_window_functions',
+            return_value=False,
+        ):
+            self._test_backfill_pricing_objects()
+
+    def test_backfill_self_join(self):
+        with mock.patch.object(
+            models.PricingObjectServiceChange,
+            '_supports_window_functions',
+            return_value=False,
+        ):
+            self._test_backfill()
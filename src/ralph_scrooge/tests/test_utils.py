@@ -5,17 +5,37 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
-from datetime import date
+from datetime import date, datetime
 
-from ralph_scrooge.models import ServiceUsageTypes
+import mock
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+
+from ralph_scrooge.models import ServiceUsageTypes, UsageType
 from ralph_scrooge.tests import ScroogeTestCase
 from ralph_scrooge.tests.utils.factory import (
     DailyUsageFactory,
+    DynamicExtraCostTypeFactory,
+    ExtraCostTypeFactory,
+    PricingObjectFactory,
     PricingServiceFactory,
     ServiceEnvironmentFactory,
     UsageTypeFactory
 )
 from ralph_scrooge.utils import common, cycle_detector
+from ralph_scrooge.utils.dimensions import (
+    _memoize_by_dimensions_version,
+    daily_pricing_objects_changes_batch,
+    DailyPricingObjectsCache,
+    DimensionsCache,
+    get_daily_pricing_objects_versions,
+    get_dimensions_version,
+)
+from ralph_scrooge.utils.worker_job import (
+    _get_cache_key,
+    TooManyJobsError,
+    WorkerJob,
+)
 
 
 class TestRangesOverlap(ScroogeTestCase):
@@ -148,3 +168,270 @@ class TestCyclesDetector(ScroogeTestCase):
         graph = cycle_detector._get_pricing_services_graph(self.today)
         cycles = cycle_detector._detect_cycles(self.ps1, graph, set(), [])
         self.assertEqual(cycles, [[self.ps1, self.ps2, self.ps3, self.ps1]])
+
+
+class TestGetCacheKey(ScroogeTestCase):
+    def test_get_cache_key_for_datetime_and_date(self):
+        self.assertEqual(
+            _get_cache_key('test', start=datetime(2017, 3, 1), forecast=True),
+            _get_cache_key('test', forecast=True, start=date(2017, 3, 1)),
+        )
+
+    def test_get_cache_key_for_models(self):
+        usage_types = UsageTypeFactory.create_batch(2)
+        self.assertEqual(
+            _get_cache_key('test', usage_types=usage_types),
+            _get_cache_key(
+                'test', usage_types=[usage_types[1].id, usage_types[0].id]
+            ),
+        )
+
+    def test_get_cache_key_for_different_params(self):
+        self.assertNotEqual(
+            _get_cache_key('test', start=datetime(2017, 3, 1, 10)),
+            _get_cache_key('test', start=date(2017, 3, 1)),
+        )
+
+
+class SampleWorkerJob(WorkerJob):
+    cache_section = 'test_worker_job'
+    max_jobs_per_user = 1
+
+    @classmethod
+    def run(cls, **kwargs):
+        yield 100, kwargs
+
+
+@mock.patch('ralph_scrooge.utils.worker_job.django_rq.get_queue')
+class TestWorkerJob(ScroogeTestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user('test')
+        self.job = mock.Mock(
+            id='job-1', is_finished=False, is_failed=False, meta={}
+        )
+        self.worker_job = SampleWorkerJob()
+        self.worker_job.get_rq_job = mock.Mock(return_value=self.job)
+
+    def test_run_on_worker_user_jobs_limit(self, get_queue_mock):
+        get_queue_mock.return_value.enqueue_call.return_value = self.job
+        self.worker_job.run_on_worker(user=self.user, a=1)
+        with self.assertRaises(TooManyJobsError):
+            self.worker_job.run_on_worker(user=self.user, a=2)
+        # the same job could be still checked by user
+        self.assertEqual(
+            self.worker_job.run_on_worker(user=self.user, a=1), (0, None)
+        )
+
+    def test_run_on_worker_user_jobs_limit_finished_job(self, get_queue_mock):
+        get_queue_mock.return_value.enqueue_call.return_value = self.job
+        self.worker_job.run_on_worker(user=self.user, a=1)
+        self.job.is_finished = True
+        self.worker_job.run_on_worker(user=self.user, a=2)
+        self.assertEqual(
+            get_queue_mock.return_value.enqueue_call.call_count, 2
+        )
+
+
+class CoalescingWorkerJob(SampleWorkerJob):
+    coalesce_pending = True
+
+
+@mock.patch('ralph_scrooge.utils.worker_job.django_rq.get_queue')
+class TestWorkerJobCoalescing(ScroogeTestCase):
+    def setUp(self):
+        cache.clear()
+        self.job = mock.Mock(
+            id='job-1', is_finished=False, is_failed=False, meta={}
+        )
+        self.job.get_status.return_value = 'queued'
+        self.worker_job = CoalescingWorkerJob()
+        self.worker_job.get_rq_job = mock.Mock(return_value=self.job)
+
+    def test_run_on_worker_when_job_is_pending(self, get_queue_mock):
+        get_queue_mock.return_value.enqueue_call.return_value = self.job
+        self.worker_job.run_on_worker(a=date(2017, 3, 1))
+        self.worker_job.run_on_worker(a=datetime(2017, 3, 1))
+        self.assertEqual(
+            get_queue_mock.return_value.enqueue_call.call_count, 1
+        )
+
+    def test_run_on_worker_when_job_is_started(self, get_queue_mock):
+        get_queue_mock.return_value.enqueue_call.return_value = self.job
+        self.worker_job.run_on_worker(a=1)
+        self.job.get_status.return_value = 'started'
+        self.worker_job.run_on_worker(a=1)
+        self.assertEqual(
+            get_queue_mock.return_value.enqueue_call.call_count, 2
+        )
+
+
+class TestDimensionsCache(ScroogeTestCase):
+    def setUp(self):
+        cache.clear()
+        self.usage_type = UsageTypeFactory()
+        self.dimensions = DimensionsCache()
+
+    @mock.patch(
+        'ralph_scrooge.utils.dimensions.transaction.on_commit',
+        lambda func: func()
+    )
+    def test_dimensions_version_bumped_on_save(self):
+        version = get_dimensions_version()
+        self.usage_type.save()
+        self.assertEqual(get_dimensions_version(), version + 1)
+
+    def test_dimensions_version_not_bumped_before_commit(self):
+        version = get_dimensions_version()
+        # test is run inside transaction, which is never committed
+        self.usage_type.save()
+        self.assertEqual(get_dimensions_version(), version)
+
+    @mock.patch(
+        'ralph_scrooge.utils.dimensions.transaction.on_commit',
+        lambda func: func()
+    )
+    def test_dimensions_version_bumped_on_delete(self):
+        version = get_dimensions_version()
+        self.usage_type.delete()
+        self.assertEqual(get_dimensions_version(), version + 1)
+
+    def test_load(self):
+        self.assertFalse(self.dimensions.is_loaded)
+        self.dimensions.load()
+        self.assertTrue(self.dimensions.is_loaded)
+        self.assertEqual(
+            self.dimensions.get(UsageType, self.usage_type.id).name,
+            self.usage_type.name,
+        )
+
+    @mock.patch(
+        'ralph_scrooge.utils.dimensions.transaction.on_commit',
+        lambda func: func()
+    )
+    def test_refresh_if_stale(self):
+        self.dimensions.load()
+        self.assertFalse(self.dimensions.refresh_if_stale())
+        new_usage_type = UsageTypeFactory()
+        self.assertTrue(self.dimensions.refresh_if_stale())
+        self.assertIn(new_usage_type, self.dimensions.all(UsageType))
+
+
+class TestMemoizeByDimensionsVersion(ScroogeTestCase):
+    def setUp(self):
+        cache.clear()
+        self.calls = []
+
+        def func(x):
+            self.calls.append(x)
+            return x * 2
+        self.memoized = _memoize_by_dimensions_version(func)
+
+    def test_result_cached(self):
+        self.assertEqual(self.memoized(1), 2)
+        self.assertEqual(self.memoized(1), 2)
+        self.assertEqual(self.memoized(2), 4)
+        self.assertEqual(self.calls, [1, 2])
+
+    @mock.patch(
+        'ralph_scrooge.utils.dimensions.transaction.on_commit',
+        lambda func: func()
+    )
+    def test_result_recalculated_after_dimensions_change(self):
+        self.memoized(1)
+        for factory in (
+            UsageTypeFactory,
+            PricingServiceFactory,
+            ExtraCostTypeFactory,
+            DynamicExtraCostTypeFactory,
+        ):
+            factory()
+            self.memoized(1)
+        self.assertEqual(len(self.calls), 5)
+
+
+class TestDailyPricingObjectsCache(ScroogeTestCase):
+    def setUp(self):
+        cache.clear()
+        self.today = date.today()
+        self.pricing_object = PricingObjectFactory()
+        self.daily_pricing_object = (
+            self.pricing_object.get_daily_pricing_object(self.today)
+        )
+        self.daily_pricing_objects = DailyPricingObjectsCache()
+
+    @mock.patch(
+        'ralph_scrooge.utils.dimensions.transaction.on_commit',
+        lambda func: func()
+    )
+    def test_version_bumped_on_save(self):
+        versions = get_daily_pricing_objects_versions([self.today])
+        self.daily_pricing_object.save()
+        self.assertEqual(
+            get_daily_pricing_objects_versions([self.today]),
+            {self.today: versions[self.today] + 1},
+        )
+
+    def test_version_not_bumped_before_commit(self):
+        versions = get_daily_pricing_objects_versions([self.today])
+        # test is run inside transaction, which is never committed
+        self.daily_pricing_object.save()
+        with daily_pricing_objects_changes_batch():
+            self.daily_pricing_object.save()
+        self.assertEqual(
+            get_daily_pricing_objects_versions([self.today]), versions
+        )
+
+    @mock.patch(
+        'ralph_scrooge.utils.dimensions.transaction.on_commit',
+        lambda func: func()
+    )
+    def test_version_bumped_once_per_batch(self):
+        versions = get_daily_pricing_objects_versions([self.today])
+        with daily_pricing_objects_changes_batch():
+            self.daily_pricing_object.save()
+            self.daily_pricing_object.save()
+            self.assertEqual(
+                get_daily_pricing_objects_versions([self.today]), versions
+            )
+        self.assertEqual(
+            get_daily_pricing_objects_versions([self.today]),
+            {self.today: versions[self.today] + 1},
+        )
+
+    def test_version_not_bumped_on_other_models_save(self):
+        versions = get_daily_pricing_objects_versions([self.today])
+        self.pricing_object.save()
+        self.assertEqual(
+            get_daily_pricing_objects_versions([self.today]), versions
+        )
+
+    def test_load(self):
+        self.assertFalse(self.daily_pricing_objects.is_loaded)
+        self.daily_pricing_objects.load(2)
+        self.assertTrue(self.daily_pricing_objects.is_loaded)
+        self.assertTrue(self.daily_pricing_objects.has_date(self.today))
+        self.assertEqual(
+            self.daily_pricing_objects.get_service_environment_id(
+                self.today, self.pricing_object.id
+            ),
+            self.pricing_object.service_environment_id,
+        )
+
+    @mock.patch(
+        'ralph_scrooge.utils.dimensions.transaction.on_commit',
+        lambda func: func()
+    )
+    def test_refresh_if_stale(self):
+        self.daily_pricing_objects.load(2)
+        self.assertFalse(self.daily_pricing_objects.refresh_if_stale())
+        service_environment = ServiceEnvironmentFactory()
+        self.daily_pricing_object.service_environment = service_environment
+        self.daily_pricing_object.save()
+        self.assertTrue(self.daily_pricing_objects.refresh_if_stale())
+        self.assertEqual(
+            self.daily_pricing_objects.get_service_environment_id(
+                self.today, self.pricing_object.id
+            ),
+            service_environment.id,
+        )
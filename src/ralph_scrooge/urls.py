@@ -21,6 +21,7 @@ from ralph_scrooge.rest_api.public.v0_9.pricing_service_usages import (
 from ralph_scrooge.rest_api.public.swagger import APISchema, BootstrapSwagger
 from ralph_scrooge.rest_api.public.v0_10.service_environment_costs import (
     ServiceEnvironmentCosts,
+    ServiceEnvironmentsCosts,
 )
 from ralph_scrooge.rest_api.public.v0_10.router import (
     urlpatterns as router_v0_10_urlpatterns,
@@ -28,6 +29,12 @@ from ralph_scrooge.rest_api.public.v0_10.router import (
 from ralph_scrooge.rest_api.public.v0_9.team_time_division import (
     TeamTimeDivision,
 )
+from ralph_scrooge.rest_api.public.v0_9.usages_upload import (
+    add_usages_upload_chunk,
+    commit_usages_upload,
+    create_usages_upload,
+    get_usages_upload,
+)
 from ralph_scrooge.views.anomalies_ack import AnomaliesAck
 from ralph_scrooge.views.autocomplete import ScroogeAutocomplete
 from ralph_scrooge.views.bootstrapangular import (
@@ -102,6 +109,11 @@ urlpatterns = [
         ServiceEnvironmentCosts.as_view(),
         name='service_environment_costs',
     ),
+    url(
+        r'^scrooge/api/v0.10/service-environment-costs/batch/$',
+        ServiceEnvironmentsCosts.as_view(),
+        name='service_environments_costs',
+    ),
     url(
         r'^scrooge/api/v0.10/api-token-auth/',
         views.obtain_auth_token,
@@ -121,6 +133,26 @@ urlpatterns = [
         list_pricing_service_usages,
         name='list_pricing_service_usages_v10',
     ),
+    url(
+        r'^scrooge/api/v0.10/pricing-service-usages/uploads/$',
+        create_usages_upload,
+        name='create_usages_upload',
+    ),
+    url(
+        r'^scrooge/api/v0.10/pricing-service-usages/uploads/(?P<upload_id>\d+)/$',  # noqa: E501
+        get_usages_upload,
+        name='get_usages_upload',
+    ),
+    url(
+        r'^scrooge/api/v0.10/pricing-service-usages/uploads/(?P<upload_id>\d+)/chunks/$',  # noqa: E501
+        add_usages_upload_chunk,
+        name='add_usages_upload_chunk',
+    ),
+    url(
+        r'^scrooge/api/v0.10/pricing-service-usages/uploads/(?P<upload_id>\d+)/commit/$',  # noqa: E501
+        commit_usages_upload,
+        name='commit_usages_upload',
+    ),
 
     # v0.9 (endpoints in this hierarchy should be considered as deprecated)
     url(
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import cPickle as pickle
+import uuid
+import zlib
+from itertools import islice
+
+
+def _dumps(value):
+    return zlib.compress(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+
+
+def _loads(value):
+    return pickle.loads(zlib.decompress(value))
+
+
+class ChunkedRows(object):
+    """
+    Rows (list of lists of the same length) stored in cache in chunks of
+    `chunk_size` rows. Every chunk is stored column by column (values of the
+    same column are close to each other, so they are compressed much better)
+    and compressed.
+
+    Instance is small (it keeps only keys prefix and number of chunks), so it
+    could be pickled and stored (ex. as a job result) instead of rows.
+    Rows are fetched from the cache (chunk by chunk) only when iterating over
+    it.
+
+    >>> from django.core.cache import caches
+    >>> cache = caches['default']
+    >>> rows = ChunkedRows.store(cache, 'test', [[1, 'a'], [2, 'b']], 10, 1)
+    >>> len(rows)
+    2
+    >>> list(rows.iterate(cache))
+    [[1, u'a'], [2, u'b']]
+    >>> rows.get_rows(cache, [1])
+    [[2, u'b']]
+    >>> rows.delete(cache)
+    >>> list(rows.iterate(cache))  # doctest: +ELLIPSIS
+    Traceback (most recent call last):
+    ...
+    KeyError: u'test:rows:...:0'
+    """
+    def __init__(self, prefix, chunks, rows, chunk_size):
+        self.prefix = prefix
+        self.chunks = chunks
+        self.rows = rows
+        self.chunk_size = chunk_size
+
+    def __len__(self):
+        return self.rows
+
+    def _get_chunk_key(self, chunk):
+        return '{}:{}'.format(self.prefix, chunk)
+
+    @classmethod
+    def store(cls, cache, key, rows, timeout, chunk_size=1000):
+        """
+        Store rows in cache (under keys prefixed by `key`) and return
+        ChunkedRows pointing to them.
+        """
+        # every store has unique prefix, so result stored by another job with
+        # the same key will not be mixed with this one
+        result = cls(
+            '{}:rows:{}'.format(key, uuid.uuid4().hex), 0, 0, chunk_size
+        )
+        rows = iter(rows)
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+            cache.set(
+                result._get_chunk_key(result.chunks),
+                _dumps(zip(*chunk)),
+                timeout=timeout,
+            )
+            result.chunks += 1
+            result.rows += len(chunk)
+        return result
+
+    def delete(self, cache):
+        """
+        Delete all chunks of rows from the cache.
+        """
+        cache.delete_many(
+            [self._get_chunk_key(chunk) for chunk in range(self.chunks)]
+        )
+
+    def iterate(self, cache):
+        """
+        Generate rows, fetching chunks from the cache one by one. Raises
+        KeyError if any chunk has already expired.
+        """
+        for chunk in range(self.chunks):
+            key = self._get_chunk_key(chunk)
+            value = cache.get(key)
+            if value is None:
+                raise KeyError(key)
+            for row in zip(*_loads(value)):
+                yield list(row)
+
+    def get_rows(self, cache, positions):
+        """
+        Return rows at positions (indexes), fetching only chunks containing
+        them. Raises KeyError if any of these chunks has already expired.
+        """
+        keys = {
+            self._get_chunk_key(position // self.chunk_size)
+            for position in positions
+        }
+        chunks = cache.get_many(keys)
+        missing = keys - set(chunks)
+        if missing:
+            raise KeyError(missing.pop())
+        chunks = {key: _loads(value) for key, value in chunks.items()}
+        result = []
+        for position in positions:
+            columns = chunks[
+                self._get_chunk_key(position // self.chunk_size)
+            ]
+            offset = position % self.chunk_size
+            result.append([column[offset] for column in columns])
+        return result
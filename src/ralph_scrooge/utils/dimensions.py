@@ -0,0 +1,354 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import cPickle as pickle
+import datetime
+import logging
+import threading
+from collections import OrderedDict, defaultdict
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches as dj_caches
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+from ralph_scrooge.models import (
+    DailyPricingObject,
+    DynamicExtraCostType,
+    Environment,
+    ExtraCostType,
+    PricingService,
+    Service,
+    ServiceEnvironment,
+    Team,
+    UsageType,
+    Warehouse,
+)
+from ralph_scrooge.utils.cache import memoize_proxy
+from ralph_scrooge.utils.common import get_cache_name
+
+logger = logging.getLogger(__name__)
+
+DIMENSIONS_VERSION_KEY = 'scrooge_dimensions_version'
+DAILY_PRICING_OBJECTS_VERSION_KEY = 'scrooge_daily_pricing_objects_version_{}'
+COSTS_VERSION_KEY = 'scrooge_costs_version_{}'
+# models which changes bumps dimensions version
+DIMENSIONS_MODELS = (
+    DynamicExtraCostType,
+    Environment,
+    ExtraCostType,
+    PricingService,
+    Service,
+    ServiceEnvironment,
+    Team,
+    UsageType,
+    Warehouse,
+)
+
+
+def _get_cache():
+    return dj_caches[get_cache_name('scrooge_dimensions')]
+
+
+def get_dimensions_version():
+    """
+    Return current version of dimensions (changed every time when any of
+    DIMENSIONS_MODELS is saved or deleted).
+    """
+    return _get_cache().get(DIMENSIONS_VERSION_KEY) or 0
+
+
+def _bump_version(key):
+    cache = _get_cache()
+    try:
+        cache.incr(key)
+    except ValueError:
+        # key does not exist yet
+        cache.set(key, 1, timeout=None)
+
+
+def bump_dimensions_version():
+    _bump_version(DIMENSIONS_VERSION_KEY)
+
+
+def _memoize_by_dimensions_version(func):
+    """
+    Memoization decorator, which keeps result of function (per arguments)
+    until dimensions version is changed (see `get_dimensions_version`).
+    Should be used for functions which result depends only on dimensions
+    (ex. reports headers).
+    """
+    cached_values = {}
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        key = pickle.dumps((args, kwargs))
+        version = get_dimensions_version()
+        if key in cached_values and cached_values[key][0] == version:
+            return cached_values[key][1]
+        result = func(*args, **kwargs)
+        cached_values[key] = (version, result)
+        return result
+
+    return wrapper
+
+
+# if in testing environment (ex unit tests), set decorator to memoize proxy
+# (not-caching) - see `ralph_scrooge.utils.cache.memoize`
+memoize_by_dimensions_version = (
+    memoize_proxy if getattr(settings, 'TESTING', None)
+    else _memoize_by_dimensions_version
+)
+
+
+def _get_dates_versions(key_template, dates):
+    keys = {key_template.format(date.isoformat()): date for date in dates}
+    versions = _get_cache().get_many(keys.keys())
+    return {date: versions.get(key) or 0 for key, date in keys.items()}
+
+
+def get_daily_pricing_objects_versions(dates):
+    """
+    Return dict with current version of daily pricing objects for every date.
+    """
+    return _get_dates_versions(DAILY_PRICING_OBJECTS_VERSION_KEY, dates)
+
+
+def bump_daily_pricing_objects_version(date):
+    _bump_version(DAILY_PRICING_OBJECTS_VERSION_KEY.format(date.isoformat()))
+
+
+def bump_daily_pricing_objects_version_on_commit(date):
+    """
+    Bump version of daily pricing objects when current transaction is
+    committed (immediately, if there is no transaction), so nobody could
+    cache old daily pricing objects under the new version.
+    """
+    transaction.on_commit(lambda: bump_daily_pricing_objects_version(date))
+
+
+def get_costs_versions(dates):
+    """
+    Return dict with current version of (daily) costs for every date.
+    """
+    return _get_dates_versions(COSTS_VERSION_KEY, dates)
+
+
+def bump_costs_version(date):
+    _bump_version(COSTS_VERSION_KEY.format(date.isoformat()))
+
+
+def _dimension_changed(sender, **kwargs):
+    # bumped when change is committed, so nobody could cache old dimensions
+    # under the new version
+    transaction.on_commit(bump_dimensions_version)
+
+
+_batch = threading.local()
+
+
+@contextmanager
+def daily_pricing_objects_changes_batch():
+    """
+    Bump version of daily pricing objects once per changed date at the end of
+    the block, instead of on every save or delete of daily pricing object -
+    use it when many daily pricing objects are changed at once (ex. by
+    collect plugins).
+    """
+    if getattr(_batch, 'dates', None) is not None:
+        # already inside a batch
+        yield
+        return
+    _batch.dates = set()
+    try:
+        yield
+    finally:
+        dates, _batch.dates = _batch.dates, None
+        for date in dates:
+            bump_daily_pricing_objects_version_on_commit(date)
+
+
+def _pricing_object_changed(sender, instance, **kwargs):
+    date = instance.date
+    if isinstance(date, datetime.datetime):
+        date = date.date()
+    if getattr(_batch, 'dates', None) is not None:
+        _batch.dates.add(date)
+    else:
+        bump_daily_pricing_objects_version_on_commit(date)
+
+
+def _get_models_with_subclasses(model):
+    models = [model]
+    for subclass in model.__subclasses__():
+        models.extend(_get_models_with_subclasses(subclass))
+    return models
+
+
+for model in DIMENSIONS_MODELS:
+    post_save.connect(_dimension_changed, sender=model)
+    post_delete.connect(_dimension_changed, sender=model)
+# signals are sent with concrete class as a sender, so every subclass of
+# DailyPricingObject (DailyAssetInfo, DailyTenantInfo etc.) has to be
+# connected too
+for model in _get_models_with_subclasses(DailyPricingObject):
+    post_save.connect(_pricing_object_changed, sender=model)
+    post_delete.connect(_pricing_object_changed, sender=model)
+
+
+class DimensionsCache(object):
+    """
+    In-process cache of (rarely changing) dimensions tables. Every model is
+    stored as ordered dict of instances (keyed by pk).
+
+    Cache is versioned by dimensions version (see `get_dimensions_version`),
+    so it could be cheaply checked if it's still fresh.
+    """
+    def __init__(self):
+        self.version = None
+        self._data = {}
+
+    def _get_querysets(self):
+        return {
+            PricingService: PricingService.objects_admin.order_by('name'),
+            ServiceEnvironment: ServiceEnvironment.objects.select_related(
+                'service',
+                'environment',
+            ).order_by(
+                'service__name',
+                'environment__name',
+            ),
+            Team: Team.objects_admin.order_by('name'),
+            UsageType: UsageType.objects_admin.order_by('-order', 'name'),
+            Warehouse: Warehouse.objects.order_by('name'),
+        }
+
+    @property
+    def is_loaded(self):
+        return self.version is not None
+
+    def load(self):
+        # version is fetched before querying models to not miss any change
+        # made in the meantime
+        version = get_dimensions_version()
+        self._data = {
+            model: OrderedDict((obj.pk, obj) for obj in queryset)
+            for model, queryset in self._get_querysets().items()
+        }
+        self.version = version
+        logger.info('Dimensions (version {}) loaded'.format(version))
+
+    def refresh_if_stale(self):
+        """
+        Reload dimensions if they were changed since last load. Return True
+        if dimensions were reloaded.
+        """
+        if self.version != get_dimensions_version():
+            self.load()
+            return True
+        return False
+
+    def clear(self):
+        self.version = None
+        self._data = {}
+
+    def get(self, model, pk):
+        return self._data[model][pk]
+
+    def all(self, model):
+        return self._data[model].values()
+
+
+class DailyPricingObjectsCache(object):
+    """
+    In-process cache of service environment of every pricing object for the
+    last `days` days (counting from today).
+
+    Mapping is stored as plain dict of ints per date, which is much smaller
+    than model instances and (when loaded before forking work horse) stays
+    shared between parent process and its children (see `ScroogeWorker`).
+
+    Every date is versioned separately (see
+    `get_daily_pricing_objects_versions`), so collecting pricing objects for
+    today invalidates only today's mapping.
+    """
+    def __init__(self):
+        self.days = None
+        self.versions = {}
+        self._data = {}
+
+    @property
+    def is_loaded(self):
+        return self.days is not None
+
+    def _get_dates(self):
+        today = datetime.date.today()
+        return [
+            today - datetime.timedelta(days=i) for i in range(self.days)
+        ]
+
+    def _load_dates(self, dates, versions):
+        data = defaultdict(dict)
+        for date, pricing_object_id, service_environment_id in (
+            DailyPricingObject.objects.filter(date__in=dates).values_list(
+                'date', 'pricing_object_id', 'service_environment_id',
+            ).iterator()
+        ):
+            data[date][pricing_object_id] = service_environment_id
+        for date in dates:
+            self._data[date] = data.get(date, {})
+            self.versions[date] = versions[date]
+
+    def load(self, days):
+        self.days = days
+        self.versions = {}
+        self._data = {}
+        self.refresh_if_stale()
+
+    def refresh_if_stale(self):
+        """
+        Reload mapping for dates which were changed since last load (or for
+        which it was never loaded, ex. when day has changed). Return True if
+        any date was reloaded.
+        """
+        dates = self._get_dates()
+        # versions are fetched before querying models to not miss any change
+        # made in the meantime
+        versions = get_daily_pricing_objects_versions(dates)
+        stale_dates = [
+            date for date in dates if self.versions.get(date) != versions[date]
+        ]
+        for date in set(self._data) - set(dates):
+            del self._data[date]
+            del self.versions[date]
+        if stale_dates:
+            self._load_dates(stale_dates, versions)
+            logger.info('Daily pricing objects loaded for {}'.format(
+                ', '.join(date.isoformat() for date in sorted(stale_dates))
+            ))
+        return bool(stale_dates)
+
+    def clear(self):
+        self.days = None
+        self.versions = {}
+        self._data = {}
+
+    def has_date(self, date):
+        return date in self._data
+
+    def get_service_environment_id(self, date, pricing_object_id):
+        """
+        Return id of service environment of pricing object at date (or None
+        if there is no daily pricing object for it at this date).
+        """
+        return self._data[date].get(pricing_object_id)
+
+
+dimensions = DimensionsCache()
+daily_pricing_objects = DailyPricingObjectsCache()
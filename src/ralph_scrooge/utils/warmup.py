@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import logging
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from ralph_scrooge.plugins import cost, report  # noqa
+from ralph_scrooge.plugins.cost.collector import Collector
+from ralph_scrooge.report.report_services_costs import ServicesCostsReport
+from ralph_scrooge.utils.dimensions import daily_pricing_objects, dimensions
+
+logger = logging.getLogger(__name__)
+
+
+def load_plugins():
+    """
+    Register all costs and reports plugins (by importing them above) and fill
+    caches of plugins lists.
+    """
+    Collector.get_plugins()
+    ServicesCostsReport.get_plugins()
+
+
+def load_dimensions():
+    dimensions.load()
+
+
+def load_daily_pricing_objects():
+    """
+    Load service environments of pricing objects for the last
+    `SCROOGE_WORKER_PRELOAD_DAYS` days.
+    """
+    daily_pricing_objects.load(settings.SCROOGE_WORKER_PRELOAD_DAYS)
+
+
+def run_preload_hooks():
+    """
+    Run all hooks from SCROOGE_WORKER_PRELOAD setting.
+    """
+    for hook_path in settings.SCROOGE_WORKER_PRELOAD:
+        logger.info('Running worker preload hook {}'.format(hook_path))
+        import_string(hook_path)()
@@ -5,20 +5,109 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import datetime
 import logging
 import urllib
 
 import django_rq
+from django.conf import settings
 from django.core.cache import caches as dj_caches
 from django.core.cache.backends.dummy import DummyCache
-from rq.job import Job
+from django.db import models as db
+from django.utils.encoding import force_bytes, force_text
+from rq.job import Job, JobStatus
+from rq.utils import utcnow
+
+from ralph_scrooge.db_router import use_replica
 
 
 logger = logging.getLogger(__name__)
 
 
+class TooManyJobsError(Exception):
+    pass
+
+
+def _canonical_value(value):
+    """
+    Return canonical (text) representation of job param, to make job key
+    independent of the way in which param was passed (ex. datetime at
+    midnight vs date, model instance vs its id, order of elements in list).
+
+    >>> _canonical_value(datetime.datetime(2017, 3, 1))
+    u'2017-03-01'
+    >>> _canonical_value(datetime.datetime(2017, 3, 1, 12, 30))
+    u'2017-03-01T12:30:00'
+    >>> _canonical_value([3, 1, 2])
+    u'1,2,3'
+    """
+    if isinstance(value, datetime.datetime):
+        if value.time() == datetime.time(0) and value.tzinfo is None:
+            value = value.date()
+        return force_text(value.isoformat())
+    if isinstance(value, datetime.date):
+        return force_text(value.isoformat())
+    if isinstance(value, db.Model):
+        return force_text(value.pk)
+    if isinstance(value, db.QuerySet):
+        value = value.values_list('pk', flat=True)
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return ','.join(sorted(_canonical_value(v) for v in value))
+    return force_text(value)
+
+
 def _get_cache_key(cache_section, **kwargs):
-    return b'{}?{}'.format(cache_section, urllib.urlencode(kwargs))
+    """
+    Return cache key of job with passed params. Params are canonicalized, so
+    the same job requested in different ways has the same key.
+    """
+    return b'{}?{}'.format(cache_section, urllib.urlencode(sorted(
+        (force_bytes(k), force_bytes(_canonical_value(v)))
+        for (k, v) in kwargs.items()
+    )))
+
+
+def _get_user_jobs_cache_key(cache_section, user):
+    return b'{}:user_jobs:{}'.format(cache_section, user.pk)
+
+
+def get_queues_stats():
+    """
+    Return depth (number of waiting jobs) and wait time (in seconds) of the
+    oldest waiting job for every configured RQ queue.
+    """
+    result = []
+    now = utcnow()
+    for queue_name in get_queues_by_priority(settings.RQ_QUEUES.keys()):
+        queue = django_rq.get_queue(queue_name)
+        wait_time = 0
+        oldest_job_id = queue.get_job_ids(0, 1)
+        if oldest_job_id:
+            job = queue.fetch_job(oldest_job_id[0])
+            if job and job.enqueued_at:
+                wait_time = (now - job.enqueued_at).total_seconds()
+        result.append({
+            'queue': queue_name,
+            'depth': queue.count,
+            'wait_time': wait_time,
+        })
+    return result
+
+
+def get_queues_by_priority(queues_names):
+    """
+    Sort queues names according to RQ_QUEUES_PRIORITY setting (queues
+    mentioned earlier in this setting have higher priority). Queues not
+    mentioned in the setting are placed at the end (in original order).
+
+    >>> get_queues_by_priority(['scrooge_costs', 'other', 'scrooge_report'])
+    [u'scrooge_report', u'scrooge_costs', u'other']
+    """
+    priority = list(getattr(settings, 'RQ_QUEUES_PRIORITY', []))
+    return sorted(
+        queues_names,
+        key=lambda q: priority.index(q) if q in priority else len(priority)
+    )
 
 
 class WorkerJob(object):
@@ -32,7 +121,17 @@ class WorkerJob(object):
     cache_timeout = 60 * 60  # 1 hour for result of work in progress
     cache_final_result_timeout = 60 * 10  # 10 minutes for final result
     progress_update = 5  # update cache every 5% of progress
+    # max number of unfinished jobs (of this class) started by single user;
+    # None means no limit
+    max_jobs_per_user = None
+    # if True, job requested with the same params as pending (queued, but not
+    # started yet) job is merged with it; when job is already started (or
+    # finished), new one is enqueued
+    coalesce_pending = False
     _return_job_meta = False  # if True return job metadata in _worker_func too
+    # if True, job is reading from database replica (if it's configured) -
+    # use it only for jobs which are not writing to the database
+    read_from_replica = False
 
     @classmethod
     def _clear_cache(cls, **kwargs):
@@ -50,7 +149,88 @@ class WorkerJob(object):
         connection = django_rq.get_connection(self.queue_name)
         return Job.fetch(job_id, connection)
 
-    def run_on_worker(self, **kwargs):
+    def _check_user_jobs_limit(self, cache, user):
+        """
+        Raise TooManyJobsError if user has already max_jobs_per_user
+        unfinished jobs. Return list of ids of these jobs otherwise.
+        """
+        key = _get_user_jobs_cache_key(self.cache_section, user)
+        jobs_ids = []
+        for job_id in cache.get(key) or []:
+            try:
+                job = self.get_rq_job(job_id)
+            except Exception:
+                # job expired or was removed
+                continue
+            if not (job.is_finished or job.is_failed):
+                jobs_ids.append(job_id)
+        if len(jobs_ids) >= self.max_jobs_per_user:
+            raise TooManyJobsError(
+                'User {} has already {} unfinished jobs'.format(
+                    user, len(jobs_ids)
+                )
+            )
+        return jobs_ids
+
+    def _get_pending(self, cached):
+        """
+        Return cached job info only if job is still waiting in queue.
+        """
+        try:
+            job = self.get_rq_job(cached[1])
+        except Exception:
+            # job expired or was removed
+            return None
+        if job.get_status() == JobStatus.QUEUED:
+            return cached
+        return None
+
+    @classmethod
+    def _store_result(cls, cache, key, data):
+        """
+        Return representation of final result of the job, which is stored in
+        the cache (together with progress, under job key) and returned by the
+        job. By default it's result itself - override it to store big
+        results in different way (ex. in separate keys, see `BaseReport`).
+        """
+        return data
+
+    @classmethod
+    def _store_partial_result(cls, cache, key, data):
+        """
+        Return representation of partial result of the job (returned
+        together with progress of unfinished job), which is stored in the
+        cache. By default it's result itself.
+        """
+        return data
+
+    @classmethod
+    def _delete_partial_result(cls, cache, stored):
+        """
+        Delete partial result (representation returned by
+        `_store_partial_result`) from the cache, when it's replaced by newer
+        (partial or final) one. By default there is nothing to delete.
+        """
+
+    def _fetch_result(self, cache, stored):
+        """
+        Return (final or partial) result of the job from its representation
+        returned by `_store_result` or `_store_partial_result`. Return None
+        if result is not available anymore.
+        """
+        return stored
+
+    def run_on_worker(self, user=None, fetch_result=True, **kwargs):
+        """
+        Run job on worker (if it's not running yet) and return its progress
+        and result.
+
+        :param user: user requesting job - if passed, max_jobs_per_user limit
+            is checked before enqueuing new job
+        :param fetch_result: if False, (final or partial) result is not
+            fetched (None is returned instead) - use it to only check progress
+            of the job
+        """
         cache = dj_caches[self.cache_name]
         if isinstance(cache, DummyCache):
             # No caching or queues with dummy cache.
@@ -58,6 +238,8 @@ class WorkerJob(object):
             return (100, data, {}) if self._return_job_meta else (100, data)
         key = _get_cache_key(self.cache_section, **kwargs)
         cached = cache.get(key)
+        if cached is not None and self.coalesce_pending:
+            cached = self._get_pending(cached)
         if cached is not None:
             progress, job_id, data = cached
             job = self.get_rq_job(job_id)
@@ -74,7 +256,17 @@ class WorkerJob(object):
                     data = None
                     progress = 100
                     cache.delete(key)
+            if not fetch_result:
+                data = None
+            elif data is not None:
+                data = self._fetch_result(cache, data)
+                if data is None and progress == 100:
+                    # result expired - calculate it again next time
+                    cache.delete(key)
         else:
+            check_limit = user is not None and self.max_jobs_per_user
+            if check_limit:
+                user_jobs_ids = self._check_user_jobs_limit(cache, user)
             queue = django_rq.get_queue(self.queue_name)
             job = queue.enqueue_call(
                 func=self._worker_func,
@@ -82,6 +274,12 @@ class WorkerJob(object):
                 timeout=self.work_timeout,
                 result_ttl=self.cache_final_result_timeout,
             )
+            if check_limit:
+                cache.set(
+                    _get_user_jobs_cache_key(self.cache_section, user),
+                    user_jobs_ids + [job.id],
+                    timeout=self.work_timeout,
+                )
             progress = 0
             data = None
             cache.set(
@@ -109,24 +307,40 @@ class WorkerJob(object):
 
         last_progress = 0
         data = None
-        for progress, data in cls.run(**kwargs):
-            if (
-                job_id is not None and
-                progress - last_progress > cls.progress_update
-            ):
-                # Update cache when progress incremented by cls.progress_update
-                # or every time when cls.progress_update is None
-                cache.set(
-                    key,
-                    (progress, job_id, data),
-                    timeout=cls.cache_timeout,
-                )
-                last_progress = progress
+        partial_result = None
+        with use_replica(cls.read_from_replica):
+            for progress, data in cls.run(**kwargs):
+                if (
+                    job_id is not None and
+                    progress - last_progress > cls.progress_update
+                ):
+                    # Update cache when progress incremented by
+                    # cls.progress_update or every time when
+                    # cls.progress_update is None
+                    previous_partial_result = partial_result
+                    partial_result = cls._store_partial_result(
+                        cache, key, data
+                    )
+                    cache.set(
+                        key,
+                        (progress, job_id, partial_result),
+                        timeout=cls.cache_timeout,
+                    )
+                    # previous partial result is not used anymore
+                    if previous_partial_result is not None:
+                        cls._delete_partial_result(
+                            cache, previous_partial_result
+                        )
+                    last_progress = progress
+        if not isinstance(cache, DummyCache):
+            data = cls._store_result(cache, key, data)
         cache.set(
             key,
             (progress, job_id, data),
             timeout=cls.cache_final_result_timeout,
         )
+        if partial_result is not None:
+            cls._delete_partial_result(cache, partial_result)
         return data
 
     @classmethod
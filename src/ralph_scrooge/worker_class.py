@@ -1,5 +1,21 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import logging
+
 from django.db import connection
 from rq import Worker
+from rq.utils import utcnow
+
+from ralph_scrooge.utils.dimensions import daily_pricing_objects, dimensions
+from ralph_scrooge.utils.warmup import run_preload_hooks
+from ralph_scrooge.utils.worker_job import get_queues_by_priority
+
+logger = logging.getLogger(__name__)
 
 
 class ScroogeWorker(Worker):
@@ -10,7 +26,50 @@ class ScroogeWorker(Worker):
     ```
     scrooge rqworker --worker-class=ralph_scrooge.worker_class.ScroogeWorker default  # noqa
     ```
+
+    Queues are checked for jobs in order defined by `RQ_QUEUES_PRIORITY`
+    setting (no matter of order of queues passed to the command), so the same
+    worker could serve both interactive reports and costs recalculation,
+    without starving reports.
+
+    At start, worker runs hooks from `SCROOGE_WORKER_PRELOAD` setting (ex.
+    to register plugins and load dimensions), so jobs don't have to do it
+    every time. Since every job is executed in work horse forked from the
+    worker, data loaded there is shared with work horses (copy-on-write)
+    instead of being fetched from the database by every job. Keep it in
+    compact structures (ex. dicts of ints, like `daily_pricing_objects`),
+    because every touched memory page is copied to the work horse.
     """
+    def __init__(self, queues, *args, **kwargs):
+        super(ScroogeWorker, self).__init__(queues, *args, **kwargs)
+        queues_by_name = {q.name: q for q in self.queues}
+        self.queues = [
+            queues_by_name[name]
+            for name in get_queues_by_priority([q.name for q in self.queues])
+        ]
+
+    def work(self, *args, **kwargs):
+        run_preload_hooks()
+        # don't share connection to the database with forked work horses
+        connection.close()
+        return super(ScroogeWorker, self).work(*args, **kwargs)
+
+    def execute_job(self, *args, **kwargs):
+        """
+        Reload dimensions and daily pricing objects (if they were changed)
+        before job is executed.
+
+        This is executed in main worker process (before forking work horse),
+        so data is reloaded only once after every change.
+        """
+        reloaded = False
+        for preloaded in (dimensions, daily_pricing_objects):
+            if preloaded.is_loaded:
+                reloaded = preloaded.refresh_if_stale() or reloaded
+        if reloaded:
+            connection.close()
+        return super(ScroogeWorker, self).execute_job(*args, **kwargs)
+
     def perform_job(self, *args, **kwargs):
         """
         Handles connection (wait) timeouts on RQ.
@@ -34,7 +93,17 @@ class ScroogeWorker(Worker):
         * http://dev.mysql.com/doc/refman/5.7/en/gone-away.html
         * https://dev.mysql.com/doc/refman/5.7/en/error-lost-connection.html
         * http://dev.mysql.com/doc/refman/5.7/en/server-system-variables.html#sysvar_wait_timeout  # noqa
+
+        Additionally, time which job spent in queue is logged.
         """
+        job = args[0] if args else kwargs['job']
+        if job.enqueued_at:
+            logger.info('Job {} ({}) waited {}s in queue {}'.format(
+                job.id,
+                job.func_name,
+                (utcnow() - job.enqueued_at).total_seconds(),
+                job.origin,
+            ))
         connection.close_if_unusable_or_obsolete()
         result = super(ScroogeWorker, self).perform_job(*args, **kwargs)
         connection.close_if_unusable_or_obsolete()